@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 12:15
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def backfill_goods_stock_totals(apps, schema_editor):
+    """按库存表汇总回填商品总库存，并据此计算库存状态（两条整表 UPDATE）"""
+    Goods = apps.get_model('basic', 'Goods')
+    Inventory = apps.get_model('inventory', 'Inventory')
+
+    totals = Inventory.objects.filter(goods_id=OuterRef('pk')).order_by().values('goods_id').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    Goods.objects.update(total_quantity=Coalesce(
+        Subquery(totals), Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2)
+    ))
+    Goods.objects.update(stock_status=Case(
+        When(total_quantity__lte=0, then=Value('out')),
+        When(min_stock__gt=0, total_quantity__lte=F('min_stock'), then=Value('low')),
+        When(max_stock__gt=0, total_quantity__gte=F('max_stock'), then=Value('over')),
+        default=Value('normal'),
+        output_field=models.CharField(max_length=10)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_inventory_reserved_quantity'),
+        ('basic', '0012_add_print_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='stock_status',
+            field=models.CharField(choices=[('out', '缺货'), ('low', '库存不足'), ('normal', '正常'), ('over', '库存过剩')], default='out', max_length=10, verbose_name='库存状态(冗余)'),
+        ),
+        migrations.AddField(
+            model_name='goods',
+            name='total_quantity',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='总库存(冗余)'),
+        ),
+        migrations.RunPython(backfill_goods_stock_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['stock_status'], name='biz_goods_stock_s_bddf05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['total_quantity'], name='biz_goods_total_q_27eb57_idx'),
+        ),
+    ]
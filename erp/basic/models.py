@@ -201,6 +201,16 @@ class Goods(models.Model):
         (1, '上架'),
     ]
 
+    STOCK_STATUS_CHOICES = [
+        ('out', '缺货'),
+        ('low', '库存不足'),
+        ('normal', '正常'),
+        ('over', '库存过剩'),
+    ]
+
+    # 库存汇总冗余字段，只由库存变动时的 SQL UPDATE 维护，常规 save() 不写回
+    STOCK_COUNTER_FIELDS = ('total_quantity', 'stock_status')
+
     code = models.CharField(max_length=50, unique=True, verbose_name='商品编码')
     name = models.CharField(max_length=100, verbose_name='商品名称')
     category = models.ForeignKey(Category, on_delete=models.PROTECT, verbose_name='商品分类')
@@ -214,6 +224,9 @@ class Goods(models.Model):
     min_stock = models.IntegerField(default=0, verbose_name='最低库存')
     max_stock = models.IntegerField(default=0, verbose_name='最高库存')
     status = models.IntegerField(choices=STATUS_CHOICES, default=1, verbose_name='状态')
+    total_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='总库存(冗余)')
+    stock_status = models.CharField(max_length=10, choices=STOCK_STATUS_CHOICES, default='out',
+                                    verbose_name='库存状态(冗余)')
     remark = models.TextField(blank=True, verbose_name='备注')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
@@ -227,6 +240,8 @@ class Goods(models.Model):
             models.Index(fields=['code']),
             models.Index(fields=['name']),
             models.Index(fields=['category']),
+            models.Index(fields=['stock_status']),
+            models.Index(fields=['total_quantity']),
         ]
 
     def __str__(self):
@@ -235,8 +250,25 @@ class Goods(models.Model):
     def save(self, *args, **kwargs):
         if self.unit:
             self.unit_name = self.unit.name
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # 编辑商品时不覆盖并发库存变动写入的库存汇总
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STOCK_COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def stock_status_expression():
+        """按总库存与最低/最高库存计算库存状态的 SQL 表达式"""
+        return models.Case(
+            models.When(total_quantity__lte=0, then=models.Value('out')),
+            models.When(min_stock__gt=0, total_quantity__lte=models.F('min_stock'), then=models.Value('low')),
+            models.When(max_stock__gt=0, total_quantity__gte=models.F('max_stock'), then=models.Value('over')),
+            default=models.Value('normal'),
+            output_field=models.CharField(max_length=10)
+        )
+
 
 class CompanyInfo(models.Model):
     """公司信息"""
@@ -1,6 +1,4 @@
 from rest_framework import serializers
-from django.db.models import Sum
-from decimal import Decimal
 from .models import Category, Warehouse, Supplier, Customer, Goods, Unit, CompanyInfo, PrintTemplate
 
 
@@ -313,6 +311,7 @@ class GoodsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Goods
         fields = '__all__'
+        read_only_fields = ['total_quantity', 'stock_status']
         extra_kwargs = {
             'code': {
                 'validators': []
@@ -405,7 +404,7 @@ class GoodsWithStockSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     unit = serializers.IntegerField(source='unit.id', read_only=True)
     unit_name = serializers.CharField(source='unit.name', read_only=True)
-    total_quantity = serializers.SerializerMethodField()
+    total_quantity = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True, coerce_to_string=False)
     stock_status = serializers.SerializerMethodField()
     
     class Meta:
@@ -415,29 +414,9 @@ class GoodsWithStockSerializer(serializers.ModelSerializer):
                   'min_stock', 'max_stock', 'status', 'total_quantity', 'stock_status',
                   'created_at', 'updated_at']
     
-    def get_total_quantity(self, obj):
-        """获取商品总库存"""
-        from inventory.models import Inventory
-        
-        total = Inventory.objects.filter(goods=obj).aggregate(
-            total=Sum('quantity')
-        )['total']
-        return total or Decimal('0')
-    
     def get_stock_status(self, obj):
-        """获取库存状态"""
-        total_quantity = self.get_total_quantity(obj)
-        min_stock = obj.min_stock or 0
-        max_stock = obj.max_stock or 0
-        
-        if total_quantity <= 0:
-            return {'code': 'out', 'text': '缺货'}
-        elif min_stock > 0 and total_quantity <= min_stock:
-            return {'code': 'low', 'text': '库存不足'}
-        elif max_stock > 0 and total_quantity >= max_stock:
-            return {'code': 'over', 'text': '库存过剩'}
-        else:
-            return {'code': 'normal', 'text': '正常'}
+        """获取库存状态（读取库存变动时维护的冗余字段）"""
+        return {'code': obj.stock_status, 'text': obj.get_stock_status_display()}
 
 
 class CompanyInfoSerializer(serializers.ModelSerializer):
@@ -374,11 +374,11 @@ class CustomerViewSet(BaseModelViewSet):
 
 class GoodsViewSet(BaseModelViewSet):
     permission_classes = [IsAuthenticated, ModulePermission]
-    queryset = Goods.objects.select_related('category').all()
+    queryset = Goods.objects.select_related('category', 'unit').all()
     serializer_class = GoodsSerializer
-    filterset_fields = ['category', 'status']
+    filterset_fields = ['category', 'status', 'stock_status']
     search_fields = ['code', 'name', 'spec', 'brand']
-    ordering_fields = ['code', 'name', 'created_at']
+    ordering_fields = ['code', 'name', 'created_at', 'total_quantity', 'stock_status']
     ordering = ['-created_at']
     module_name = '商品'
 
@@ -417,6 +417,12 @@ class GoodsViewSet(BaseModelViewSet):
     def perform_create(self, serializer):
         """商品创建"""
         goods = serializer.save()
+        GoodsInventoryService.invalidate_goods_stock_summary()
+
+    def perform_destroy(self, instance):
+        """商品删除"""
+        instance.delete()
+        GoodsInventoryService.invalidate_goods_stock_summary()
 
     def perform_update(self, serializer):
         """商品更新时处理状态变更"""
@@ -478,9 +484,19 @@ class GoodsViewSet(BaseModelViewSet):
 
     @action(detail=False, methods=['post'])
     def check_consistency(self, request):
-        """数据一致性校验"""
+        """数据一致性校验（mode=incremental 增量校验 / full 全量校验）"""
         goods_id = request.data.get('goods_id')
-        inconsistencies = GoodsInventoryService.check_consistency(goods_id)
+        mode = request.data.get('mode') or request.query_params.get('mode', 'incremental')
+        
+        if mode not in ('incremental', 'full'):
+            return Response({
+                'code': 400,
+                'msg': '校验模式只能是 incremental 或 full',
+                'data': None
+            })
+        
+        report = GoodsInventoryService.check_consistency(goods_id, mode=mode)
+        inconsistencies = report.pop('inconsistencies')
         
         return Response({
             'code': 200,
@@ -488,33 +504,50 @@ class GoodsViewSet(BaseModelViewSet):
             'data': {
                 'has_inconsistency': len(inconsistencies) > 0,
                 'inconsistency_count': len(inconsistencies),
-                'inconsistencies': inconsistencies
+                'inconsistencies': inconsistencies,
+                'stats': report
             }
         })
 
     @action(detail=False, methods=['post'])
     def fix_consistency(self, request):
-        """修复数据不一致"""
-        inconsistencies = request.data.get('inconsistencies', [])
+        """
+        批量修复数据不一致
+        inconsistencies 为校验报告中的不一致数据，scan=true 时重新校验并修复全部；
+        target=ledger 以流水为准修正库存，target=inventory 以库存为准补记盘点流水；dry_run=true 只返回修复方案
+        """
+        inconsistencies = request.data.get('inconsistencies')
+        scan = str(request.data.get('scan', '')).lower() in ('1', 'true')
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        target = request.data.get('target') or 'ledger'
         
-        if not inconsistencies:
+        if not inconsistencies and not scan:
             return Response({
                 'code': 400,
                 'msg': '请提供需要修复的不一致数据',
                 'data': None
             })
         
-        results = []
-        for item in inconsistencies:
-            result = GoodsInventoryService.fix_inconsistency(item)
-            results.append(result)
-        
-        success_count = sum(1 for r in results if r.get('success'))
+        try:
+            result = GoodsInventoryService.repair_inconsistencies(
+                None if scan else inconsistencies,
+                target=target,
+                dry_run=dry_run,
+                created_by=request.user
+            )
+        except ValueError as e:
+            return Response({'code': 400, 'msg': str(e), 'data': None})
         
+        if dry_run:
+            msg = f'修复方案共{result["planned"]}条'
+        else:
+            msg = f'修复完成，成功{result["repaired"]}条'
+            if result['changed']:
+                msg += f'，{result["changed"]}条库存已恢复一致无需修复'
         return Response({
             'code': 200,
-            'msg': f'修复完成，成功{success_count}条',
-            'data': results
+            'msg': msg,
+            'data': result
         })
 
 
@@ -170,3 +170,48 @@ SECURE_HSTS_PRELOAD = not DEBUG
 SESSION_COOKIE_SECURE = not DEBUG
 CSRF_COOKIE_SECURE = not DEBUG
 SECURE_SSL_REDIRECT = False
+
+# 库存流水在线保留天数，更早的流水由 archive_inventory_logs 命令迁入归档表
+INVENTORY_LOG_HOT_DAYS = int(os.environ.get('INVENTORY_LOG_HOT_DAYS', '365'))
+
+# 缓存：default 为进程内缓存（各进程的汇总缓存只能靠过期时间收敛）；
+# shared 为跨进程共享缓存，仪表盘、数据分析等由发件箱分发进程失效的缓存放在这里。
+# 默认使用数据库缓存表（由 system 迁移创建），可通过环境变量改为 Redis 等后端
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'haowei-erp',
+    },
+    'shared': {
+        'BACKEND': os.environ.get('SHARED_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', 'sys_shared_cache'),
+    },
+}
+
+# 商品库存汇总缓存有效期（秒），库存变动时会提前失效
+GOODS_STOCK_SUMMARY_CACHE_TIMEOUT = int(os.environ.get('GOODS_STOCK_SUMMARY_CACHE_TIMEOUT', '300'))
+
+# 仪表盘数据缓存有效期（秒），发件箱分发业务事件时会提前失效
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', '60'))
+
+# 数据分析接口：结果缓存有效期（秒，发件箱分发业务事件时会提前失效）、单次查询最多返回行数
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', '300'))
+ANALYTICS_MAX_ROWS = int(os.environ.get('ANALYTICS_MAX_ROWS', '5000'))
+
+# 提交水位：自增ID出现空号后等待多少秒仍未出现才视为事务回滚（应大于最长的业务事务耗时）
+COMMIT_GAP_TIMEOUT_SECONDS = int(os.environ.get('COMMIT_GAP_TIMEOUT_SECONDS', '3600'))
+
+# 发件箱分发：处理失败后跳过前的最大重试次数
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '5'))
+
+# 后台任务：单据确认每批处理的明细行数、心跳超时回收秒数、最大执行次数
+JOB_CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE', '500'))
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', '600'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+
+# FIFO 成本计算：每批写回的流水条数、并行进程数（流水ID上限为提交水位，见 COMMIT_GAP_TIMEOUT_SECONDS）
+COST_CHUNK_SIZE = int(os.environ.get('COST_CHUNK_SIZE', '5000'))
+COST_WORKERS = int(os.environ.get('COST_WORKERS', '4'))
+
+# 单号分配：每个进程一次租用的序号段长度（越大越少访问序列表，进程重启时留下的空号也越多）
+ORDER_NO_BLOCK_SIZE = int(os.environ.get('ORDER_NO_BLOCK_SIZE', '20'))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at'], name='biz_payment_created_9afbc6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'related_party_type'], name='biz_payment_status_9271f9_idx'),
+        ),
+    ]
@@ -51,6 +51,10 @@ class Payment(models.Model):
         verbose_name = '收付款记录'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'related_party_type']),
+        ]
 
     def __str__(self):
         return f'{self.order_no} - {self.get_type_display()} - {self.total_amount}'
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Inventory, InventoryLog, StockIn, StockOut
+from .models import CostLayer, Inventory, InventoryAlert, InventoryLog, StockIn, StockOut
 
 
 @admin.register(Inventory)
@@ -9,6 +9,20 @@ class InventoryAdmin(admin.ModelAdmin):
     search_fields = ['goods__name', 'goods__code']
 
 
+@admin.register(InventoryAlert)
+class InventoryAlertAdmin(admin.ModelAdmin):
+    list_display = ['goods', 'warehouse', 'alert_type', 'status', 'quantity', 'triggered_at', 'resolved_at']
+    list_filter = ['status', 'alert_type', 'warehouse']
+    search_fields = ['goods__name', 'goods__code']
+
+
+@admin.register(CostLayer)
+class CostLayerAdmin(admin.ModelAdmin):
+    list_display = ['goods', 'warehouse', 'quantity', 'remaining_quantity', 'unit_cost', 'received_at']
+    list_filter = ['warehouse']
+    search_fields = ['goods__name', 'goods__code']
+
+
 @admin.register(InventoryLog)
 class InventoryLogAdmin(admin.ModelAdmin):
     list_display = ['goods', 'warehouse', 'change_type', 'change_quantity', 'created_at']
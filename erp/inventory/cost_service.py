@@ -0,0 +1,387 @@
+"""
+FIFO 成本计算服务模块
+按商品分区流式读取库存流水（在线表与归档表按流水ID归并），在内存中维护各仓库的成本层队列。
+成本层队列用累计数量/累计金额前缀和表示：出库 q 的成本为 V(已消耗量 + q) - V(已消耗量)，
+V 通过二分定位成本层后一次插值得到，不逐层扣减；入库只在前缀和末尾追加。
+每批流水处理完后在一个事务内写回成本层、负库存缺口、流水成本和计算进度，中断后从商品的已处理流水ID续算
+（每次计算只处理到流水表的提交水位，不越过尚未提交的流水）；
+商品之间互不影响，可由进程池按商品分区并行计算（同一商品的调出、调入在同一分区内按流水顺序配对）。
+"""
+import bisect
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+class _FifoQueue:
+    """单个 商品/仓库 的成本层队列（前缀和表示）"""
+
+    def __init__(self, layers, fallback_cost):
+        self.layers = []
+        self.cum_quantity = []
+        self.cum_value = []
+        self.consumed = Decimal('0')
+        self.fallback_cost = fallback_cost
+        for layer in layers:
+            self.push(layer, layer.remaining_quantity)
+
+    def push(self, layer, quantity):
+        """追加成本层"""
+        total_quantity = self.cum_quantity[-1] if self.cum_quantity else Decimal('0')
+        total_value = self.cum_value[-1] if self.cum_value else Decimal('0')
+        self.layers.append(layer)
+        self.cum_quantity.append(total_quantity + quantity)
+        self.cum_value.append(total_value + quantity * layer.unit_cost)
+
+    def value_at(self, position):
+        """队列前 position 数量的累计成本；超出全部成本层（负库存）的部分按最后一层成本计"""
+        index = bisect.bisect_left(self.cum_quantity, position)
+        if index >= len(self.layers):
+            last_cost = self.layers[-1].unit_cost if self.layers else self.fallback_cost
+            total_quantity = self.cum_quantity[-1] if self.cum_quantity else Decimal('0')
+            total_value = self.cum_value[-1] if self.cum_value else Decimal('0')
+            return total_value + (position - total_quantity) * last_cost
+        previous_quantity = self.cum_quantity[index - 1] if index else Decimal('0')
+        previous_value = self.cum_value[index - 1] if index else Decimal('0')
+        return previous_value + (position - previous_quantity) * self.layers[index].unit_cost
+
+    def consume(self, quantity):
+        """
+        按先进先出消耗 quantity
+        :return: 消耗的成本金额
+        """
+        start = self.consumed
+        self.consumed = start + quantity
+        return self.value_at(self.consumed) - self.value_at(start)
+
+    def current_cost(self):
+        """队首成本层的单位成本（下一笔出库的成本）"""
+        index = bisect.bisect_right(self.cum_quantity, self.consumed)
+        if index < len(self.layers):
+            return self.layers[index].unit_cost
+        return self.layers[-1].unit_cost if self.layers else self.fallback_cost
+
+    def settle(self):
+        """
+        按已消耗量回写各成本层的剩余数量
+        :return: 剩余数量有变化或尚未保存的成本层
+        """
+        changed = []
+        previous = Decimal('0')
+        for layer, cumulative in zip(self.layers, self.cum_quantity):
+            remaining = min(max(cumulative - self.consumed, Decimal('0')), cumulative - previous)
+            previous = cumulative
+            if layer.pk is None or layer.remaining_quantity != remaining:
+                layer.remaining_quantity = remaining
+                changed.append(layer)
+        return changed
+
+    def deficit(self):
+        """超出全部成本层的消耗量（负库存）"""
+        total_quantity = self.cum_quantity[-1] if self.cum_quantity else Decimal('0')
+        return max(self.consumed - total_quantity, Decimal('0'))
+
+
+class FifoCostService:
+    """FIFO 成本计算服务"""
+
+    LOG_FIELDS = (
+        'id', 'warehouse_id', 'change_type', 'movement_kind', 'change_quantity', 'unit_cost',
+        'related_order_type', 'related_order_id', 'created_at'
+    )
+    COST_QUANTIZE = Decimal('0.0001')
+
+    @staticmethod
+    def upper_log_id():
+        """
+        本次计算的流水ID上限：流水表的提交水位（不大于它的流水ID均已提交或确认回滚）。
+        计算进度按商品推进后不会回头，ID较小但提交较晚的流水必须等其提交后才能越过
+        """
+        from inventory.models import InventoryLog, InventoryLogArchive
+        from system.services import CommitWatermarkService
+
+        return CommitWatermarkService.advance('inventory_log', (InventoryLog, InventoryLogArchive))
+
+    @staticmethod
+    def pending_goods(upper_log_id):
+        """一条查询找出在计算进度之后、上限之内仍有流水的商品"""
+        from basic.models import Goods
+        from inventory.models import CostCheckpoint, InventoryLog, InventoryLogArchive
+
+        processed = CostCheckpoint.objects.filter(goods_id=OuterRef('pk')).values('last_log_id')[:1]
+
+        def has_logs(model):
+            return Exists(model.objects.filter(
+                goods_id=OuterRef('pk'), id__gt=OuterRef('processed_id'), id__lte=upper_log_id
+            ))
+
+        return list(Goods.objects.annotate(
+            processed_id=Coalesce(Subquery(processed), Value(0))
+        ).filter(
+            has_logs(InventoryLog) | has_logs(InventoryLogArchive)
+        ).order_by('id').values_list('id', flat=True))
+
+    @staticmethod
+    def iter_logs(goods_id, after_id, upper_log_id, chunk_size):
+        """
+        按流水ID顺序流式读取商品的在线流水与归档流水
+        每张表按主键分页读取（每页一次查询，不保持长时间打开的游标），两张表按流水ID归并
+        """
+        from inventory.models import InventoryLog, InventoryLogArchive
+
+        def pages(model):
+            last_id = after_id
+            while True:
+                rows = list(model.objects.filter(
+                    goods_id=goods_id, id__gt=last_id, id__lte=upper_log_id
+                ).order_by('id').values_list(*FifoCostService.LOG_FIELDS)[:chunk_size])
+                yield from rows
+                if len(rows) < chunk_size:
+                    return
+                last_id = rows[-1][0]
+
+        return heapq.merge(pages(InventoryLog), pages(InventoryLogArchive))
+
+    @staticmethod
+    def load_queues(goods_id, fallback_cost):
+        """
+        读取商品各仓库的剩余成本层，以及负库存缺口
+        缺口保存为剩余数量为负的成本层（入库数量为0），读回后作为队列的已消耗量，后续入库先冲抵缺口
+        """
+        from inventory.models import CostLayer
+
+        grouped = {}
+        deficits = {}
+        for layer in CostLayer.objects.filter(goods_id=goods_id).exclude(
+            remaining_quantity=0
+        ).order_by('source_log_id', 'id'):
+            if layer.remaining_quantity < 0:
+                deficits[layer.warehouse_id] = deficits.get(layer.warehouse_id, Decimal('0')) - layer.remaining_quantity
+            else:
+                grouped.setdefault(layer.warehouse_id, []).append(layer)
+
+        queues = {
+            warehouse_id: _FifoQueue(layers, fallback_cost) for warehouse_id, layers in grouped.items()
+        }
+        for warehouse_id, deficit in deficits.items():
+            queue = queues.setdefault(warehouse_id, _FifoQueue([], fallback_cost))
+            queue.consumed = deficit
+        return queues
+
+    @staticmethod
+    def process_goods(goods_id, upper_log_id, chunk_size=None):
+        """
+        计算单个商品在计算进度之后的流水成本
+        :return: {'logs': 处理流水数, 'cogs': 销售出库成本}
+        """
+        from basic.models import Goods
+        from inventory.models import CostCheckpoint, CostLayer, MovementCost
+
+        chunk_size = chunk_size or settings.COST_CHUNK_SIZE
+        fallback_cost = Goods.objects.filter(id=goods_id).values_list('purchase_price', flat=True).first()
+        fallback_cost = fallback_cost or Decimal('0')
+        checkpoint, _ = CostCheckpoint.objects.get_or_create(goods_id=goods_id)
+        last_log_id = checkpoint.last_log_id
+
+        queues = FifoCostService.load_queues(goods_id, fallback_cost)
+        # 调拨出库成本，调入时按同一调拨单顺序配对
+        transfer_costs = {}
+        result = {'logs': 0, 'cogs': Decimal('0')}
+
+        def flush(costs):
+            nonlocal queues, last_log_id
+            layers = [layer for queue in queues.values() for layer in queue.settle()]
+            # 负库存缺口随进度一起保存，中断后续算与不中断的计算结果一致
+            deficits = [
+                CostLayer(
+                    goods_id=goods_id, warehouse_id=warehouse_id, source_log_id=costs[-1].log_id,
+                    quantity=0, remaining_quantity=-queue.deficit(), unit_cost=queue.current_cost(),
+                    received_at=costs[-1].moved_at
+                )
+                for warehouse_id, queue in queues.items() if queue.deficit()
+            ]
+            with transaction.atomic():
+                # 条件推进进度：并发计算同一商品时只有一个能提交
+                advanced = CostCheckpoint.objects.filter(goods_id=goods_id, last_log_id=last_log_id).update(
+                    last_log_id=costs[-1].log_id, processed_at=timezone.now()
+                )
+                if not advanced:
+                    raise RuntimeError(f'商品 {goods_id} 的成本计算进度已被其他进程更新')
+                CostLayer.objects.bulk_update(
+                    [layer for layer in layers if layer.pk is not None], ['remaining_quantity'], batch_size=1000
+                )
+                CostLayer.objects.bulk_create([layer for layer in layers if layer.pk is None], batch_size=1000)
+                CostLayer.objects.filter(goods_id=goods_id, remaining_quantity__lt=0).delete()
+                CostLayer.objects.bulk_create(deficits)
+                MovementCost.objects.bulk_create(costs, batch_size=1000)
+            last_log_id = costs[-1].log_id
+            # 重新读取剩余成本层与缺口（获取新建成本层的主键）
+            queues = FifoCostService.load_queues(goods_id, fallback_cost)
+
+        costs = []
+        for log in FifoCostService.iter_logs(goods_id, last_log_id, upper_log_id, chunk_size):
+            costs.append(FifoCostService._apply_log(goods_id, log, queues, transfer_costs, fallback_cost))
+            if costs[-1].movement_kind == 'sale_out':
+                result['cogs'] -= costs[-1].amount
+            if len(costs) >= chunk_size:
+                flush(costs)
+                result['logs'] += len(costs)
+                costs = []
+        if costs:
+            flush(costs)
+            result['logs'] += len(costs)
+        return result
+
+    @staticmethod
+    def _apply_log(goods_id, log, queues, transfer_costs, fallback_cost):
+        """将一条流水应用到成本层队列，返回流水成本"""
+        from inventory.models import CostLayer, MovementCost
+
+        (log_id, warehouse_id, change_type, movement_kind, change_quantity, log_cost,
+         related_order_type, related_order_id, created_at) = log
+        quantity = -change_quantity if change_type == 'outbound' else change_quantity
+        queue = queues.get(warehouse_id)
+        if queue is None:
+            queue = queues[warehouse_id] = _FifoQueue([], fallback_cost)
+        transfer_key = (related_order_type, related_order_id)
+
+        if quantity > 0:
+            unit_cost = log_cost if log_cost is not None else queue.current_cost()
+            if movement_kind == 'transfer_in' and transfer_costs.get(transfer_key):
+                unit_cost = transfer_costs[transfer_key].pop(0)
+            queue.push(CostLayer(
+                goods_id=goods_id,
+                warehouse_id=warehouse_id,
+                source_log_id=log_id,
+                quantity=quantity,
+                remaining_quantity=quantity,
+                unit_cost=unit_cost,
+                received_at=created_at
+            ), quantity)
+            amount = quantity * unit_cost
+        else:
+            amount = -queue.consume(-quantity)
+            unit_cost = (amount / quantity).quantize(FifoCostService.COST_QUANTIZE) if quantity else Decimal('0')
+            if movement_kind == 'transfer_out':
+                transfer_costs.setdefault(transfer_key, []).append(unit_cost)
+
+        return MovementCost(
+            log_id=log_id,
+            goods_id=goods_id,
+            warehouse_id=warehouse_id,
+            movement_kind=movement_kind,
+            related_order_type=related_order_type,
+            related_order_id=related_order_id,
+            quantity=quantity,
+            unit_cost=unit_cost,
+            amount=amount.quantize(FifoCostService.COST_QUANTIZE),
+            moved_at=created_at
+        )
+
+    @staticmethod
+    def process_partition(goods_ids, upper_log_id, chunk_size=None):
+        """依次计算一个分区内的商品，汇总处理结果"""
+        summary = {'goods': 0, 'logs': 0, 'cogs': Decimal('0')}
+        for goods_id in goods_ids:
+            result = FifoCostService.process_goods(goods_id, upper_log_id, chunk_size)
+            summary['goods'] += 1
+            summary['logs'] += result['logs']
+            summary['cogs'] += result['cogs']
+        return summary
+
+    @staticmethod
+    def run(workers=None, partition_size=200, chunk_size=None, stdout=None):
+        """
+        增量计算全部商品的 FIFO 成本
+        :param workers: 并行进程数，不大于1时在当前进程内计算
+        :param partition_size: 每个分区的商品数
+        :param chunk_size: 每批写回的流水条数
+        :param stdout: 进度输出流
+        :return: {'goods', 'logs', 'cogs', 'upper_log_id', 'seconds'}
+        """
+        workers = settings.COST_WORKERS if workers is None else workers
+        started = time.perf_counter()
+        upper_log_id = FifoCostService.upper_log_id()
+        goods_ids = FifoCostService.pending_goods(upper_log_id)
+        partitions = [goods_ids[i:i + partition_size] for i in range(0, len(goods_ids), partition_size)]
+        summary = {'goods': 0, 'logs': 0, 'cogs': Decimal('0')}
+
+        def collect(result):
+            for key in summary:
+                summary[key] += result[key]
+            if stdout is not None:
+                elapsed = time.perf_counter() - started
+                rate = summary['logs'] / elapsed if elapsed else 0
+                stdout.write(f'已处理商品 {summary["goods"]}/{len(goods_ids)}，流水 {summary["logs"]} 条，'
+                             f'{rate:.0f} 条/秒')
+
+        if workers <= 1 or len(partitions) <= 1:
+            for partition in partitions:
+                collect(FifoCostService.process_partition(partition, upper_log_id, chunk_size))
+        else:
+            # 子进程各自建立数据库连接，不继承父进程的连接
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                futures = [
+                    executor.submit(_process_partition, partition, upper_log_id, chunk_size)
+                    for partition in partitions
+                ]
+                for future in futures:
+                    collect(future.result())
+
+        summary['upper_log_id'] = upper_log_id
+        summary['seconds'] = time.perf_counter() - started
+        return summary
+
+    @staticmethod
+    def order_cogs(related_order):
+        """
+        单据的 FIFO 出库成本（如销售单每个商品行的销售成本）
+        :return: {goods_id: 成本金额}
+        """
+        from inventory.models import MovementCost
+
+        rows = MovementCost.objects.filter(
+            related_order_type=related_order.__class__.__name__,
+            related_order_id=related_order.id,
+            quantity__lt=0
+        ).values('goods_id').annotate(cost=Sum('amount'))
+        return {row['goods_id']: -row['cost'] for row in rows}
+
+    @staticmethod
+    def valuation(warehouse_id=None):
+        """
+        按剩余成本层计算 FIFO 库存金额
+        :return: {(goods_id, warehouse_id): {'quantity', 'value'}}
+        """
+        from inventory.models import CostLayer
+
+        queryset = CostLayer.objects.filter(remaining_quantity__gt=0)
+        if warehouse_id:
+            queryset = queryset.filter(warehouse_id=warehouse_id)
+        rows = queryset.values('goods_id', 'warehouse_id').annotate(
+            quantity=Sum('remaining_quantity'),
+            value=Sum(F('remaining_quantity') * F('unit_cost'))
+        )
+        return {
+            (row['goods_id'], row['warehouse_id']): {'quantity': row['quantity'], 'value': row['value']}
+            for row in rows
+        }
+
+
+def _init_worker():
+    """进程池子进程初始化（spawn 方式启动时需要重新加载 Django）"""
+    import django
+    django.setup()
+
+
+def _process_partition(goods_ids, upper_log_id, chunk_size):
+    """进程池任务入口（需为模块级函数以便序列化）"""
+    return FifoCostService.process_partition(goods_ids, upper_log_id, chunk_size)
@@ -0,0 +1,90 @@
+"""
+库存单据确认服务模块
+确认逻辑供接口同步调用和后台任务分批调用共用：
+同步确认时由调用方包裹在一个事务内；后台任务按明细分批，每批独立提交并上报进度，
+中断后重跑只会处理尚未入库的数量。
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .services import InventoryService
+
+
+class StockDocumentService:
+    """库存单据确认服务"""
+
+    @staticmethod
+    def chunked(ids, chunk_size=None):
+        """按批拆分明细ID，chunk_size 为空时不拆分"""
+        if not chunk_size:
+            return [ids]
+        return [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    @staticmethod
+    def receive_purchase_items(stock_in, item_ids, created_by=None):
+        """
+        入库指定采购明细的未入库数量（在调用方事务内执行，明细行加锁后重新计算未入库数量）
+        :return: 处理的明细行数
+        """
+        from purchase.models import PurchaseItem
+
+        items = list(PurchaseItem.objects.select_for_update().filter(id__in=item_ids).select_related('goods').order_by('id'))
+        purchase_order = stock_in.purchase_order
+
+        movements = []
+        received_items = []
+        for item in items:
+            received_qty = item.quantity - item.received_quantity
+            if received_qty > 0:
+                movements.append({
+                    'goods': item.goods,
+                    'warehouse': stock_in.warehouse,
+                    'change_type': 'inbound',
+                    'quantity': received_qty,
+                    'unit_cost': item.price,
+                    'remark': f'采购入库 - {purchase_order.order_no}'
+                })
+                item.received_quantity = item.quantity
+                received_items.append(item)
+
+        InventoryService.apply_movements(movements, related_order=stock_in, created_by=created_by)
+        PurchaseItem.objects.bulk_update(received_items, ['received_quantity'], batch_size=500)
+        return len(items)
+
+    @staticmethod
+    def confirm_stock_in(stock_in, created_by=None, chunk_size=None, progress=None):
+        """
+        确认入库单：入库关联采购单全部未入库数量，更新采购单与入库单状态
+        :param stock_in: 入库单
+        :param created_by: 操作人
+        :param chunk_size: 每批处理的明细行数，为空时一次处理
+        :param progress: 进度回调 progress(已处理行数, 总行数)
+        """
+        from reports.services import RollupService
+        from system.services import OutboxService
+
+        purchase_order = stock_in.purchase_order
+        item_ids = list(purchase_order.items.order_by('id').values_list('id', flat=True))
+
+        done = 0
+        for chunk in StockDocumentService.chunked(item_ids, chunk_size):
+            with transaction.atomic():
+                done += StockDocumentService.receive_purchase_items(stock_in, chunk, created_by)
+            if progress is not None:
+                progress(done, len(item_ids))
+
+        with transaction.atomic():
+            was_completed = purchase_order.status == 'completed'
+            all_received = not purchase_order.items.filter(received_quantity__lt=F('quantity')).exists()
+            purchase_order.status = 'completed' if all_received else 'partial'
+            purchase_order.save()
+            RollupService.sync_order(purchase_order, was_completed)
+
+            stock_in.status = 'confirmed'
+            stock_in.confirmed_at = timezone.now()
+            stock_in.save()
+            OutboxService.publish_status_change(stock_in, 'stock_in.confirmed')
+            OutboxService.publish_status_change(purchase_order, 'purchase_order.received')
+
+        return stock_in
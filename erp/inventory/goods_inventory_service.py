@@ -2,11 +2,16 @@
 商品库存关联服务模块
 实现商品信息与库存数据的关联、同步和一致性校验
 """
+import time
+from django.conf import settings
 from django.db import transaction, models
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, Count, Max, Min
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from decimal import Decimal
 
+from utils.cache import bump_cache_version, cache_version, shared_cache
+
 
 class GoodsInventoryService:
     """商品库存关联服务"""
@@ -20,6 +25,7 @@ class GoodsInventoryService:
         :param warehouse_ids: 需要初始化的仓库ID列表，为空则初始化所有启用仓库
         """
         from inventory.models import Inventory
+        from inventory.warning_service import StockWarningService
         from basic.models import Warehouse
         
         if warehouse_ids is None:
@@ -36,6 +42,20 @@ class GoodsInventoryService:
             )
             if created:
                 inventories.append(inv)
+
+        # 新建库存行数量为 0，直接进入缺货预警
+        StockWarningService.apply_status_changes([
+            {
+                'goods_id': goods.id,
+                'warehouse_id': inv.warehouse_id,
+                'quantity': inv.quantity,
+                'old_status': None,
+                'new_status': inv.stock_status,
+                'min_stock': goods.min_stock,
+                'max_stock': goods.max_stock
+            }
+            for inv in inventories
+        ])
         
         return inventories
     
@@ -49,12 +69,18 @@ class GoodsInventoryService:
         :param new_status: 新状态
         """
         from inventory.models import Inventory
+        from inventory.services import InventoryService
+        from basic.models import Goods
         
         if old_status == 1 and new_status == 0:
             Inventory.objects.filter(goods=goods).update(
                 quantity=Decimal('0')
             )
+            Goods.objects.filter(id=goods.id).update(total_quantity=Decimal('0'))
+            Goods.objects.filter(id=goods.id).update(stock_status=Goods.stock_status_expression())
+            InventoryService.refresh_stock_status([goods.id])
         
+        GoodsInventoryService.invalidate_goods_stock_summary()
         return True
     
     @staticmethod
@@ -66,7 +92,13 @@ class GoodsInventoryService:
         :param old_min_stock: 原最低库存
         :param old_max_stock: 原最高库存
         """
-        pass
+        from basic.models import Goods
+        from inventory.services import InventoryService
+
+        Goods.objects.filter(id=goods.id).update(stock_status=Goods.stock_status_expression())
+        goods.stock_status = Goods.objects.values_list('stock_status', flat=True).get(id=goods.id)
+        InventoryService.refresh_stock_status([goods.id])
+        GoodsInventoryService.invalidate_goods_stock_summary()
     
     @staticmethod
     def get_goods_stock_status(goods):
@@ -143,153 +175,481 @@ class GoodsInventoryService:
         return result
     
     @staticmethod
-    def check_consistency(goods_id=None):
+    def aggregate_log_balances(queryset):
+        """
+        按 商品/仓库 分组汇总流水净变动（单条 GROUP BY 条件求和查询）
+        入库/调整/盘点按变动数量累加（调整、盘点的变动数量带符号），出库扣减
+        :param queryset: 库存流水查询集
+        :return: ({(goods_id, warehouse_id): 净变动}, 汇总流水行数)
+        """
+        from inventory.models import InventoryLog
+
+        rows = queryset.order_by().values('goods_id', 'warehouse_id').annotate(
+            balance=Sum(InventoryLog.signed_quantity()),
+            rows=Count('id')
+        )
+
+        balances = {}
+        row_count = 0
+        for row in rows:
+            balances[(row['goods_id'], row['warehouse_id'])] = row['balance'] or Decimal('0')
+            row_count += row['rows']
+        return balances, row_count
+
+    @staticmethod
+    def check_consistency(goods_id=None, mode='incremental'):
         """
         数据一致性校验
+        incremental 模式从各商品的检查点累加新增流水，full 模式重新汇总全部流水并重建检查点（指定商品时只重建该商品）。
+        检查点按商品记录已汇总的流水ID，只推进到流水表的提交水位：ID较小但提交较晚的流水尚未出现时，
+        检查点不会越过它；水位之后已可见的流水参与本次比对，但不写入检查点，下次校验重新汇总。
         :param goods_id: 商品ID，为空则检查所有商品
-        :return: 不一致数据列表
+        :param mode: 校验模式 incremental/full
+        :return: 校验报告（不一致数据列表及吞吐统计）
         """
-        from inventory.models import Inventory, InventoryLog
-        from basic.models import Goods
-        
+        from inventory.models import Inventory, InventoryLog, InventoryLogArchive, InventoryCheckpoint
+        from system.services import CommitWatermarkService
+
+        started = time.perf_counter()
+        log_models = (InventoryLog, InventoryLogArchive)
+
+        # 检查点上限为提交水位；比对包含本次开始时已可见的全部流水
+        committed_id = CommitWatermarkService.advance('inventory_log', log_models)
+        max_log_id = max([committed_id] + [
+            model.objects.aggregate(max_id=Max('id'))['max_id'] or 0 for model in log_models
+        ])
+
+        checkpoints = InventoryCheckpoint.objects.all()
+        if goods_id:
+            checkpoints = checkpoints.filter(goods_id=goods_id)
+
+        # 各商品的检查点位置；没有检查点行的商品在最近一次全量汇总时还没有流水，从最小位置起汇总
+        balances = {}
+        positions = {}
+        base_log_id = 0
+        if mode == 'incremental':
+            base_log_id = InventoryCheckpoint.objects.aggregate(min_id=Min('last_log_id'))['min_id']
+            if base_log_id is None:
+                mode = 'full'
+                base_log_id = 0
+            else:
+                for cp in checkpoints.only('goods_id', 'warehouse_id', 'quantity', 'last_log_id'):
+                    balances[(cp.goods_id, cp.warehouse_id)] = cp.quantity
+                    positions[cp.goods_id] = max(positions.get(cp.goods_id, 0), cp.last_log_id)
+
+        # 按检查点位置分组汇总（通常只有一组；单商品校验推进过的商品各自从其位置汇总）
+        groups = {}
+        for key_goods_id, position in positions.items():
+            if position > base_log_id:
+                groups.setdefault(position, []).append(key_goods_id)
+        if goods_id and groups:
+            base_log_id = min(groups)
+            groups = {}
+
+        def scoped(logs):
+            return logs.filter(goods_id=goods_id) if goods_id else logs
+
+        ranges = [(base_log_id, committed_id, lambda logs: scoped(logs).exclude(
+            goods_id__in=[pk for pks in groups.values() for pk in pks]
+        ) if groups else scoped(logs))]
+        ranges += [
+            (position, committed_id, lambda logs, pks=pks: logs.filter(goods_id__in=pks))
+            for position, pks in sorted(groups.items())
+        ]
+
+        # 在线流水与归档流水（保留原流水ID）一并汇总，同一事务内读取避免归档搬迁造成重复或遗漏
+        deltas = {}
+        pending = {}
+        log_rows = 0
+        with transaction.atomic():
+            for model in log_models:
+                for lower, upper, narrow in ranges:
+                    if lower >= upper:
+                        continue
+                    part, rows = GoodsInventoryService.aggregate_log_balances(
+                        narrow(model.objects.filter(id__gt=lower, id__lte=upper))
+                    )
+                    for key, delta in part.items():
+                        deltas[key] = deltas.get(key, Decimal('0')) + delta
+                    log_rows += rows
+                if max_log_id > committed_id:
+                    part, rows = GoodsInventoryService.aggregate_log_balances(
+                        scoped(model.objects.filter(id__gt=committed_id, id__lte=max_log_id))
+                    )
+                    for key, delta in part.items():
+                        pending[key] = pending.get(key, Decimal('0')) + delta
+                    log_rows += rows
+
+        for key, delta in deltas.items():
+            balances[key] = balances.get(key, Decimal('0')) + delta
+
+        inventories = Inventory.objects.values(
+            'goods_id', 'goods__name', 'warehouse_id', 'warehouse__name', 'quantity'
+        ).order_by('goods_id', 'warehouse_id')
+        if goods_id:
+            inventories = inventories.filter(goods_id=goods_id)
+
         inconsistencies = []
-        
+        inventory_rows = 0
+        for inv in inventories.iterator(chunk_size=2000):
+            inventory_rows += 1
+            key = (inv['goods_id'], inv['warehouse_id'])
+            calculated_quantity = balances.get(key, Decimal('0')) + pending.get(key, Decimal('0'))
+            if abs(inv['quantity'] - calculated_quantity) > Decimal('0.01'):
+                inconsistencies.append({
+                    'type': 'quantity_mismatch',
+                    'goods_id': inv['goods_id'],
+                    'goods_name': inv['goods__name'],
+                    'warehouse_id': inv['warehouse_id'],
+                    'warehouse_name': inv['warehouse__name'],
+                    'inventory_quantity': inv['quantity'],
+                    'calculated_quantity': calculated_quantity,
+                    'difference': inv['quantity'] - calculated_quantity
+                })
+
+        GoodsInventoryService._save_checkpoint(
+            balances, deltas if mode == 'incremental' else None, committed_id, goods_id
+        )
+
+        elapsed = time.perf_counter() - started
+        total_rows = log_rows + inventory_rows
+        return {
+            'mode': mode,
+            'from_log_id': base_log_id,
+            'to_log_id': max_log_id,
+            'checkpoint_log_id': committed_id,
+            'log_rows': log_rows,
+            'inventory_rows': inventory_rows,
+            'elapsed': round(elapsed, 4),
+            'rows_per_second': round(total_rows / elapsed, 1) if elapsed > 0 else total_rows,
+            'inconsistencies': inconsistencies
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def _save_checkpoint(balances, changed_keys, last_log_id, goods_id=None):
+        """
+        持久化校验检查点，本次校验范围内的商品检查点位置统一推进到 last_log_id
+        :param balances: 校验范围内全部 商品/仓库 的流水结存
+        :param changed_keys: 增量模式下本次有变动的键，为 None 时重建（指定商品时只重建该商品）
+        :param last_log_id: 本次汇总到的流水ID（提交水位）
+        :param goods_id: 只校验了单个商品时的商品ID
+        """
+        from inventory.models import InventoryCheckpoint
+
+        now = timezone.now()
+        scope = InventoryCheckpoint.objects.all()
         if goods_id:
-            goods_list = Goods.objects.filter(id=goods_id)
-        else:
-            goods_list = Goods.objects.all()
-        
-        for goods in goods_list:
-            inventories = Inventory.objects.filter(goods=goods)
-            
-            for inv in inventories:
-                logs = InventoryLog.objects.filter(
-                    goods=goods,
-                    warehouse=inv.warehouse
-                ).order_by('created_at')
-                
-                calculated_quantity = Decimal('0')
-                for log in logs:
-                    if log.change_type in ['inbound', 'adjust']:
-                        calculated_quantity += log.change_quantity
-                    elif log.change_type == 'outbound':
-                        calculated_quantity -= log.change_quantity
-                
-                if abs(inv.quantity - calculated_quantity) > Decimal('0.01'):
-                    inconsistencies.append({
-                        'type': 'quantity_mismatch',
-                        'goods_id': goods.id,
-                        'goods_name': goods.name,
-                        'warehouse_id': inv.warehouse.id,
-                        'warehouse_name': inv.warehouse.name,
-                        'inventory_quantity': inv.quantity,
-                        'calculated_quantity': calculated_quantity,
-                        'difference': inv.quantity - calculated_quantity
-                    })
-        
-        return inconsistencies
+            scope = scope.filter(goods_id=goods_id)
+
+        if changed_keys is None:
+            scope.delete()
+            InventoryCheckpoint.objects.bulk_create([
+                InventoryCheckpoint(goods_id=key_goods_id, warehouse_id=warehouse_id, quantity=quantity,
+                                    last_log_id=last_log_id, checked_at=now)
+                for (key_goods_id, warehouse_id), quantity in balances.items()
+            ], batch_size=1000)
+            return
+
+        existing = {
+            (cp.goods_id, cp.warehouse_id): cp
+            for cp in InventoryCheckpoint.objects.filter(
+                goods_id__in={key_goods_id for key_goods_id, _ in changed_keys}
+            )
+        } if changed_keys else {}
+        to_update = []
+        to_create = []
+        for key in changed_keys:
+            checkpoint = existing.get(key)
+            if checkpoint is None:
+                to_create.append(InventoryCheckpoint(
+                    goods_id=key[0], warehouse_id=key[1], quantity=balances[key],
+                    last_log_id=last_log_id, checked_at=now
+                ))
+            else:
+                checkpoint.quantity = balances[key]
+                to_update.append(checkpoint)
+
+        InventoryCheckpoint.objects.bulk_update(to_update, ['quantity'], batch_size=1000)
+        InventoryCheckpoint.objects.bulk_create(to_create, batch_size=1000)
+        scope.update(last_log_id=last_log_id, checked_at=now)
     
+    REPAIR_TARGETS = ('ledger', 'inventory')
+
     @staticmethod
-    @transaction.atomic
-    def fix_inconsistency(inconsistency):
+    def ledger_balances(goods_ids):
+        """
+        全量重算指定商品的流水结存（在线流水与归档流水，不使用检查点）
+        :return: ({(goods_id, warehouse_id): 流水结存}, 汇总流水行数)
+        """
+        from inventory.models import InventoryLog, InventoryLogArchive
+
+        goods_ids = sorted(goods_ids)
+        balances = {}
+        row_count = 0
+        for model in (InventoryLog, InventoryLogArchive):
+            for start in range(0, len(goods_ids), 1000):
+                part, rows = GoodsInventoryService.aggregate_log_balances(
+                    model.objects.filter(goods_id__in=goods_ids[start:start + 1000])
+                )
+                for key, delta in part.items():
+                    balances[key] = balances.get(key, Decimal('0')) + delta
+                row_count += rows
+        return balances, row_count
+
+    @staticmethod
+    def _correction(item, inventory_quantity, calculated_quantity, target):
+        """按库存数量与流水结存计算单行修正量"""
+        target_quantity = calculated_quantity if target == 'ledger' else inventory_quantity
+        return {
+            **item,
+            'inventory_quantity': inventory_quantity,
+            'calculated_quantity': calculated_quantity,
+            'difference': inventory_quantity - calculated_quantity,
+            'target_quantity': target_quantity,
+            'inventory_delta': target_quantity - inventory_quantity,
+            'log_delta': target_quantity - calculated_quantity
+        }
+
+    @staticmethod
+    def plan_repair(inconsistencies=None, target='ledger'):
         """
-        修复数据不一致
-        :param inconsistency: 不一致数据字典
+        生成修复方案：修复范围内的商品全量重算流水结存（不信任增量检查点），按最新的库存数量计算每行的修正量，
+        不使用调用方传入的数量。未指定修复范围时先增量校验找出候选行，再全量重算确认
+        target=ledger 以流水结存为准修正库存数量；target=inventory 以库存数量为准补记盘点流水
+        :param inconsistencies: 校验报告中的不一致数据列表（只修复其中的 商品/仓库），为空则修复校验发现的全部
+        :param target: 修复基准 ledger/inventory
+        :return: (修复方案列表, 校验统计, 已不存在差异的行数)
         """
         from inventory.models import Inventory
-        
-        try:
-            inv = Inventory.objects.get(
-                goods_id=inconsistency['goods_id'],
-                warehouse_id=inconsistency['warehouse_id']
-            )
-            
-            old_quantity = inv.quantity
-            inv.quantity = inconsistency['calculated_quantity']
-            inv.save()
-            
-            return {
-                'success': True,
-                'goods_id': inconsistency['goods_id'],
-                'warehouse_id': inconsistency['warehouse_id'],
-                'old_quantity': old_quantity,
-                'new_quantity': inv.quantity
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
+
+        if target not in GoodsInventoryService.REPAIR_TARGETS:
+            raise ValueError('修复基准只能是 ledger 或 inventory')
+
+        started = time.perf_counter()
+        if inconsistencies is None:
+            scan = GoodsInventoryService.check_consistency(mode='incremental')
+            keys = {(item['goods_id'], item['warehouse_id']) for item in scan.pop('inconsistencies')}
+        else:
+            try:
+                keys = {(int(item['goods_id']), int(item['warehouse_id'])) for item in inconsistencies}
+            except (KeyError, TypeError, ValueError):
+                raise ValueError('不一致数据缺少商品或仓库')
+            scan = {}
+
+        ledger, log_rows = GoodsInventoryService.ledger_balances({goods_id for goods_id, _ in keys})
+        inventories = Inventory.objects.filter(
+            goods_id__in={goods_id for goods_id, _ in keys}
+        ).values('goods_id', 'goods__name', 'warehouse_id', 'warehouse__name', 'quantity')
+
+        corrections = []
+        for inv in inventories:
+            key = (inv['goods_id'], inv['warehouse_id'])
+            if key not in keys:
+                continue
+            calculated_quantity = ledger.get(key, Decimal('0'))
+            if abs(inv['quantity'] - calculated_quantity) <= Decimal('0.01'):
+                continue
+            corrections.append(GoodsInventoryService._correction({
+                'type': 'quantity_mismatch',
+                'goods_id': inv['goods_id'],
+                'goods_name': inv['goods__name'],
+                'warehouse_id': inv['warehouse_id'],
+                'warehouse_name': inv['warehouse__name']
+            }, inv['quantity'], calculated_quantity, target))
+        corrections.sort(key=lambda item: (item['goods_id'], item['warehouse_id']))
+
+        if inconsistencies is not None:
+            elapsed = time.perf_counter() - started
+            scan = {
+                'mode': 'full',
+                'log_rows': log_rows,
+                'inventory_rows': len(keys),
+                'elapsed': round(elapsed, 4),
+                'rows_per_second': round((log_rows + len(keys)) / elapsed, 1) if elapsed > 0 else log_rows
             }
-    
+        return corrections, scan, len(keys) - len(corrections)
+
+    @staticmethod
+    def _resync_goods_totals(goods_ids):
+        """
+        按库存行重新汇总商品总库存并重算库存状态（修复场景下不依赖原冗余值，分两条语句执行）
+        """
+        from basic.models import Goods
+        from inventory.models import Inventory
+
+        totals = Inventory.objects.filter(goods_id=models.OuterRef('pk')).order_by().values('goods_id').annotate(
+            total=Sum('quantity')
+        ).values('total')
+        goods = Goods.objects.filter(id__in=list(goods_ids))
+        goods.update(total_quantity=Coalesce(
+            models.Subquery(totals), models.Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        ))
+        goods.update(stock_status=Goods.stock_status_expression())
+        GoodsInventoryService.invalidate_goods_stock_summary()
+
+    @staticmethod
+    def repair_inconsistencies(inconsistencies=None, target='ledger', dry_run=False, created_by=None):
+        """
+        批量修复库存不一致：一个事务内按 商品/仓库 顺序锁定库存行，
+        库存数量修正一次 bulk_update，补记的盘点流水一次 bulk_create，再按库存行重新汇总商品总库存与库存状态。
+        每行修正后满足 库存数量 = 流水结存：库存修正量 = 目标 - 库存数量，补记流水 = 目标 - 流水结存。
+        修正量按锁定后重新读取的库存数量与全量重算的流水结存计算，锁内已一致的行跳过。
+        :param inconsistencies: 校验报告中的不一致数据列表，为空则重新校验并修复全部
+        :param target: 修复基准 ledger（以流水为准改库存）/ inventory（以库存为准补流水）
+        :param dry_run: 只返回修复方案，不写入
+        :param created_by: 操作人
+        :return: 修复报告（修复方案、修复/跳过行数及吞吐统计）
+        """
+        from inventory.models import Inventory, InventoryLog
+        from inventory.services import InventoryService
+
+        started = time.perf_counter()
+        corrections, scan, resolved = GoodsInventoryService.plan_repair(inconsistencies, target)
+        result = {
+            'target': target,
+            'dry_run': dry_run,
+            'planned': len(corrections),
+            'repaired': 0,
+            'changed': 0,
+            'resolved': resolved,
+            'scan': scan,
+            'corrections': corrections
+        }
+
+        if not dry_run and corrections:
+            plan = {(item['goods_id'], item['warehouse_id']): item for item in corrections}
+            now = timezone.now()
+
+            with transaction.atomic():
+                # 先锁定库存行，再在锁内全量重算流水结存：库存变动都先锁库存行再写流水，
+                # 锁定后读到的库存数量与流水结存不会再被并发事务改变
+                locked = InventoryService.lock_rows(plan)
+                ledger, _ = GoodsInventoryService.ledger_balances({goods_id for goods_id, _ in plan})
+
+                changed_rows = []
+                logs = []
+                line_deltas = {}
+                for key in sorted(plan):
+                    inv = locked.get(key)
+                    if inv is None:
+                        continue
+                    item = GoodsInventoryService._correction(
+                        plan[key], inv.quantity, ledger.get(key, Decimal('0')), target
+                    )
+                    if abs(item['difference']) <= Decimal('0.01'):
+                        result['changed'] += 1
+                        continue
+
+                    if item['inventory_delta']:
+                        inv.quantity = item['target_quantity']
+                        inv.updated_at = now
+                        changed_rows.append(inv)
+                        line_deltas[key] = item['inventory_delta']
+                    if item['log_delta']:
+                        logs.append(InventoryLog(
+                            goods_id=inv.goods_id,
+                            warehouse_id=inv.warehouse_id,
+                            change_type='check',
+                            movement_kind='check',
+                            change_quantity=item['log_delta'],
+                            before_quantity=item['calculated_quantity'],
+                            after_quantity=item['target_quantity'],
+                            unit_cost=inv.unit_cost,
+                            remark='数据一致性修复',
+                            created_by=created_by
+                        ))
+                    result['repaired'] += 1
+
+                Inventory.objects.bulk_update(changed_rows, ['quantity', 'updated_at'], batch_size=1000)
+                InventoryLog.objects.bulk_create(logs, batch_size=1000)
+                if changed_rows:
+                    GoodsInventoryService._resync_goods_totals({inv.goods_id for inv in changed_rows})
+                    InventoryService.refresh_stock_status(
+                        {inv.goods_id for inv in changed_rows}, {inv.warehouse_id for inv in changed_rows}
+                    )
+                    InventoryService._publish_movements(line_deltas)
+
+        elapsed = time.perf_counter() - started
+        result['elapsed'] = round(elapsed, 4)
+        result['rows_per_second'] = round(len(corrections) / elapsed, 1) if elapsed > 0 else len(corrections)
+        return result
+
     @staticmethod
     def get_stock_warning_goods():
         """
-        获取库存预警商品列表
+        获取库存预警商品列表（缺货、库存不足）
+        一条查询读取商品冗余的总库存与库存状态，并关联分类名称
         :return: 预警商品列表
         """
-        from inventory.models import Inventory
         from basic.models import Goods
-        
-        warnings = []
-        
-        goods_list = Goods.objects.filter(status=1).prefetch_related('inventory_set')
-        
-        for goods in goods_list:
-            stock_status = GoodsInventoryService.get_goods_stock_status(goods)
-            
-            if stock_status['is_warning']:
-                warnings.append({
-                    'goods_id': goods.id,
-                    'goods_code': goods.code,
-                    'goods_name': goods.name,
-                    'category': goods.category.name if goods.category else '',
-                    'total_quantity': stock_status['total_quantity'],
-                    'min_stock': stock_status['min_stock'],
-                    'max_stock': stock_status['max_stock'],
-                    'status_code': stock_status['status_code'],
-                    'status_text': stock_status['status_text']
-                })
-        
-        return warnings
+
+        status_texts = dict(Goods.STOCK_STATUS_CHOICES)
+        rows = Goods.objects.filter(status=1, stock_status__in=['out', 'low']).order_by('id').values(
+            'id', 'code', 'name', 'category__name', 'total_quantity', 'min_stock', 'max_stock', 'stock_status'
+        )
+
+        return [
+            {
+                'goods_id': row['id'],
+                'goods_code': row['code'],
+                'goods_name': row['name'],
+                'category': row['category__name'] or '',
+                'total_quantity': row['total_quantity'],
+                'min_stock': row['min_stock'] or 0,
+                'max_stock': row['max_stock'] or 0,
+                'status_code': row['stock_status'],
+                'status_text': status_texts[row['stock_status']]
+            }
+            for row in rows
+        ]
     
+    SUMMARY_CACHE_KEY = 'inventory:goods_stock_summary'
+    SUMMARY_VERSION_KEY = 'inventory:goods_stock_summary:version'
+
     @staticmethod
-    def get_goods_stock_summary():
+    def compute_goods_stock_summary():
         """
-        获取商品库存汇总统计
+        计算商品库存汇总统计：一次条件聚合读取商品冗余的总库存与库存状态
         :return: 统计数据
         """
-        from inventory.models import Inventory
         from basic.models import Goods
-        
-        total_goods = Goods.objects.filter(status=1).count()
-        
-        total_quantity = Inventory.objects.aggregate(
-            total=Sum('quantity')
-        )['total'] or Decimal('0')
-        
-        out_of_stock = 0
-        low_stock = 0
-        normal_stock = 0
-        over_stock = 0
-        
-        goods_list = Goods.objects.filter(status=1)
-        for goods in goods_list:
-            status = GoodsInventoryService.get_goods_stock_status(goods)
-            if status['status_code'] == 'out':
-                out_of_stock += 1
-            elif status['status_code'] == 'low':
-                low_stock += 1
-            elif status['status_code'] == 'over':
-                over_stock += 1
-            else:
-                normal_stock += 1
-        
-        return {
-            'total_goods': total_goods,
-            'total_quantity': total_quantity,
-            'out_of_stock': out_of_stock,
-            'low_stock': low_stock,
-            'normal_stock': normal_stock,
-            'over_stock': over_stock,
-            'warning_count': out_of_stock + low_stock
-        }
+
+        active = Q(status=1)
+        stats = Goods.objects.aggregate(
+            total_goods=Count('id', filter=active),
+            total_quantity=Sum('total_quantity'),
+            out_of_stock=Count('id', filter=active & Q(stock_status='out')),
+            low_stock=Count('id', filter=active & Q(stock_status='low')),
+            normal_stock=Count('id', filter=active & Q(stock_status='normal')),
+            over_stock=Count('id', filter=active & Q(stock_status='over'))
+        )
+        stats['total_quantity'] = stats['total_quantity'] or Decimal('0')
+        stats['warning_count'] = stats['out_of_stock'] + stats['low_stock']
+        return stats
+
+    @staticmethod
+    def _summary_cache_key():
+        """带版本号的汇总缓存键，失效时递增版本号，旧版本的并发回写不会被读到"""
+        version = cache_version(GoodsInventoryService.SUMMARY_VERSION_KEY)
+        return f'{GoodsInventoryService.SUMMARY_CACHE_KEY}:{version}'
+
+    @staticmethod
+    def get_goods_stock_summary():
+        """
+        获取商品库存汇总统计（缓存在共享缓存中，库存变动、阈值调整和商品增删改时失效；
+        后台任务、发件箱分发等进程中的变动也能让各 Web 进程的缓存失效）
+        :return: 统计数据
+        """
+        key = GoodsInventoryService._summary_cache_key()
+        summary = shared_cache().get(key)
+        if summary is None:
+            summary = GoodsInventoryService.compute_goods_stock_summary()
+            shared_cache().set(key, summary, settings.GOODS_STOCK_SUMMARY_CACHE_TIMEOUT)
+        return summary
+
+    @staticmethod
+    def invalidate_goods_stock_summary():
+        """事务提交后使商品库存汇总缓存失效"""
+        transaction.on_commit(lambda: bump_cache_version(GoodsInventoryService.SUMMARY_VERSION_KEY))
@@ -0,0 +1,24 @@
+"""
+库存模块后台任务
+"""
+from django.conf import settings
+
+from system.services import JobService
+
+
+@JobService.register('inventory.confirm_stock_in')
+def confirm_stock_in(job, progress):
+    """后台确认入库单：按明细分批入库并上报进度"""
+    from .document_service import StockDocumentService
+    from .models import StockIn
+
+    stock_in = StockIn.objects.select_related('purchase_order', 'warehouse').get(id=job.params['stock_in_id'])
+    if stock_in.status != 'draft':
+        raise ValueError('该入库单状态不允许确认，只有草稿状态才能确认')
+    if not stock_in.purchase_order:
+        raise ValueError('该入库单未关联采购订单')
+
+    StockDocumentService.confirm_stock_in(
+        stock_in, created_by=job.created_by, chunk_size=settings.JOB_CHUNK_SIZE, progress=progress
+    )
+    return {'stock_in_id': stock_in.id, 'stock_in_no': stock_in.order_no}
@@ -0,0 +1,69 @@
+"""
+库存流水归档管理命令
+将超过在线保留期的流水分批迁入归档表（保留原流水ID），每批一个事务
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.models import InventoryLog, InventoryLogArchive
+from utils.dates import day_start
+
+
+class Command(BaseCommand):
+    help = '将超过保留期的库存流水分批迁入归档表'
+
+    ARCHIVE_FIELDS = [
+        'id', 'goods_id', 'warehouse_id', 'change_type', 'movement_kind', 'change_quantity',
+        'before_quantity', 'after_quantity', 'related_order_type', 'related_order_id',
+        'unit_cost', 'remark', 'created_by_id', 'created_at'
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.INVENTORY_LOG_HOT_DAYS,
+                            help='在线保留天数，早于该天数的流水被归档')
+        parser.add_argument('--batch-size', type=int, default=2000, help='每批迁移的流水条数')
+        parser.add_argument('--max-batches', type=int, default=0, help='本次最多执行的批次数，0 表示不限')
+        parser.add_argument('--dry-run', action='store_true', help='只统计待归档流水，不迁移')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+        if days < 1 or batch_size < 1:
+            raise CommandError('保留天数和批次大小必须大于0')
+
+        cutoff = day_start(timezone.localdate() - timedelta(days=days))
+        pending = InventoryLog.objects.filter(created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'待归档流水 {pending.count()} 条（早于 {cutoff:%Y-%m-%d}）')
+            return
+
+        self.stdout.write(f'开始归档早于 {cutoff:%Y-%m-%d} 的库存流水，每批 {batch_size} 条...')
+        started = time.perf_counter()
+        moved = 0
+        batches = 0
+
+        while not options['max_batches'] or batches < options['max_batches']:
+            ids = list(pending.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            with transaction.atomic():
+                rows = InventoryLog.objects.filter(id__in=ids).order_by().values(*self.ARCHIVE_FIELDS)
+                InventoryLogArchive.objects.bulk_create(
+                    [InventoryLogArchive(**row) for row in rows], batch_size=500
+                )
+                InventoryLog.objects.filter(id__in=ids).delete()
+
+            moved += len(ids)
+            batches += 1
+            elapsed = time.perf_counter() - started
+            rate = moved / elapsed if elapsed > 0 else moved
+            self.stdout.write(f'  第 {batches} 批：累计归档 {moved} 条，{rate:.0f} 条/秒')
+
+        self.stdout.write(self.style.SUCCESS(f'归档完成，共迁移 {moved} 条流水'))
@@ -0,0 +1,74 @@
+"""
+库存单据创建压测命令
+按指定明细行数创建调整单、调拨单，输出每张单据的 SQL 条数与耗时（验证查询数不随明细行数增长）
+"""
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from basic.models import Category, Goods, Warehouse
+from inventory.models import Inventory, StockAdjust, StockTransfer
+from inventory.serializers import StockAdjustCreateSerializer, StockTransferCreateSerializer
+
+
+class Command(BaseCommand):
+    help = '库存调整单/调拨单批量明细创建压测（输出 SQL 条数与耗时）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=2000, help='每张单据的明细行数')
+        parser.add_argument('--repeat', type=int, default=3, help='每种单据创建次数')
+
+    def handle(self, *args, **options):
+        lines = options['lines']
+        suffix = uuid.uuid4().hex[:8].upper()
+        warehouse = Warehouse.objects.create(name=f'压测仓库-{suffix}')
+        warehouse2 = Warehouse.objects.create(name=f'压测仓库2-{suffix}')
+        category = Category.objects.create(name=f'压测分类-{suffix}')
+        Goods.objects.bulk_create([
+            Goods(code=f'BENCH-{suffix}-{i}', name=f'压测商品-{suffix}-{i}', category=category)
+            for i in range(lines)
+        ], batch_size=500)
+        goods_ids = list(Goods.objects.filter(category=category).order_by('id').values_list('id', flat=True))
+        # 一半商品已有库存，另一半需要补建库存行
+        Inventory.objects.bulk_create([
+            Inventory(goods_id=goods_id, warehouse=warehouse, quantity=Decimal('100'))
+            for goods_id in goods_ids[:lines // 2]
+        ], batch_size=500)
+
+        documents = {
+            '调整单(增加)': (StockAdjustCreateSerializer, {
+                'warehouse': warehouse.id, 'adjust_type': 'increase', 'reason': 'other',
+                'items': [{'goods': goods_id, 'adjust_quantity': '1'} for goods_id in goods_ids]
+            }),
+            '调拨单': (StockTransferCreateSerializer, {
+                'from_warehouse': warehouse.id, 'to_warehouse': warehouse2.id,
+                'items': [{'goods': goods_id, 'quantity': '1'} for goods_id in goods_ids]
+            }),
+        }
+
+        try:
+            for name, (serializer_class, data) in documents.items():
+                for index in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        serializer = serializer_class(data=data)
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save(order_no=f'BENCH{suffix}{name[:2]}{index}')
+                        elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f'[{name}] 明细={lines} SQL={len(queries)} 耗时={elapsed * 1000:.1f}ms '
+                        f'吞吐={lines / elapsed if elapsed else 0:.0f} 行/秒'
+                    )
+        finally:
+            StockAdjust.objects.filter(warehouse=warehouse).delete()
+            StockTransfer.objects.filter(from_warehouse=warehouse).delete()
+            Inventory.objects.filter(warehouse__in=[warehouse, warehouse2]).delete()
+            Goods.objects.filter(category=category).delete()
+            category.delete()
+            warehouse.delete()
+            warehouse2.delete()
+        self.stdout.write(self.style.SUCCESS('压测完成，测试数据已清理'))
@@ -0,0 +1,103 @@
+"""
+流水分页压测命令
+对比页码分页（OFFSET + COUNT(*)）与游标分页（(created_at, id) 范围查询）在不同翻页深度下的耗时
+"""
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from django.db.models import DurationField, ExpressionWrapper, F, Value
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from basic.models import Category, Goods, Warehouse
+from inventory.models import InventoryLog
+from utils.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+    help = '流水分页压测（页码分页与游标分页在不同深度下的耗时对比）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='生成的流水条数')
+        parser.add_argument('--page-size', type=int, default=50, help='每页条数')
+        parser.add_argument('--depths', default='1,10,100,500,1000', help='测试的页码深度，逗号分隔')
+        parser.add_argument('--repeat', type=int, default=5, help='每个深度重复次数（取中位数）')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        page_size = options['page_size']
+        depths = [int(depth) for depth in options['depths'].split(',') if depth.strip()]
+        max_page = (rows + page_size - 1) // page_size
+        depths = [depth for depth in depths if 1 <= depth <= max_page]
+
+        suffix = uuid.uuid4().hex[:8].upper()
+        warehouse = Warehouse.objects.create(name=f'压测仓库-{suffix}')
+        category = Category.objects.create(name=f'压测分类-{suffix}')
+        goods = Goods.objects.create(code=f'BENCH-{suffix}', name=f'压测商品-{suffix}', category=category)
+
+        try:
+            self.stdout.write(f'生成 {rows} 条压测流水...')
+            InventoryLog.objects.bulk_create([
+                InventoryLog(
+                    goods=goods,
+                    warehouse=warehouse,
+                    change_type='inbound',
+                    change_quantity=Decimal('1'),
+                    before_quantity=Decimal(i),
+                    after_quantity=Decimal(i + 1),
+                    remark='压测流水'
+                )
+                for i in range(rows)
+            ], batch_size=2000)
+            # created_at 为自动填充的同一时刻，按ID逐秒错开以模拟真实的时间分布
+            InventoryLog.objects.filter(goods=goods).update(
+                created_at=F('created_at') - ExpressionWrapper(
+                    (Value(rows) - F('id')) * Value(timedelta(seconds=1)), output_field=DurationField()
+                )
+            )
+
+            queryset = InventoryLog.objects.filter(goods=goods, warehouse=warehouse)
+            self.stdout.write(f'每页 {page_size} 条，重复 {options["repeat"]} 次取中位数')
+            self.stdout.write(f'{"页码":>8} {"页码分页(ms)":>14} {"游标分页(ms)":>14}')
+            for depth in depths:
+                offset_ms = self.measure(queryset, {'page': depth, 'page_size': page_size}, options['repeat'])
+                cursor = self.cursor_at(queryset, (depth - 1) * page_size, page_size)
+                cursor_ms = self.measure(queryset, {'cursor': cursor, 'page_size': page_size}, options['repeat'])
+                self.stdout.write(f'{depth:>8} {offset_ms:>14.2f} {cursor_ms:>14.2f}')
+        finally:
+            InventoryLog.objects.filter(goods=goods).delete()
+            goods.delete()
+            category.delete()
+            warehouse.delete()
+
+    def cursor_at(self, queryset, offset, page_size):
+        """生成指向第 offset 条记录之前的游标（首页为空游标）"""
+        if offset == 0:
+            return ''
+        paginator = KeysetPagination()
+        paginator.request = self.build_request({'page_size': page_size})
+        row = queryset.order_by('-created_at', '-id').values('id', 'created_at')[offset - 1]
+        next_link = paginator.encode_cursor(row)
+        return parse_qs(urlparse(next_link).query)['cursor'][0]
+
+    def build_request(self, params):
+        """构造分页请求"""
+        return Request(APIRequestFactory().get('/', params))
+
+    def measure(self, queryset, params, repeat):
+        """执行分页查询并返回耗时中位数（毫秒）"""
+        timings = []
+        for _ in range(repeat):
+            paginator = KeysetPagination()
+            request = self.build_request(params)
+            started = time.perf_counter()
+            page = paginator.paginate_queryset(queryset, request)
+            list(page)
+            paginator.get_paginated_response([])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
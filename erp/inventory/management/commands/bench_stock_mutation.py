@@ -0,0 +1,123 @@
+"""
+库存扣减并发压测命令
+对比旧的读改写实现与条件 UPDATE 实现在多线程并发出库下的吞吐量和数据正确性
+"""
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from basic.models import Category, Goods, Warehouse
+from inventory.models import Inventory, InventoryLog
+from inventory.services import InventoryService
+
+
+def legacy_stock_out(goods, warehouse, quantity):
+    """旧实现：读取库存 -> Python 中扣减 -> save() 整行写回"""
+    with transaction.atomic():
+        inventory = Inventory.objects.get(goods=goods, warehouse=warehouse)
+        if inventory.quantity < quantity:
+            raise ValueError(f'商品 {goods.name} 库存不足，当前库存：{inventory.quantity}')
+        old_quantity = inventory.quantity
+        inventory.quantity -= quantity
+        inventory.save()
+        InventoryLog.objects.create(
+            goods=goods,
+            warehouse=warehouse,
+            change_type='outbound',
+            change_quantity=quantity,
+            before_quantity=old_quantity,
+            after_quantity=inventory.quantity,
+            remark='压测出库'
+        )
+
+
+def guarded_stock_out(goods, warehouse, quantity):
+    """新实现：InventoryService 条件 UPDATE"""
+    InventoryService.stock_out(goods, warehouse, quantity, remark='压测出库')
+
+
+class Command(BaseCommand):
+    help = '库存并发扣减压测（验证无丢失更新并输出 ops/sec）'
+
+    MODES = {
+        'legacy': legacy_stock_out,
+        'guarded': guarded_stock_out,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+        parser.add_argument('--ops', type=int, default=100, help='每个线程的出库次数')
+        parser.add_argument('--mode', choices=['legacy', 'guarded', 'all'], default='all', help='压测实现')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        ops = options['ops']
+        modes = list(self.MODES) if options['mode'] == 'all' else [options['mode']]
+
+        suffix = uuid.uuid4().hex[:8].upper()
+        warehouse = Warehouse.objects.create(name=f'压测仓库-{suffix}')
+        category = Category.objects.create(name=f'压测分类-{suffix}')
+        goods = Goods.objects.create(code=f'BENCH-{suffix}', name=f'压测商品-{suffix}', category=category)
+
+        try:
+            for mode in modes:
+                self.run_mode(mode, goods, warehouse, threads, ops)
+        finally:
+            InventoryLog.objects.filter(goods=goods).delete()
+            Inventory.objects.filter(goods=goods).delete()
+            goods.delete()
+            category.delete()
+            warehouse.delete()
+
+    def run_mode(self, mode, goods, warehouse, threads, ops):
+        """以指定实现执行一轮并发出库"""
+        func = self.MODES[mode]
+        initial = Decimal(threads * ops)
+        Inventory.objects.update_or_create(goods=goods, warehouse=warehouse, defaults={'quantity': initial})
+        InventoryLog.objects.filter(goods=goods).delete()
+
+        errors = []
+        succeeded = []
+        lock = threading.Lock()
+
+        def worker():
+            done = 0
+            try:
+                for _ in range(ops):
+                    try:
+                        func(goods, warehouse, Decimal('1'))
+                        done += 1
+                    except Exception as e:
+                        with lock:
+                            errors.append(str(e))
+            finally:
+                with lock:
+                    succeeded.append(done)
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        success_count = sum(succeeded)
+        final_quantity = Inventory.objects.get(goods=goods, warehouse=warehouse).quantity
+        expected_quantity = initial - success_count
+        lost_updates = final_quantity - expected_quantity
+
+        self.stdout.write(f'[{mode}] 线程数={threads} 成功={success_count} 失败={len(errors)} '
+                          f'耗时={elapsed:.3f}s 吞吐={success_count / elapsed if elapsed else 0:.1f} ops/sec')
+        self.stdout.write(f'[{mode}] 期望库存={expected_quantity} 实际库存={final_quantity}')
+        if lost_updates:
+            self.stdout.write(self.style.ERROR(f'[{mode}] 检测到丢失更新 {lost_updates} 次'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'[{mode}] 无丢失更新'))
+        if errors:
+            self.stdout.write(self.style.WARNING(f'[{mode}] 首个错误: {errors[0]}'))
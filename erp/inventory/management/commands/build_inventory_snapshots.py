@@ -0,0 +1,36 @@
+"""
+生成库存结存快照的管理命令
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.models import InventorySnapshot
+from inventory.snapshot_service import InventorySnapshotService
+
+
+class Command(BaseCommand):
+    help = '增量生成库存日结/月结快照'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=['day', 'month'], default='month', help='结存周期')
+        parser.add_argument('--until', help='结存截止日期 YYYY-MM-DD，默认为最近一个已结束周期')
+        parser.add_argument('--rebuild', action='store_true', help='删除该周期已有快照后重新生成')
+
+    def handle(self, *args, **options):
+        period = options['period']
+        until = None
+        if options['until']:
+            try:
+                until = parse_date(options['until'])
+            except ValueError:
+                until = None
+            if until is None:
+                raise CommandError('截止日期格式错误，应为 YYYY-MM-DD')
+
+        if options['rebuild']:
+            deleted, _ = InventorySnapshot.objects.filter(period=period).delete()
+            self.stdout.write(f'已删除 {deleted} 条{period}快照')
+
+        self.stdout.write(f'开始生成{period}快照...')
+        created = InventorySnapshotService.build(period=period, until=until, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'快照生成完成，共新增 {created} 条'))
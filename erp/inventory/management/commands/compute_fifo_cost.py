@@ -0,0 +1,44 @@
+"""
+增量计算 FIFO 成本层与流水成本的管理命令
+按商品分区并行计算，每批流水独立提交，中断后重新执行即从各商品的已处理流水ID续算
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory.cost_service import FifoCostService
+from inventory.models import CostCheckpoint, CostLayer, MovementCost
+
+
+class Command(BaseCommand):
+    help = '增量计算 FIFO 成本层与每笔流水的成本（销售出库成本）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.COST_WORKERS, help='并行进程数')
+        parser.add_argument('--partition-size', type=int, default=200, help='每个分区的商品数')
+        parser.add_argument('--chunk-size', type=int, default=settings.COST_CHUNK_SIZE, help='每批写回的流水条数')
+        parser.add_argument('--rebuild', action='store_true', help='清空已有成本层与流水成本后从头计算')
+
+    def handle(self, *args, **options):
+        if options['partition_size'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('分区大小和批次大小必须大于0')
+
+        if options['rebuild']:
+            with transaction.atomic():
+                MovementCost.objects.all().delete()
+                CostLayer.objects.all().delete()
+                CostCheckpoint.objects.all().delete()
+            self.stdout.write('已清空成本层、流水成本与计算进度')
+
+        self.stdout.write(f'开始计算 FIFO 成本，并行进程 {options["workers"]}...')
+        result = FifoCostService.run(
+            workers=options['workers'],
+            partition_size=options['partition_size'],
+            chunk_size=options['chunk_size'],
+            stdout=self.stdout
+        )
+        rate = result['logs'] / result['seconds'] if result['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'计算完成：商品 {result["goods"]} 个，流水 {result["logs"]} 条（截止流水ID {result["upper_log_id"]}），'
+            f'销售成本 {result["cogs"]:.2f}，耗时 {result["seconds"]:.2f} 秒，{rate:.0f} 条/秒'
+        ))
@@ -0,0 +1,43 @@
+"""
+盘点导入命令
+流式读取盘点 CSV（列：商品编码,盘点数量[,备注]），与当前库存比对后生成盘点调整单（草稿）
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from basic.models import Warehouse
+from inventory.stocktake_service import StocktakeImportService
+
+
+class Command(BaseCommand):
+    help = '导入盘点文件并生成盘点调整单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='盘点 CSV 文件路径')
+        parser.add_argument('--warehouse', type=int, required=True, help='盘点仓库ID')
+        parser.add_argument('--encoding', default='utf-8-sig', help='文件编码，如 utf-8-sig、gbk')
+        parser.add_argument('--remark', default='', help='调整单备注')
+        parser.add_argument('--chunk-size', type=int, default=StocktakeImportService.CHUNK_SIZE, help='每批处理的行数')
+
+    def handle(self, *args, **options):
+        warehouse = Warehouse.objects.filter(id=options['warehouse']).first()
+        if warehouse is None:
+            raise CommandError(f'仓库 {options["warehouse"]} 不存在')
+
+        try:
+            with open(options['path'], 'rb') as file:
+                result = StocktakeImportService.import_csv(
+                    file, warehouse,
+                    remark=options['remark'],
+                    encoding=options['encoding'],
+                    chunk_size=options['chunk_size']
+                )
+        except OSError as e:
+            raise CommandError(f'无法读取文件: {e}')
+        except (ValueError, LookupError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f'共读取 {result["lines"]} 行，差异 {result["adjusted"]} 行')
+        for adjust in (result['increase'], result['decrease']):
+            if adjust is not None:
+                self.stdout.write(f'  生成{adjust.get_adjust_type_display()}单 {adjust.order_no}（{adjust.items.count()} 条明细）')
+        self.stdout.write(self.style.SUCCESS('盘点导入完成，请确认调整单后生效'))
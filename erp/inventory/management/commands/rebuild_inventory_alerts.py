@@ -0,0 +1,22 @@
+"""
+校正库存预警表的管理命令
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.warning_service import StockWarningService
+
+
+class Command(BaseCommand):
+    help = '按实时库存与商品阈值校正库存预警表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只统计差异，不写入预警表')
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始计算预警集合...')
+        result = StockWarningService.rebuild(dry_run=options['dry_run'])
+        prefix = '[试运行] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}校正完成：新增预警 {result["opened"]} 条，解除预警 {result["resolved"]} 条，'
+            f'当前生效预警 {result["active"]} 条'
+        ))
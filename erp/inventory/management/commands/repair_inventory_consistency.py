@@ -0,0 +1,43 @@
+"""
+批量修复库存与流水不一致的管理命令
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.goods_inventory_service import GoodsInventoryService
+
+
+class Command(BaseCommand):
+    help = '校验库存与流水结存，并在一个事务内批量修复全部不一致'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=GoodsInventoryService.REPAIR_TARGETS, default='ledger',
+                            help='修复基准：ledger 以流水为准修正库存，inventory 以库存为准补记盘点流水')
+        parser.add_argument('--dry-run', action='store_true', help='只输出修复方案，不写入')
+        parser.add_argument('--show', type=int, default=20, help='输出的修复明细条数')
+
+    def handle(self, *args, **options):
+        try:
+            result = GoodsInventoryService.repair_inconsistencies(
+                target=options['target'], dry_run=options['dry_run']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        scan = result['scan']
+        self.stdout.write(
+            f'校验 {scan["inventory_rows"]} 个库存行、{scan["log_rows"]} 条流水，'
+            f'{scan["rows_per_second"]} 行/秒'
+        )
+        for item in result['corrections'][:options['show']]:
+            self.stdout.write(
+                f'  {item["goods_name"]} / {item["warehouse_name"]}：库存 {item["inventory_quantity"]}，'
+                f'流水结存 {item["calculated_quantity"]} -> {item["target_quantity"]}'
+            )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'[试运行] 修复方案共 {result["planned"]} 条'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'修复完成：成功 {result["repaired"]} 条，已恢复一致跳过 {result["changed"]} 条，'
+            f'耗时 {result["elapsed"]} 秒，{result["rows_per_second"]} 行/秒'
+        ))
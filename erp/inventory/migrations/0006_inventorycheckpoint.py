@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 12:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basic', '0012_add_print_template'),
+        ('inventory', '0005_stockoutitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='流水结存数量')),
+                ('last_log_id', models.BigIntegerField(default=0, verbose_name='已汇总流水ID')),
+                ('checked_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='校验时间')),
+                ('goods', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.goods', verbose_name='商品')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': '库存校验检查点',
+                'verbose_name_plural': '库存校验检查点',
+                'db_table': 'biz_inventory_checkpoint',
+                'unique_together': {('goods', 'warehouse')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 12:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basic', '0012_add_print_template'),
+        ('inventory', '0006_inventorycheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', '日结'), ('month', '月结')], max_length=10, verbose_name='结存周期')),
+                ('snapshot_date', models.DateField(verbose_name='结存日期')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='期末数量')),
+                ('last_log_id', models.BigIntegerField(default=0, verbose_name='截止流水ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='生成时间')),
+                ('goods', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.goods', verbose_name='商品')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': '库存结存快照',
+                'verbose_name_plural': '库存结存快照',
+                'db_table': 'biz_inventory_snapshot',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inventorysnapshot',
+            index=models.Index(fields=['goods', 'warehouse', 'snapshot_date'], name='biz_invento_goods_i_5be956_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorysnapshot',
+            index=models.Index(fields=['period', 'snapshot_date'], name='biz_invento_period_10fad3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='inventorysnapshot',
+            unique_together={('goods', 'warehouse', 'period', 'snapshot_date')},
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-18 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basic', '0012_add_print_template'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0007_inventorysnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryLogArchive',
+            fields=[
+                ('change_type', models.CharField(choices=[('inbound', '入库'), ('outbound', '出库'), ('adjust', '库存调整'), ('check', '盘点')], max_length=20, verbose_name='变动类型')),
+                ('change_quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='变动数量')),
+                ('before_quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='变动前数量')),
+                ('after_quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='变动后数量')),
+                ('related_order_type', models.CharField(blank=True, max_length=50, verbose_name='关联单据类型')),
+                ('related_order_id', models.IntegerField(blank=True, null=True, verbose_name='关联单据ID')),
+                ('remark', models.CharField(blank=True, max_length=200, verbose_name='备注')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='流水ID')),
+                ('created_at', models.DateTimeField(verbose_name='操作时间')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='归档时间')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='操作人')),
+                ('goods', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.goods', verbose_name='商品')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': '库存流水归档',
+                'verbose_name_plural': '库存流水归档',
+                'db_table': 'biz_inventory_log_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inventorylogarchive',
+            index=models.Index(fields=['goods'], name='biz_invento_goods_i_814811_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylogarchive',
+            index=models.Index(fields=['warehouse'], name='biz_invento_warehou_565bba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylogarchive',
+            index=models.Index(fields=['created_at'], name='biz_invento_created_7062c9_idx'),
+        ),
+    ]
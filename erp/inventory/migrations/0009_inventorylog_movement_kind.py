@@ -0,0 +1,84 @@
+# Generated by Django 4.2 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+# (关联单据类型, 变动类型, 业务类型)，变动类型为 None 表示不区分
+RELATED_ORDER_KINDS = [
+    ('StockIn', None, 'purchase_in'),
+    ('SaleOrder', None, 'sale_out'),
+    ('StockOut', None, 'sale_out'),
+    ('StockAdjust', None, 'adjust'),
+    ('StockTransfer', 'inbound', 'transfer_in'),
+    ('StockTransfer', 'outbound', 'transfer_out'),
+]
+
+# 没有关联单据的历史流水按备注前缀（"类型 - 单号"）识别
+REMARK_PREFIX_KINDS = [
+    ('采购入库', 'purchase_in'),
+    ('销售出库', 'sale_out'),
+    ('调拨入库', 'transfer_in'),
+    ('调拨出库', 'transfer_out'),
+    ('库存调整', 'adjust'),
+]
+
+
+def backfill_movement_kind(apps, schema_editor):
+    """
+    回填历史流水的业务类型
+    按关联单据类型、备注前缀、盘点变动类型依次整批 UPDATE，未识别的保持 other
+    """
+    updated_count = 0
+    for model_name in ('InventoryLog', 'InventoryLogArchive'):
+        model = apps.get_model('inventory', model_name)
+        pending = model.objects.filter(movement_kind='other')
+
+        for order_type, change_type, kind in RELATED_ORDER_KINDS:
+            rows = pending.filter(related_order_type=order_type)
+            if change_type:
+                rows = rows.filter(change_type=change_type)
+            updated_count += rows.update(movement_kind=kind)
+
+        for prefix, kind in REMARK_PREFIX_KINDS:
+            updated_count += pending.filter(remark__startswith=prefix).update(movement_kind=kind)
+
+        updated_count += pending.filter(change_type='check').update(movement_kind='check')
+
+    print(f'库存流水业务类型回填完成，共更新 {updated_count} 条记录')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_inventorylogarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorylog',
+            name='movement_kind',
+            field=models.CharField(choices=[('purchase_in', '采购入库'), ('sale_out', '销售出库'), ('transfer_in', '调拨入库'), ('transfer_out', '调拨出库'), ('adjust', '库存调整'), ('check', '盘点'), ('other', '其他')], default='other', max_length=20, verbose_name='业务类型'),
+        ),
+        migrations.AddField(
+            model_name='inventorylogarchive',
+            name='movement_kind',
+            field=models.CharField(choices=[('purchase_in', '采购入库'), ('sale_out', '销售出库'), ('transfer_in', '调拨入库'), ('transfer_out', '调拨出库'), ('adjust', '库存调整'), ('check', '盘点'), ('other', '其他')], default='other', max_length=20, verbose_name='业务类型'),
+        ),
+        migrations.RunPython(backfill_movement_kind, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['goods', 'warehouse', 'created_at'], name='biz_invento_goods_i_fae476_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['movement_kind', 'created_at'], name='biz_invento_movemen_289842_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylogarchive',
+            index=models.Index(fields=['goods', 'warehouse', 'created_at'], name='biz_invento_goods_i_ce1bb5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylogarchive',
+            index=models.Index(fields=['movement_kind', 'created_at'], name='biz_invento_movemen_f9b967_idx'),
+        ),
+    ]
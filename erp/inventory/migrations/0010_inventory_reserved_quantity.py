@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-18 12:12
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def backfill_reserved_quantity(apps, schema_editor):
+    """按未出库完成的销售单回填预留数量（未出库数量 = 数量 - 已出库数量）"""
+    Inventory = apps.get_model('inventory', 'Inventory')
+    SaleItem = apps.get_model('sale', 'SaleItem')
+
+    rows = SaleItem.objects.filter(
+        order__status__in=['pending', 'partial']
+    ).values('goods_id', 'order__warehouse_id').annotate(
+        reserved=Sum(F('quantity') - F('shipped_quantity'))
+    )
+
+    updated_count = 0
+    for row in rows:
+        if not row['reserved'] or row['reserved'] <= 0:
+            continue
+        Inventory.objects.get_or_create(
+            goods_id=row['goods_id'],
+            warehouse_id=row['order__warehouse_id'],
+            defaults={'quantity': 0}
+        )
+        updated_count += Inventory.objects.filter(
+            goods_id=row['goods_id'],
+            warehouse_id=row['order__warehouse_id']
+        ).update(reserved_quantity=row['reserved'])
+
+    print(f'库存预留数量回填完成，共更新 {updated_count} 条记录')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_inventorylog_movement_kind'),
+        ('sale', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='reserved_quantity',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='预留数量'),
+        ),
+        migrations.RunPython(backfill_reserved_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+def backfill_stock_status(apps, schema_editor):
+    """按商品最低/最高库存分组回填库存状态，每组阈值一条 UPDATE"""
+    Goods = apps.get_model('basic', 'Goods')
+    Inventory = apps.get_model('inventory', 'Inventory')
+
+    thresholds = Goods.objects.order_by().values_list('min_stock', 'max_stock').distinct()
+    for min_stock, max_stock in thresholds:
+        whens = [models.When(quantity__lte=0, then=models.Value('out'))]
+        if min_stock > 0:
+            whens.append(models.When(quantity__lte=min_stock, then=models.Value('low')))
+        if max_stock > 0:
+            whens.append(models.When(quantity__gte=max_stock, then=models.Value('over')))
+        Inventory.objects.filter(goods__min_stock=min_stock, goods__max_stock=max_stock).update(
+            stock_status=models.Case(*whens, default=models.Value('normal'), output_field=models.CharField(max_length=10))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_inventory_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='stock_status',
+            field=models.CharField(choices=[('out', '缺货'), ('low', '库存不足'), ('normal', '正常'), ('over', '库存过剩')], default='out', max_length=10, verbose_name='库存状态'),
+        ),
+        migrations.RunPython(backfill_stock_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['stock_status'], name='biz_invento_stock_s_392b6e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['warehouse', 'stock_status'], name='biz_invento_warehou_f3abcd_idx'),
+        ),
+    ]
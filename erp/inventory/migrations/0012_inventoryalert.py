@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 12:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_alerts(apps, schema_editor):
+    """按当前库存状态为缺货/不足/过剩的库存行生成生效预警"""
+    Inventory = apps.get_model('inventory', 'Inventory')
+    InventoryAlert = apps.get_model('inventory', 'InventoryAlert')
+
+    rows = Inventory.objects.filter(stock_status__in=['out', 'low', 'over']).values_list(
+        'goods_id', 'warehouse_id', 'stock_status', 'quantity', 'goods__min_stock', 'goods__max_stock'
+    ).iterator(chunk_size=2000)
+
+    alerts = []
+    created_count = 0
+    for goods_id, warehouse_id, stock_status, quantity, min_stock, max_stock in rows:
+        threshold = {'out': 0, 'low': min_stock, 'over': max_stock}[stock_status]
+        alerts.append(InventoryAlert(
+            goods_id=goods_id, warehouse_id=warehouse_id, alert_type=stock_status,
+            quantity=quantity, threshold=threshold
+        ))
+        if len(alerts) >= 2000:
+            InventoryAlert.objects.bulk_create(alerts)
+            created_count += len(alerts)
+            alerts = []
+    InventoryAlert.objects.bulk_create(alerts)
+    created_count += len(alerts)
+
+    print(f'库存预警回填完成，共生成 {created_count} 条预警')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basic', '0013_goods_stock_totals'),
+        ('inventory', '0011_inventory_stock_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_type', models.CharField(choices=[('out', '缺货'), ('low', '库存不足'), ('over', '库存过剩')], max_length=10, verbose_name='预警类型')),
+                ('status', models.CharField(choices=[('active', '生效'), ('resolved', '已解除')], default='active', max_length=10, verbose_name='状态')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='触发时库存')),
+                ('threshold', models.IntegerField(default=0, verbose_name='触发阈值')),
+                ('triggered_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='触发时间')),
+                ('resolved_at', models.DateTimeField(blank=True, null=True, verbose_name='解除时间')),
+                ('goods', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.goods', verbose_name='商品')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': '库存预警',
+                'verbose_name_plural': '库存预警',
+                'db_table': 'biz_inventory_alert',
+                'ordering': ['-triggered_at'],
+            },
+        ),
+        migrations.RunPython(backfill_alerts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(fields=['status', 'alert_type'], name='biz_invento_status_6278d4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(fields=['status', 'warehouse'], name='biz_invento_status_75c537_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(fields=['goods', 'warehouse', 'status'], name='biz_invento_goods_i_47b338_idx'),
+        ),
+    ]
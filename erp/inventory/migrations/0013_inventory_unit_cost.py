@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 12:32
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def backfill_unit_cost(apps, schema_editor):
+    """按已入库采购明细的加权平均单价回填单位成本，无采购记录时取商品采购价"""
+    Inventory = apps.get_model('inventory', 'Inventory')
+    PurchaseItem = apps.get_model('purchase', 'PurchaseItem')
+
+    rows = PurchaseItem.objects.filter(received_quantity__gt=0).values(
+        'goods_id', 'order__warehouse_id'
+    ).annotate(
+        total_quantity=Sum('received_quantity'),
+        total_amount=Sum(F('received_quantity') * F('price'))
+    )
+    costs = {
+        (row['goods_id'], row['order__warehouse_id']):
+            (row['total_amount'] / row['total_quantity']).quantize(Decimal('0.0001'))
+        for row in rows
+        if row['total_quantity']
+    }
+
+    updated = []
+    for inv in Inventory.objects.select_related('goods').iterator(chunk_size=1000):
+        cost = costs.get((inv.goods_id, inv.warehouse_id))
+        if cost is None:
+            cost = inv.goods.purchase_price or Decimal('0')
+        inv.unit_cost = cost
+        updated.append(inv)
+        if len(updated) >= 1000:
+            Inventory.objects.bulk_update(updated, ['unit_cost'])
+            updated = []
+    if updated:
+        Inventory.objects.bulk_update(updated, ['unit_cost'])
+
+    print(f'库存单位成本回填完成，其中按采购记录计算 {len(costs)} 组')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_inventoryalert'),
+        ('purchase', '0003_add_unique_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='移动平均单位成本'),
+        ),
+        migrations.RunPython(backfill_unit_cost, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.2 on 2026-10-18 12:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basic', '0013_goods_stock_totals'),
+        ('inventory', '0013_inventory_unit_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorylog',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='单位成本'),
+        ),
+        migrations.AddField(
+            model_name='inventorylogarchive',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='单位成本'),
+        ),
+        migrations.CreateModel(
+            name='MovementCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_id', models.BigIntegerField(unique=True, verbose_name='流水ID')),
+                ('movement_kind', models.CharField(choices=[('purchase_in', '采购入库'), ('sale_out', '销售出库'), ('transfer_in', '调拨入库'), ('transfer_out', '调拨出库'), ('adjust', '库存调整'), ('check', '盘点'), ('other', '其他')], max_length=20, verbose_name='业务类型')),
+                ('related_order_type', models.CharField(blank=True, max_length=50, verbose_name='关联单据类型')),
+                ('related_order_id', models.IntegerField(blank=True, null=True, verbose_name='关联单据ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='变动数量')),
+                ('unit_cost', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='单位成本')),
+                ('amount', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='成本金额')),
+                ('moved_at', models.DateTimeField(verbose_name='变动时间')),
+                ('goods', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.goods', verbose_name='商品')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': '流水成本',
+                'verbose_name_plural': '流水成本',
+                'db_table': 'biz_movement_cost',
+            },
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_log_id', models.BigIntegerField(verbose_name='来源流水ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='入库数量')),
+                ('remaining_quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='剩余数量')),
+                ('unit_cost', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='单位成本')),
+                ('received_at', models.DateTimeField(verbose_name='入库时间')),
+                ('goods', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.goods', verbose_name='商品')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': 'FIFO成本层',
+                'verbose_name_plural': 'FIFO成本层',
+                'db_table': 'biz_cost_layer',
+            },
+        ),
+        migrations.CreateModel(
+            name='CostCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_log_id', models.BigIntegerField(default=0, verbose_name='已处理流水ID')),
+                ('processed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='处理时间')),
+                ('goods', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='basic.goods', verbose_name='商品')),
+            ],
+            options={
+                'verbose_name': 'FIFO成本计算进度',
+                'verbose_name_plural': 'FIFO成本计算进度',
+                'db_table': 'biz_cost_checkpoint',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movementcost',
+            index=models.Index(fields=['related_order_type', 'related_order_id'], name='biz_movemen_related_ab8880_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movementcost',
+            index=models.Index(fields=['movement_kind', 'moved_at'], name='biz_movemen_movemen_5aa230_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='costlayer',
+            index=models.Index(fields=['goods', 'warehouse', 'remaining_quantity'], name='biz_cost_la_goods_i_ebfbfa_idx'),
+        ),
+    ]
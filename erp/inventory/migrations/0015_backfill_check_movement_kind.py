@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 15:40
+
+from django.db import migrations
+
+
+def backfill_check_kind(apps, schema_editor):
+    """
+    修正历史盘点调整流水的业务类型
+    0009 按关联单据类型把全部调整单流水回填为 adjust，这里按调整单原因（reason=check）改为 check
+    """
+    StockAdjust = apps.get_model('inventory', 'StockAdjust')
+    check_adjusts = StockAdjust.objects.filter(reason='check').values('id')
+
+    updated_count = 0
+    for model_name in ('InventoryLog', 'InventoryLogArchive'):
+        model = apps.get_model('inventory', model_name)
+        updated_count += model.objects.filter(
+            related_order_type='StockAdjust',
+            related_order_id__in=check_adjusts,
+            movement_kind='adjust'
+        ).update(movement_kind='check')
+
+    print(f'盘点调整流水业务类型修正完成，共更新 {updated_count} 条记录')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_fifo_cost_layers'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_check_kind, migrations.RunPython.noop),
+    ]
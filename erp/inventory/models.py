@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual, LessThanOrEqual
 from django.utils import timezone
 from basic.models import Goods, Warehouse
 
@@ -8,6 +9,10 @@ class Inventory(models.Model):
     goods = models.ForeignKey(Goods, on_delete=models.CASCADE, verbose_name='商品')
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='仓库')
     quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='库存数量')
+    reserved_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='预留数量')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name='移动平均单位成本')
+    stock_status = models.CharField(max_length=10, choices=Goods.STOCK_STATUS_CHOICES, default='out',
+                                    verbose_name='库存状态')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
@@ -19,14 +24,93 @@ class Inventory(models.Model):
         indexes = [
             models.Index(fields=['goods']),
             models.Index(fields=['warehouse']),
+            models.Index(fields=['stock_status']),
+            models.Index(fields=['warehouse', 'stock_status']),
         ]
 
     def __str__(self):
         return f'{self.goods.name} - {self.warehouse.name}: {self.quantity}'
 
+    @staticmethod
+    def goods_stock_status_expression():
+        """
+        按库存数量与所属商品当前的最低/最高库存计算库存状态的 SQL 表达式
+        阈值通过关联子查询读取，可用于跨多个商品的单条 UPDATE
+        """
+        goods = Goods.objects.filter(id=models.OuterRef('goods_id')).order_by()
+        min_stock = models.Subquery(goods.values('min_stock')[:1])
+        max_stock = models.Subquery(goods.values('max_stock')[:1])
+        return models.Case(
+            models.When(quantity__lte=0, then=models.Value('out')),
+            models.When(
+                models.Q(GreaterThan(min_stock, 0)) & models.Q(LessThanOrEqual(models.F('quantity'), min_stock)),
+                then=models.Value('low')
+            ),
+            models.When(
+                models.Q(GreaterThan(max_stock, 0)) & models.Q(GreaterThanOrEqual(models.F('quantity'), max_stock)),
+                then=models.Value('over')
+            ),
+            default=models.Value('normal'),
+            output_field=models.CharField(max_length=10)
+        )
+
+    @staticmethod
+    def stock_value_expression():
+        """库存金额（库存数量 × 移动平均单位成本）的 SQL 表达式"""
+        return models.ExpressionWrapper(
+            models.F('quantity') * models.F('unit_cost'),
+            output_field=models.DecimalField(max_digits=20, decimal_places=4)
+        )
+
+    @property
+    def stock_value(self):
+        """库存金额"""
+        return self.quantity * self.unit_cost
+
+    @property
+    def available_quantity(self):
+        """可用库存（库存数量 - 销售预留数量）"""
+        return self.quantity - self.reserved_quantity
+
+
+class InventoryAlert(models.Model):
+    """库存预警记录（库存状态跨越阈值时由 InventoryService 增量写入，每个商品/仓库最多一条生效预警）"""
+    ALERT_TYPE_CHOICES = [
+        ('out', '缺货'),
+        ('low', '库存不足'),
+        ('over', '库存过剩'),
+    ]
+    STATUS_CHOICES = [
+        ('active', '生效'),
+        ('resolved', '已解除'),
+    ]
 
-class InventoryLog(models.Model):
-    """库存流水表"""
+    goods = models.ForeignKey(Goods, on_delete=models.CASCADE, verbose_name='商品')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='仓库')
+    alert_type = models.CharField(max_length=10, choices=ALERT_TYPE_CHOICES, verbose_name='预警类型')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active', verbose_name='状态')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='触发时库存')
+    threshold = models.IntegerField(default=0, verbose_name='触发阈值')
+    triggered_at = models.DateTimeField(default=timezone.now, verbose_name='触发时间')
+    resolved_at = models.DateTimeField(null=True, blank=True, verbose_name='解除时间')
+
+    class Meta:
+        db_table = 'biz_inventory_alert'
+        verbose_name = '库存预警'
+        verbose_name_plural = verbose_name
+        ordering = ['-triggered_at']
+        indexes = [
+            models.Index(fields=['status', 'alert_type']),
+            models.Index(fields=['status', 'warehouse']),
+            models.Index(fields=['goods', 'warehouse', 'status']),
+        ]
+
+    def __str__(self):
+        return f'{self.goods_id} - {self.warehouse_id}: {self.get_alert_type_display()}'
+
+
+class InventoryLogBase(models.Model):
+    """库存流水字段定义（在线流水表与归档表共用）"""
     CHANGE_TYPE_CHOICES = [
         ('inbound', '入库'),
         ('outbound', '出库'),
@@ -34,18 +118,50 @@ class InventoryLog(models.Model):
         ('check', '盘点'),
     ]
 
+    MOVEMENT_KIND_CHOICES = [
+        ('purchase_in', '采购入库'),
+        ('sale_out', '销售出库'),
+        ('transfer_in', '调拨入库'),
+        ('transfer_out', '调拨出库'),
+        ('adjust', '库存调整'),
+        ('check', '盘点'),
+        ('other', '其他'),
+    ]
+
     goods = models.ForeignKey(Goods, on_delete=models.CASCADE, verbose_name='商品')
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='仓库')
     change_type = models.CharField(max_length=20, choices=CHANGE_TYPE_CHOICES, verbose_name='变动类型')
+    movement_kind = models.CharField(max_length=20, choices=MOVEMENT_KIND_CHOICES, default='other', verbose_name='业务类型')
     change_quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='变动数量')
     before_quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='变动前数量')
     after_quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='变动后数量')
     related_order_type = models.CharField(max_length=50, blank=True, verbose_name='关联单据类型')
     related_order_id = models.IntegerField(null=True, blank=True, verbose_name='关联单据ID')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True,
+                                    verbose_name='单位成本')
     remark = models.CharField(max_length=200, blank=True, verbose_name='备注')
     created_by = models.ForeignKey('system.User', on_delete=models.SET_NULL, null=True, verbose_name='操作人')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='操作时间')
 
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f'{self.goods.name} - {self.change_type} - {self.created_at}'
+
+    @staticmethod
+    def signed_quantity():
+        """带符号的变动数量表达式：出库为负，入库/调整/盘点按变动数量计（调整、盘点本身带符号）"""
+        return models.Case(
+            models.When(change_type='outbound', then=-models.F('change_quantity')),
+            default=models.F('change_quantity'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        )
+
+
+class InventoryLog(InventoryLogBase):
+    """库存流水表"""
+
     class Meta:
         db_table = 'biz_inventory_log'
         verbose_name = '库存流水'
@@ -55,10 +171,140 @@ class InventoryLog(models.Model):
             models.Index(fields=['goods']),
             models.Index(fields=['warehouse']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['goods', 'warehouse', 'created_at']),
+            models.Index(fields=['movement_kind', 'created_at']),
+        ]
+
+
+class InventoryLogArchive(InventoryLogBase):
+    """库存流水归档表（保留原流水ID，由 archive_inventory_logs 命令迁入）"""
+    id = models.BigIntegerField(primary_key=True, verbose_name='流水ID')
+    created_at = models.DateTimeField(verbose_name='操作时间')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='归档时间')
+
+    class Meta:
+        db_table = 'biz_inventory_log_archive'
+        verbose_name = '库存流水归档'
+        verbose_name_plural = verbose_name
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['goods']),
+            models.Index(fields=['warehouse']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['goods', 'warehouse', 'created_at']),
+            models.Index(fields=['movement_kind', 'created_at']),
+        ]
+
+
+class InventoryCheckpoint(models.Model):
+    """库存一致性校验检查点（按商品/仓库累计的流水结存）"""
+    goods = models.ForeignKey(Goods, on_delete=models.CASCADE, verbose_name='商品')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='仓库')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='流水结存数量')
+    last_log_id = models.BigIntegerField(default=0, verbose_name='已汇总流水ID')
+    checked_at = models.DateTimeField(default=timezone.now, verbose_name='校验时间')
+
+    class Meta:
+        db_table = 'biz_inventory_checkpoint'
+        verbose_name = '库存校验检查点'
+        verbose_name_plural = verbose_name
+        unique_together = ['goods', 'warehouse']
+
+    def __str__(self):
+        return f'{self.goods_id} - {self.warehouse_id}: {self.quantity}'
+
+
+class CostLayer(models.Model):
+    """FIFO 成本层（每笔入库形成一层，出库按先进先出消耗）"""
+    goods = models.ForeignKey(Goods, on_delete=models.CASCADE, verbose_name='商品')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='仓库')
+    source_log_id = models.BigIntegerField(verbose_name='来源流水ID')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='入库数量')
+    remaining_quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='剩余数量')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name='单位成本')
+    received_at = models.DateTimeField(verbose_name='入库时间')
+
+    class Meta:
+        db_table = 'biz_cost_layer'
+        verbose_name = 'FIFO成本层'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['goods', 'warehouse', 'remaining_quantity']),
         ]
 
     def __str__(self):
-        return f'{self.goods.name} - {self.change_type} - {self.created_at}'
+        return f'{self.goods_id} - {self.warehouse_id}: {self.remaining_quantity} @ {self.unit_cost}'
+
+
+class MovementCost(models.Model):
+    """库存流水的 FIFO 成本（出库为销售成本，入库为入账成本）"""
+    log_id = models.BigIntegerField(unique=True, verbose_name='流水ID')
+    goods = models.ForeignKey(Goods, on_delete=models.CASCADE, verbose_name='商品')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='仓库')
+    movement_kind = models.CharField(max_length=20, choices=InventoryLogBase.MOVEMENT_KIND_CHOICES,
+                                     verbose_name='业务类型')
+    related_order_type = models.CharField(max_length=50, blank=True, verbose_name='关联单据类型')
+    related_order_id = models.IntegerField(null=True, blank=True, verbose_name='关联单据ID')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='变动数量')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name='单位成本')
+    amount = models.DecimalField(max_digits=16, decimal_places=4, default=0, verbose_name='成本金额')
+    moved_at = models.DateTimeField(verbose_name='变动时间')
+
+    class Meta:
+        db_table = 'biz_movement_cost'
+        verbose_name = '流水成本'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['related_order_type', 'related_order_id']),
+            models.Index(fields=['movement_kind', 'moved_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.log_id}: {self.amount}'
+
+
+class CostCheckpoint(models.Model):
+    """FIFO 成本计算进度（按商品记录已处理的最大流水ID，下次从其后续算）"""
+    goods = models.OneToOneField(Goods, on_delete=models.CASCADE, verbose_name='商品')
+    last_log_id = models.BigIntegerField(default=0, verbose_name='已处理流水ID')
+    processed_at = models.DateTimeField(default=timezone.now, verbose_name='处理时间')
+
+    class Meta:
+        db_table = 'biz_cost_checkpoint'
+        verbose_name = 'FIFO成本计算进度'
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f'{self.goods_id}: {self.last_log_id}'
+
+
+class InventorySnapshot(models.Model):
+    """库存结存快照（按日/按月的期末库存，仅记录当期有变动的商品/仓库）"""
+    PERIOD_CHOICES = [
+        ('day', '日结'),
+        ('month', '月结'),
+    ]
+
+    goods = models.ForeignKey(Goods, on_delete=models.CASCADE, verbose_name='商品')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='仓库')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, verbose_name='结存周期')
+    snapshot_date = models.DateField(verbose_name='结存日期')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='期末数量')
+    last_log_id = models.BigIntegerField(default=0, verbose_name='截止流水ID')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='生成时间')
+
+    class Meta:
+        db_table = 'biz_inventory_snapshot'
+        verbose_name = '库存结存快照'
+        verbose_name_plural = verbose_name
+        unique_together = ['goods', 'warehouse', 'period', 'snapshot_date']
+        indexes = [
+            models.Index(fields=['goods', 'warehouse', 'snapshot_date']),
+            models.Index(fields=['period', 'snapshot_date']),
+        ]
+
+    def __str__(self):
+        return f'{self.goods_id} - {self.warehouse_id} - {self.snapshot_date}: {self.quantity}'
 
 
 class StockIn(models.Model):
@@ -1,4 +1,9 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
+
+from basic.models import Goods
 from .models import Inventory, InventoryLog, StockIn, StockOut, StockOutItem, StockAdjust, StockAdjustItem, StockTransfer, StockTransferItem
 
 
@@ -17,24 +22,19 @@ class InventorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Inventory
         fields = ['id', 'goods', 'goods_name', 'goods_code', 'category', 'category_name',
-                  'unit', 'warehouse', 'warehouse_name', 'quantity', 'stock_status',
+                  'unit', 'warehouse', 'warehouse_name', 'quantity', 'unit_cost', 'stock_status',
                   'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    STOCK_STATUS_CLASSES = {'out': 'danger', 'low': 'warning', 'over': 'info', 'normal': 'success'}
+    
     def get_stock_status(self, obj):
-        """获取库存状态"""
-        quantity = obj.quantity or 0
-        min_stock = obj.goods.min_stock if obj.goods else 0
-        max_stock = obj.goods.max_stock if obj.goods else 0
-        
-        if quantity <= 0:
-            return {'code': 'out', 'text': '缺货', 'class': 'danger'}
-        elif min_stock > 0 and quantity <= min_stock:
-            return {'code': 'low', 'text': '库存不足', 'class': 'warning'}
-        elif max_stock > 0 and quantity >= max_stock:
-            return {'code': 'over', 'text': '库存过剩', 'class': 'info'}
-        else:
-            return {'code': 'normal', 'text': '正常', 'class': 'success'}
+        """获取库存状态（读取库存变动时维护的状态列）"""
+        return {
+            'code': obj.stock_status,
+            'text': obj.get_stock_status_display(),
+            'class': self.STOCK_STATUS_CLASSES[obj.stock_status]
+        }
 
 
 class InventoryListSerializer(serializers.ModelSerializer):
@@ -50,27 +50,18 @@ class InventoryListSerializer(serializers.ModelSerializer):
     min_stock = serializers.IntegerField(source='goods.min_stock', read_only=True)
     max_stock = serializers.IntegerField(source='goods.max_stock', read_only=True)
     stock_status = serializers.SerializerMethodField()
+    available = serializers.DecimalField(source='available_quantity', max_digits=12, decimal_places=2, read_only=True)
+    as_of_quantity = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
     
     class Meta:
         model = Inventory
         fields = ['id', 'goods', 'goods_name', 'goods_code', 'category', 'category_name',
-                  'unit', 'warehouse', 'warehouse_name', 'quantity', 'min_stock', 'max_stock',
-                  'stock_status', 'updated_at']
+                  'unit', 'warehouse', 'warehouse_name', 'quantity', 'reserved_quantity', 'available',
+                  'unit_cost', 'min_stock', 'max_stock', 'stock_status', 'as_of_quantity', 'updated_at']
     
     def get_stock_status(self, obj):
-        """获取库存状态"""
-        quantity = obj.quantity or 0
-        min_stock = obj.goods.min_stock if obj.goods else 0
-        max_stock = obj.goods.max_stock if obj.goods else 0
-        
-        if quantity <= 0:
-            return {'code': 'out', 'text': '缺货'}
-        elif min_stock > 0 and quantity <= min_stock:
-            return {'code': 'low', 'text': '库存不足'}
-        elif max_stock > 0 and quantity >= max_stock:
-            return {'code': 'over', 'text': '库存过剩'}
-        else:
-            return {'code': 'normal', 'text': '正常'}
+        """获取库存状态（读取库存变动时维护的状态列）"""
+        return {'code': obj.stock_status, 'text': obj.get_stock_status_display()}
 
 
 class InventoryLogSerializer(serializers.ModelSerializer):
@@ -81,12 +72,15 @@ class InventoryLogSerializer(serializers.ModelSerializer):
     warehouse = serializers.IntegerField(source='warehouse.id', read_only=True)
     warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
     change_type_display = serializers.CharField(source='get_change_type_display', read_only=True)
+    transaction_type = serializers.CharField(source='movement_kind', read_only=True)
+    movement_kind_display = serializers.CharField(source='get_movement_kind_display', read_only=True)
     created_by_name = serializers.CharField(source='created_by.name', read_only=True)
     
     class Meta:
         model = InventoryLog
         fields = ['id', 'goods', 'goods_name', 'goods_code', 'warehouse', 'warehouse_name',
-                  'change_type', 'change_type_display', 'change_quantity',
+                  'change_type', 'change_type_display', 'movement_kind', 'movement_kind_display',
+                  'transaction_type', 'change_quantity',
                   'before_quantity', 'after_quantity', 'related_order_type',
                   'related_order_id', 'remark', 'created_by', 'created_by_name', 'created_at']
         read_only_fields = ['id', 'created_at']
@@ -169,7 +163,8 @@ class StockAdjustItemSerializer(serializers.ModelSerializer):
 
 
 class StockAdjustItemCreateSerializer(serializers.ModelSerializer):
-    """库存调整明细创建序列化器"""
+    """库存调整明细创建序列化器（商品由单据序列化器整单批量校验）"""
+    goods = serializers.IntegerField(source='goods_id', min_value=1)
     
     class Meta:
         model = StockAdjustItem
@@ -206,15 +201,75 @@ class StockAdjustCreateSerializer(serializers.ModelSerializer):
         if not value or len(value) == 0:
             raise serializers.ValidationError('请添加调整明细')
         
-        goods_ids = [item['goods'] for item in value]
+        goods_ids = [item['goods_id'] for item in value]
         if len(goods_ids) != len(set(goods_ids)):
             raise serializers.ValidationError('调整明细中存在重复商品')
         
+        for item in value:
+            if item['adjust_quantity'] <= 0:
+                raise serializers.ValidationError('调整数量必须大于0')
+        
         return value
     
+    def validate(self, data):
+        """
+        整单校验：一次查询解析全部商品，一次查询读取当前库存，计算每行调整前后数量，
+        减少调整时检查库存是否充足
+        """
+        items = data.get('items')
+        warehouse = data.get('warehouse')
+        if not items or warehouse is None:
+            return data
+        
+        goods_ids = [item['goods_id'] for item in items]
+        goods_map = Goods.objects.in_bulk(goods_ids)
+        missing = [goods_id for goods_id in goods_ids if goods_id not in goods_map]
+        if missing:
+            raise serializers.ValidationError({'items': f'商品ID {missing[0]} 不存在'})
+        
+        balances = dict(Inventory.objects.filter(
+            warehouse=warehouse, goods_id__in=goods_ids
+        ).values_list('goods_id', 'quantity'))
+        
+        increase = data.get('adjust_type') == 'increase'
+        for item in items:
+            goods = goods_map[item['goods_id']]
+            before_qty = balances.get(goods.id, Decimal('0'))
+            adjust_qty = item['adjust_quantity']
+            after_qty = before_qty + adjust_qty if increase else before_qty - adjust_qty
+            if after_qty < 0:
+                raise serializers.ValidationError({
+                    'items': f'商品 {goods.name} 库存不足，当前库存 {before_qty}，无法减少 {adjust_qty}'
+                })
+            item.update({
+                'before_quantity': before_qty,
+                'adjust_quantity': adjust_qty if increase else -adjust_qty,
+                'after_quantity': after_qty,
+                'has_inventory': goods.id in balances
+            })
+        return data
+    
+    @transaction.atomic
     def create(self, validated_data):
+        """创建调整单，明细一次 bulk_create，并为尚无库存记录的商品补建库存行"""
         items_data = validated_data.pop('items', [])
         adjust = StockAdjust.objects.create(**validated_data)
+        
+        Inventory.objects.bulk_create([
+            Inventory(goods_id=item['goods_id'], warehouse=adjust.warehouse, quantity=0)
+            for item in items_data if not item['has_inventory']
+        ], batch_size=500, ignore_conflicts=True)
+        StockAdjustItem.objects.bulk_create([
+            StockAdjustItem(
+                adjust=adjust,
+                goods_id=item['goods_id'],
+                before_quantity=item['before_quantity'],
+                adjust_quantity=item['adjust_quantity'],
+                after_quantity=item['after_quantity'],
+                remark=item.get('remark', '')
+            )
+            for item in items_data
+        ], batch_size=500)
         return adjust
 
 
@@ -232,7 +287,8 @@ class StockTransferItemSerializer(serializers.ModelSerializer):
 
 
 class StockTransferItemCreateSerializer(serializers.ModelSerializer):
-    """库存调拨明细创建序列化器"""
+    """库存调拨明细创建序列化器（商品由单据序列化器整单批量校验）"""
+    goods = serializers.IntegerField(source='goods_id', min_value=1)
     
     class Meta:
         model = StockTransferItem
@@ -269,15 +325,36 @@ class StockTransferCreateSerializer(serializers.ModelSerializer):
         if not value or len(value) == 0:
             raise serializers.ValidationError('请添加调拨明细')
         
-        goods_ids = [item['goods'] for item in value]
+        goods_ids = [item['goods_id'] for item in value]
         if len(goods_ids) != len(set(goods_ids)):
             raise serializers.ValidationError('调拨明细中存在重复商品')
         
+        for item in value:
+            if item['quantity'] <= 0:
+                raise serializers.ValidationError('调拨数量必须大于0')
+        
+        goods_ids = set(goods_ids)
+        found = set(Goods.objects.filter(id__in=goods_ids).values_list('id', flat=True))
+        missing = sorted(goods_ids - found)
+        if missing:
+            raise serializers.ValidationError(f'商品ID {missing[0]} 不存在')
+        
         return value
     
+    @transaction.atomic
     def create(self, validated_data):
+        """创建调拨单，明细一次 bulk_create"""
         items_data = validated_data.pop('items', [])
         transfer = StockTransfer.objects.create(**validated_data)
+        StockTransferItem.objects.bulk_create([
+            StockTransferItem(
+                transfer=transfer,
+                goods_id=item['goods_id'],
+                quantity=item['quantity'],
+                remark=item.get('remark', '')
+            )
+            for item in items_data
+        ], batch_size=500)
         return transfer
     
     def validate(self, data):
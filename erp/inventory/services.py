@@ -1,99 +1,500 @@
-from django.db import transaction
+from decimal import Decimal
+from django.db import transaction, IntegrityError
+from django.db.models import Case, F, Q, Value, DecimalField, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from .models import Inventory, InventoryLog
 
 
 class InventoryService:
-    """库存服务类"""
+    """库存服务类
+
+    单行变动通过带条件的 UPDATE 语句在数据库端原子修改 (quantity = quantity ± n)，
+    单据确认的多行变动通过 apply_movements 批量加锁写回，均不会丢失并发更新。
+    入库时同步维护 (商品, 仓库) 的移动加权平均单位成本，出库不改变单位成本，
+    估值查询直接读取 Inventory.unit_cost，无需回放历史流水。
+    """
+
+    COST_QUANTIZE = Decimal('0.0001')
 
     @staticmethod
-    @transaction.atomic
-    def stock_in(goods, warehouse, quantity, related_order=None, remark='', created_by=None):
+    def _increase(goods, warehouse, quantity):
         """
-        入库操作
-        :param goods: 商品对象
-        :param warehouse: 仓库对象
-        :param quantity: 入库数量
-        :param related_order: 关联单据对象
-        :param remark: 备注
-        :param created_by: 操作人
+        原子增加库存，库存记录不存在时自动创建
+        :return: (库存对象, 变动前数量)
         """
-        if quantity <= 0:
-            raise ValueError('入库数量必须大于0')
-        
-        inventory, created = Inventory.objects.get_or_create(
-            goods=goods,
-            warehouse=warehouse,
-            defaults={'quantity': 0}
+        queryset = Inventory.objects.filter(goods=goods, warehouse=warehouse)
+        updated = queryset.update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+
+        if not updated:
+            try:
+                with transaction.atomic():
+                    inventory = Inventory.objects.create(
+                        goods=goods,
+                        warehouse=warehouse,
+                        quantity=quantity
+                    )
+                return inventory, Decimal('0')
+            except IntegrityError:
+                # 并发请求已抢先创建该库存记录，退回到条件更新
+                queryset.update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+
+        inventory = queryset.get()
+        return inventory, inventory.quantity - quantity
+
+    @staticmethod
+    def _decrease(goods, warehouse, quantity, allow_reserved=False):
+        """
+        原子扣减库存，仅当可用库存（库存 - 预留）充足时扣减成功
+        UPDATE ... SET quantity = quantity - n WHERE goods_id = ? AND warehouse_id = ? AND quantity >= reserved_quantity + n
+        :param allow_reserved: 允许扣减已预留的库存（只校验库存数量）
+        :return: (库存对象, 变动前数量)
+        """
+        queryset = Inventory.objects.filter(goods=goods, warehouse=warehouse)
+        required = quantity if allow_reserved else F('reserved_quantity') + quantity
+        updated = queryset.filter(quantity__gte=required).update(
+            quantity=F('quantity') - quantity,
+            updated_at=timezone.now()
         )
-        
-        old_quantity = inventory.quantity
-        inventory.quantity += quantity
-        inventory.save()
-        
+
+        if not updated:
+            current = queryset.values_list('quantity', 'reserved_quantity').first()
+            if current is None:
+                raise ValueError(f'商品 {goods.name} 在该仓库无库存')
+            InventoryService._raise_insufficient(goods, *current, allow_reserved)
+
+        inventory = queryset.get()
+        return inventory, inventory.quantity + quantity
+
+    @staticmethod
+    def _raise_insufficient(goods, quantity, reserved_quantity, allow_reserved=False):
+        """库存不足时抛出异常（可用库存不足时提示已预留数量）"""
+        if allow_reserved or not reserved_quantity:
+            raise ValueError(f'商品 {goods.name} 库存不足，当前库存：{quantity}')
+        raise ValueError(
+            f'商品 {goods.name} 可用库存不足，当前库存：{quantity}，已预留：{reserved_quantity}，'
+            f'可用：{quantity - reserved_quantity}'
+        )
+
+    @staticmethod
+    def moving_average_cost(old_quantity, old_cost, quantity, unit_cost=None, default_cost=None):
+        """
+        计算入库后的移动加权平均单位成本
+        (原数量 × 原成本 + 入库数量 × 入库单价) / (原数量 + 入库数量)，原库存不为正时直接取入库单价；
+        入库单价为空（调整、退回等无采购价的入库）时按原成本入账，原成本为0时取 default_cost
+        :return: 新的单位成本（保留4位小数）
+        """
+        old_cost = old_cost or Decimal('0')
+        if unit_cost is None:
+            cost = old_cost or default_cost or Decimal('0')
+        elif old_quantity <= 0:
+            cost = Decimal(str(unit_cost))
+        else:
+            unit_cost = Decimal(str(unit_cost))
+            cost = (old_quantity * old_cost + quantity * unit_cost) / (old_quantity + quantity)
+        return Decimal(cost).quantize(InventoryService.COST_QUANTIZE)
+
+    @staticmethod
+    def _update_inbound_cost(queryset, quantity, unit_cost=None, default_cost=None):
+        """
+        在已增加数量的库存行上原子更新移动平均单位成本（单独一条 UPDATE，quantity 已是入库后数量）
+        """
+        if unit_cost is None:
+            if default_cost:
+                queryset.filter(unit_cost=0).update(unit_cost=default_cost)
+            return
+
+        decimal_field = DecimalField(max_digits=14, decimal_places=4)
+        unit_cost = Decimal(str(unit_cost))
+        queryset.update(unit_cost=Case(
+            When(quantity__lte=quantity, then=Value(unit_cost)),
+            default=(F('unit_cost') * (F('quantity') - quantity) + Value(quantity * unit_cost)) / F('quantity'),
+            output_field=decimal_field
+        ))
+
+    RELATED_ORDER_KINDS = {
+        'StockIn': 'purchase_in',
+        'SaleOrder': 'sale_out',
+        'StockOut': 'sale_out',
+        'StockAdjust': 'adjust',
+    }
+
+    @staticmethod
+    def resolve_movement_kind(change_type, related_order=None):
+        """
+        根据变动类型和关联单据确定流水业务类型
+        :return: InventoryLog.MOVEMENT_KIND_CHOICES 中的取值
+        """
+        order_type = related_order.__class__.__name__ if related_order else ''
+        if order_type == 'StockTransfer':
+            return 'transfer_in' if change_type == 'inbound' else 'transfer_out'
+        if order_type in InventoryService.RELATED_ORDER_KINDS:
+            return InventoryService.RELATED_ORDER_KINDS[order_type]
+        if change_type == 'check':
+            return 'check'
+        return 'other'
+
+    @staticmethod
+    def apply_goods_totals(deltas, chunk_size=500):
+        """
+        按商品累加总库存冗余字段并重算库存状态，同时使商品库存汇总缓存失效
+        先用一条 CASE UPDATE 累加各商品 total_quantity（按商品ID分批，每批一条语句），再对涉及商品整批重算 stock_status
+        （分两条语句，避免 MySQL 在同一 UPDATE 中按新值计算后续赋值）
+        :param deltas: {goods_id: 总库存变动量}
+        :param chunk_size: 每条 UPDATE 包含的商品数
+        """
+        from basic.models import Goods
+        from .goods_inventory_service import GoodsInventoryService
+
+        if not deltas:
+            return
+        goods_ids = sorted(goods_id for goods_id, delta in deltas.items() if delta)
+        for start in range(0, len(goods_ids), chunk_size):
+            chunk = goods_ids[start:start + chunk_size]
+            Goods.objects.filter(id__in=chunk).update(total_quantity=F('total_quantity') + Case(
+                *[When(id=goods_id, then=Value(deltas[goods_id])) for goods_id in chunk],
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            ))
+        Goods.objects.filter(id__in=list(deltas)).update(stock_status=Goods.stock_status_expression())
+        GoodsInventoryService.invalidate_goods_stock_summary()
+
+    @staticmethod
+    def refresh_stock_status(goods_ids, warehouse_ids=None):
+        """
+        重算库存行的库存状态：先查出状态将发生变化的行（关联商品阈值计算新状态），
+        再对这些行执行一条 CASE UPDATE（阈值用关联子查询读取），并据此增量维护库存预警表
+        :param goods_ids: 商品ID集合
+        :param warehouse_ids: 仓库ID集合，为空则重算商品在所有仓库的库存行
+        :return: 状态变化列表 [{'goods_id', 'warehouse_id', 'quantity', 'old_status', 'new_status', ...}]
+        """
+        from .warning_service import StockWarningService
+
+        rows = Inventory.objects.filter(goods_id__in=list(goods_ids))
+        if warehouse_ids is not None:
+            rows = rows.filter(warehouse_id__in=list(warehouse_ids))
+        expression = Inventory.goods_stock_status_expression()
+        changed = list(rows.annotate(new_status=expression).exclude(
+            stock_status=F('new_status')
+        ).values('id', 'goods_id', 'warehouse_id', 'quantity', 'stock_status', 'new_status',
+                 'goods__min_stock', 'goods__max_stock'))
+
+        changes = []
+        if changed:
+            Inventory.objects.filter(id__in=[row['id'] for row in changed]).update(stock_status=expression)
+        for row in changed:
+            changes.append({
+                'goods_id': row['goods_id'],
+                'warehouse_id': row['warehouse_id'],
+                'quantity': row['quantity'],
+                'old_status': row['stock_status'],
+                'new_status': row['new_status'],
+                'min_stock': row['goods__min_stock'],
+                'max_stock': row['goods__max_stock']
+            })
+
+        StockWarningService.apply_status_changes(changes)
+        return changes
+
+    @staticmethod
+    def _create_log(goods, warehouse, change_type, quantity, before_quantity, after_quantity,
+                    related_order=None, remark='', created_by=None, movement_kind=None, unit_cost=None):
+        """写入库存流水"""
         log_data = {
             'goods': goods,
             'warehouse': warehouse,
-            'change_type': 'inbound',
+            'change_type': change_type,
+            'movement_kind': movement_kind or InventoryService.resolve_movement_kind(change_type, related_order),
             'change_quantity': quantity,
-            'before_quantity': old_quantity,
-            'after_quantity': inventory.quantity,
+            'before_quantity': before_quantity,
+            'after_quantity': after_quantity,
+            'unit_cost': unit_cost,
             'remark': remark,
             'created_by': created_by
         }
-        
+
         if related_order:
             log_data['related_order_type'] = related_order.__class__.__name__
             log_data['related_order_id'] = related_order.id
-        
-        InventoryLog.objects.create(**log_data)
-        
+
+        return InventoryLog.objects.create(**log_data)
+
+    @staticmethod
+    def _publish_movements(deltas, related_order=None):
+        """
+        写入库存变动的发件箱事件（与库存变动同一事务）
+        :param deltas: {(goods_id, warehouse_id): 带符号变动量}
+        """
+        from system.services import OutboxService
+
+        OutboxService.publish('inventory.stock_moved', aggregate=related_order, payload={
+            'lines': [
+                [goods_id, warehouse_id, str(delta)]
+                for (goods_id, warehouse_id), delta in sorted(deltas.items())
+            ]
+        })
+
+    @staticmethod
+    @transaction.atomic
+    def stock_in(goods, warehouse, quantity, related_order=None, remark='', created_by=None, movement_kind=None,
+                 unit_cost=None):
+        """
+        入库操作
+        :param goods: 商品对象
+        :param warehouse: 仓库对象
+        :param quantity: 入库数量
+        :param related_order: 关联单据对象
+        :param remark: 备注
+        :param created_by: 操作人
+        :param movement_kind: 业务类型，为空时按关联单据推断
+        :param unit_cost: 入库单价，用于更新移动平均单位成本；为空时不改变单位成本
+        """
+        if quantity <= 0:
+            raise ValueError('入库数量必须大于0')
+
+        quantity = Decimal(str(quantity))
+        inventory, old_quantity = InventoryService._increase(goods, warehouse, quantity)
+        InventoryService._update_inbound_cost(
+            Inventory.objects.filter(pk=inventory.pk), quantity, unit_cost, goods.purchase_price
+        )
+        inventory.refresh_from_db(fields=['unit_cost'])
+        InventoryService.apply_goods_totals({goods.id: quantity})
+        InventoryService.refresh_stock_status([goods.id], [warehouse.id])
+
+        InventoryService._create_log(
+            goods, warehouse, 'inbound', quantity, old_quantity, inventory.quantity,
+            related_order=related_order, remark=remark, created_by=created_by,
+            movement_kind=movement_kind, unit_cost=unit_cost if unit_cost is not None else inventory.unit_cost
+        )
+        InventoryService._publish_movements({(goods.id, warehouse.id): quantity}, related_order)
+
         return inventory
 
     @staticmethod
     @transaction.atomic
-    def stock_out(goods, warehouse, quantity, related_order=None, remark='', created_by=None):
+    def stock_out(goods, warehouse, quantity, related_order=None, remark='', created_by=None, movement_kind=None,
+                  allow_reserved=False):
         """
-        出库操作
+        出库操作，只能出库可用库存（库存 - 预留），不占用销售单的预留
         :param goods: 商品对象
         :param warehouse: 仓库对象
         :param quantity: 出库数量
         :param related_order: 关联单据对象
         :param remark: 备注
         :param created_by: 操作人
+        :param movement_kind: 业务类型，为空时按关联单据推断
+        :param allow_reserved: 允许扣减已预留的库存（盘点等按实物修正的场景）
         """
         if quantity <= 0:
             raise ValueError('出库数量必须大于0')
-        
-        try:
-            inventory = Inventory.objects.get(
+
+        quantity = Decimal(str(quantity))
+        inventory, old_quantity = InventoryService._decrease(goods, warehouse, quantity, allow_reserved)
+        InventoryService.apply_goods_totals({goods.id: -quantity})
+        InventoryService.refresh_stock_status([goods.id], [warehouse.id])
+
+        InventoryService._create_log(
+            goods, warehouse, 'outbound', quantity, old_quantity, inventory.quantity,
+            related_order=related_order, remark=remark, created_by=created_by,
+            movement_kind=movement_kind, unit_cost=inventory.unit_cost
+        )
+        InventoryService._publish_movements({(goods.id, warehouse.id): -quantity}, related_order)
+
+        return inventory
+
+    @staticmethod
+    def lock_rows(keys, chunk_size=500):
+        """
+        按精确的 商品/仓库 组合加锁读取库存行：WHERE (goods_id = ? AND warehouse_id = ?) OR ...，
+        只锁涉及的组合，不锁这些商品在其他仓库的行。
+        按 (goods_id, warehouse_id) 唯一索引顺序加锁，各事务加锁顺序一致，避免死锁
+        :param keys: (商品ID, 仓库ID) 集合
+        :return: {(goods_id, warehouse_id): 库存对象}，不存在的组合不返回
+        """
+        keys = sorted(set(keys))
+        rows = {}
+        for start in range(0, len(keys), chunk_size):
+            condition = Q()
+            for goods_id, warehouse_id in keys[start:start + chunk_size]:
+                condition |= Q(goods_id=goods_id, warehouse_id=warehouse_id)
+            for inv in Inventory.objects.select_for_update().filter(condition).order_by('goods_id', 'warehouse_id'):
+                rows[(inv.goods_id, inv.warehouse_id)] = inv
+        return rows
+
+    @staticmethod
+    @transaction.atomic
+    def apply_movements(movements, related_order=None, created_by=None):
+        """
+        批量库存变动（单据确认专用）
+        一次查询按精确的 商品/仓库 组合锁定全部涉及的库存行（按 商品ID、仓库ID 排序加锁避免死锁），
+        在内存中依次应用变动后 bulk_update 写回，并 bulk_create 全部库存流水。
+        出库只能扣减可用库存（库存 - 预留）；销售出库在调用前先释放本单的预留，
+        盘点修正（movement_kind=check）按实物数量扣减，允许占用预留。
+        :param movements: 变动列表，每项为字典：
+            goods: 商品对象, warehouse: 仓库对象, change_type: 'inbound'/'outbound',
+            quantity: 变动数量(正数), remark: 备注(可选), movement_kind: 业务类型(可选，默认按关联单据推断),
+            unit_cost: 入库单价(可选，用于更新移动平均单位成本),
+            allow_reserved: 允许扣减已预留的库存(可选，默认盘点修正允许、其他出库不允许)
+        :param related_order: 关联单据对象
+        :param created_by: 操作人
+        :return: 库存流水列表
+        """
+        if not movements:
+            return []
+
+        for movement in movements:
+            if movement['quantity'] <= 0:
+                action = '入库' if movement['change_type'] == 'inbound' else '出库'
+                raise ValueError(f'{action}数量必须大于0')
+
+        keys = sorted({(m['goods'].id, m['warehouse'].id) for m in movements})
+        goods_ids = {goods_id for goods_id, _ in keys}
+        warehouse_ids = {warehouse_id for _, warehouse_id in keys}
+
+        inventories = InventoryService.lock_rows(keys)
+
+        # 入库涉及但尚不存在的库存记录先补建，再统一加锁读取
+        missing = {
+            (m['goods'].id, m['warehouse'].id) for m in movements
+            if m['change_type'] == 'inbound' and (m['goods'].id, m['warehouse'].id) not in inventories
+        }
+        if missing:
+            Inventory.objects.bulk_create(
+                [Inventory(goods_id=goods_id, warehouse_id=warehouse_id, quantity=0)
+                 for goods_id, warehouse_id in sorted(missing)],
+                ignore_conflicts=True
+            )
+            inventories = InventoryService.lock_rows(keys)
+
+        now = timezone.now()
+        related_order_type = related_order.__class__.__name__ if related_order else ''
+        related_order_id = related_order.id if related_order else None
+        changed = {}
+        goods_deltas = {}
+        line_deltas = {}
+        logs = []
+
+        for movement in movements:
+            goods = movement['goods']
+            warehouse = movement['warehouse']
+            quantity = Decimal(str(movement['quantity']))
+            inventory = inventories.get((goods.id, warehouse.id))
+
+            before_quantity = inventory.quantity if inventory else None
+            log_cost = None
+            if movement['change_type'] == 'inbound':
+                log_cost = movement.get('unit_cost')
+                inventory.unit_cost = InventoryService.moving_average_cost(
+                    before_quantity, inventory.unit_cost, quantity, log_cost, goods.purchase_price
+                )
+                inventory.quantity = before_quantity + quantity
+            else:
+                if inventory is None:
+                    raise ValueError(f'商品 {goods.name} 在该仓库无库存')
+                allow_reserved = movement.get('allow_reserved', movement.get('movement_kind') == 'check')
+                required = quantity if allow_reserved else quantity + inventory.reserved_quantity
+                if before_quantity < required:
+                    InventoryService._raise_insufficient(
+                        goods, before_quantity, inventory.reserved_quantity, allow_reserved
+                    )
+                inventory.quantity = before_quantity - quantity
+
+            if log_cost is None:
+                log_cost = inventory.unit_cost
+            inventory.updated_at = now
+            changed[inventory.pk] = inventory
+            delta = inventory.quantity - before_quantity
+            goods_deltas[goods.id] = goods_deltas.get(goods.id, Decimal('0')) + delta
+            line_deltas[(goods.id, warehouse.id)] = line_deltas.get((goods.id, warehouse.id), Decimal('0')) + delta
+            logs.append(InventoryLog(
                 goods=goods,
-                warehouse=warehouse
+                warehouse=warehouse,
+                change_type=movement['change_type'],
+                movement_kind=movement.get('movement_kind') or InventoryService.resolve_movement_kind(
+                    movement['change_type'], related_order
+                ),
+                change_quantity=quantity,
+                before_quantity=before_quantity,
+                after_quantity=inventory.quantity,
+                unit_cost=log_cost,
+                related_order_type=related_order_type,
+                related_order_id=related_order_id,
+                remark=movement.get('remark', ''),
+                created_by=created_by
+            ))
+
+        Inventory.objects.bulk_update(list(changed.values()), ['quantity', 'unit_cost', 'updated_at'], batch_size=500)
+        InventoryService.apply_goods_totals(goods_deltas)
+        InventoryService.refresh_stock_status(goods_ids, warehouse_ids)
+        InventoryService._publish_movements(line_deltas, related_order)
+        return InventoryLog.objects.bulk_create(logs, batch_size=500)
+
+    @staticmethod
+    def _merge_lines(lines):
+        """按 商品/仓库 合并明细数量，并按键排序保证加锁顺序一致"""
+        merged = {}
+        for line in lines:
+            key = (line['goods'].id, line['warehouse'].id)
+            quantity = Decimal(str(line['quantity']))
+            if key in merged:
+                merged[key]['quantity'] += quantity
+            else:
+                merged[key] = {'goods': line['goods'], 'warehouse': line['warehouse'], 'quantity': quantity}
+        return [merged[key] for key in sorted(merged) if merged[key]['quantity'] > 0]
+
+    @staticmethod
+    @transaction.atomic
+    def reserve(lines):
+        """
+        预留库存（销售单创建、修改时调用），仅当可用库存充足时预留成功
+        UPDATE ... SET reserved_quantity = reserved_quantity + n WHERE ... AND quantity >= reserved_quantity + n
+        :param lines: 预留明细列表，每项为字典：goods: 商品对象, warehouse: 仓库对象, quantity: 数量
+        """
+        for line in InventoryService._merge_lines(lines):
+            goods = line['goods']
+            quantity = line['quantity']
+            queryset = Inventory.objects.filter(goods=goods, warehouse=line['warehouse'])
+            updated = queryset.filter(quantity__gte=F('reserved_quantity') + quantity).update(
+                reserved_quantity=F('reserved_quantity') + quantity
             )
-        except Inventory.DoesNotExist:
-            raise ValueError(f'商品 {goods.name} 在该仓库无库存')
-        
-        if inventory.quantity < quantity:
-            raise ValueError(f'商品 {goods.name} 库存不足，当前库存：{inventory.quantity}')
-        
-        old_quantity = inventory.quantity
-        inventory.quantity -= quantity
-        inventory.save()
-        
-        log_data = {
-            'goods': goods,
-            'warehouse': warehouse,
-            'change_type': 'outbound',
-            'change_quantity': quantity,
-            'before_quantity': old_quantity,
-            'after_quantity': inventory.quantity,
-            'remark': remark,
-            'created_by': created_by
+
+            if not updated:
+                current = queryset.values_list('quantity', 'reserved_quantity').first()
+                if current is None:
+                    raise ValueError(f'商品 {goods.name} 在该仓库无库存')
+                raise ValueError(f'商品 {goods.name} 可用库存不足，当前可用：{current[0] - current[1]}')
+
+    @staticmethod
+    @transaction.atomic
+    def release(lines):
+        """
+        释放预留库存（销售单修改、取消、删除、确认出库时调用），预留数量最少减到0
+        :param lines: 释放明细列表，格式同 reserve
+        """
+        decimal_field = DecimalField(max_digits=12, decimal_places=2)
+        for line in InventoryService._merge_lines(lines):
+            Inventory.objects.filter(goods=line['goods'], warehouse=line['warehouse']).update(
+                reserved_quantity=Greatest(
+                    F('reserved_quantity') - line['quantity'], Value(Decimal('0')), output_field=decimal_field
+                )
+            )
+
+    @staticmethod
+    def get_availability(warehouse_id, goods_ids):
+        """
+        批量查询可用库存（一次查询，按唯一索引逐行读取）
+        :param warehouse_id: 仓库ID
+        :param goods_ids: 商品ID列表
+        :return: {goods_id: {'quantity', 'reserved_quantity', 'available'}}，无库存记录的商品均为0
+        """
+        rows = Inventory.objects.filter(
+            warehouse_id=warehouse_id, goods_id__in=goods_ids
+        ).values_list('goods_id', 'quantity', 'reserved_quantity')
+        found = {
+            goods_id: {'quantity': quantity, 'reserved_quantity': reserved, 'available': quantity - reserved}
+            for goods_id, quantity, reserved in rows
+        }
+        zero = Decimal('0')
+        return {
+            goods_id: found.get(goods_id, {'quantity': zero, 'reserved_quantity': zero, 'available': zero})
+            for goods_id in goods_ids
         }
-        
-        if related_order:
-            log_data['related_order_type'] = related_order.__class__.__name__
-            log_data['related_order_id'] = related_order.id
-        
-        InventoryLog.objects.create(**log_data)
-        
-        return inventory
@@ -0,0 +1,201 @@
+"""
+盘点导入服务模块
+逐行流式读取盘点 CSV，按批查询商品与当前库存并与盘点数量比对，
+差异写入"盘点调整"类型的增加/减少调整单（草稿），明细按批 bulk_create。
+除已盘点商品ID集合（用于跨批检查重复，大小不超过商品数）外，内存占用只与批大小有关，与文件行数无关。
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+
+class StocktakeImportService:
+    """盘点导入服务"""
+
+    CHUNK_SIZE = 2000
+    MAX_ERRORS = 50
+
+    # 表头别名：商品编码列、盘点数量列、备注列
+    CODE_HEADERS = ('商品编码', '编码', 'code', 'goods_code')
+    QUANTITY_HEADERS = ('盘点数量', '实盘数量', '数量', 'quantity', 'counted_quantity')
+    REMARK_HEADERS = ('备注', 'remark')
+
+    @staticmethod
+    def open_text(file, encoding='utf-8-sig'):
+        """将上传的二进制文件包装为按行读取的文本流（不整体读入内存）"""
+        raw = getattr(file, 'file', file)
+        if isinstance(raw, io.TextIOBase):
+            return raw
+        return io.TextIOWrapper(raw, encoding=encoding, newline='')
+
+    @staticmethod
+    def resolve_columns(header):
+        """
+        根据表头确定列位置；首行不是表头时按 编码,数量,备注 的顺序读取
+        :return: ((编码列, 数量列, 备注列), 首行是否为表头)
+        """
+        names = [str(value).strip().lower() for value in header]
+
+        def find(aliases):
+            for alias in aliases:
+                if alias.lower() in names:
+                    return names.index(alias.lower())
+            return None
+
+        code_col = find(StocktakeImportService.CODE_HEADERS)
+        quantity_col = find(StocktakeImportService.QUANTITY_HEADERS)
+        if code_col is None or quantity_col is None:
+            return (0, 1, 2), False
+        return (code_col, quantity_col, find(StocktakeImportService.REMARK_HEADERS)), True
+
+    @staticmethod
+    def iter_rows(text):
+        """
+        逐行解析盘点数据
+        :return: 生成器，每项为 (行号, 商品编码, 盘点数量文本, 备注)
+        """
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns, has_header = StocktakeImportService.resolve_columns(header)
+
+        def parse(line_no, row):
+            code_col, quantity_col, remark_col = columns
+            code = row[code_col].strip() if len(row) > code_col else ''
+            quantity = row[quantity_col].strip() if len(row) > quantity_col else ''
+            remark = row[remark_col].strip() if remark_col is not None and len(row) > remark_col else ''
+            return line_no, code, quantity, remark[:200]
+
+        if not has_header and any(value.strip() for value in header):
+            yield parse(1, header)
+        for line_no, row in enumerate(reader, start=2):
+            if any(value.strip() for value in row):
+                yield parse(line_no, row)
+
+    @staticmethod
+    def import_csv(file, warehouse, created_by=None, remark='', encoding='utf-8-sig', chunk_size=None):
+        """
+        导入盘点文件并生成盘点调整单（草稿，需确认后生效）
+        未出现在文件中的商品不调整；任一行有错误时整体回滚
+        :param file: 上传文件或二进制文件对象
+        :param warehouse: 盘点仓库
+        :param created_by: 操作人
+        :param remark: 调整单备注
+        :param encoding: 文件编码，如 utf-8-sig、gbk
+        :param chunk_size: 每批处理的行数
+        :return: {'lines': 行数, 'adjusted': 差异行数, 'increase': 增加单, 'decrease': 减少单}
+        :raises ValueError: 文件内容错误，错误信息包含出错行号（最多列出 MAX_ERRORS 条）
+        """
+        chunk_size = chunk_size or StocktakeImportService.CHUNK_SIZE
+        result = {'lines': 0, 'adjusted': 0, 'increase': None, 'decrease': None}
+        errors = []
+        seen = set()
+
+        with transaction.atomic():
+            chunk = []
+            try:
+                for row in StocktakeImportService.iter_rows(StocktakeImportService.open_text(file, encoding)):
+                    chunk.append(row)
+                    if len(chunk) >= chunk_size:
+                        StocktakeImportService._import_chunk(chunk, warehouse, created_by, remark, result, errors, seen)
+                        chunk = []
+                        if len(errors) >= StocktakeImportService.MAX_ERRORS:
+                            break
+                if chunk:
+                    StocktakeImportService._import_chunk(chunk, warehouse, created_by, remark, result, errors, seen)
+            except UnicodeDecodeError:
+                raise ValueError(f'文件编码错误，请使用 {encoding} 编码或指定正确的编码')
+
+            if errors:
+                raise ValueError('；'.join(errors[:StocktakeImportService.MAX_ERRORS]))
+            if result['lines'] == 0:
+                raise ValueError('盘点文件没有数据行')
+
+        return result
+
+    @staticmethod
+    def _import_chunk(chunk, warehouse, created_by, remark, result, errors, seen):
+        """
+        处理一批盘点行：一次查询商品、一次查询库存，差异明细 bulk_create
+        按输入的商品编码检查重复（含无差异的行，seen 记录之前各批已盘点的商品ID）
+        """
+        from basic.models import Goods
+        from .models import Inventory, StockAdjustItem
+
+        result['lines'] += len(chunk)
+        goods_map = dict(Goods.objects.filter(
+            code__in={code for _, code, _, _ in chunk}
+        ).values_list('code', 'id'))
+        quantities = dict(Inventory.objects.filter(
+            warehouse=warehouse,
+            goods_id__in=list(goods_map.values())
+        ).values_list('goods_id', 'quantity'))
+
+        items = {'increase': [], 'decrease': []}
+        for line_no, code, quantity_text, item_remark in chunk:
+            if not code:
+                errors.append(f'第{line_no}行商品编码为空')
+                continue
+            if code not in goods_map:
+                errors.append(f'第{line_no}行商品编码 {code} 不存在')
+                continue
+            if goods_map[code] in seen:
+                errors.append(f'第{line_no}行商品编码 {code} 重复盘点')
+                continue
+            seen.add(goods_map[code])
+            try:
+                counted = Decimal(quantity_text)
+                if not counted.is_finite():
+                    raise InvalidOperation
+            except InvalidOperation:
+                errors.append(f'第{line_no}行盘点数量 {quantity_text} 格式错误')
+                continue
+            if counted < 0:
+                errors.append(f'第{line_no}行盘点数量不能为负数')
+                continue
+            if errors:
+                continue
+
+            goods_id = goods_map[code]
+            before = quantities.get(goods_id, Decimal('0'))
+            diff = counted - before
+            if diff == 0:
+                continue
+            items['increase' if diff > 0 else 'decrease'].append(StockAdjustItem(
+                goods_id=goods_id,
+                before_quantity=before,
+                adjust_quantity=diff,
+                after_quantity=counted,
+                remark=item_remark
+            ))
+
+        if errors:
+            return
+        for adjust_type, adjust_items in items.items():
+            if not adjust_items:
+                continue
+            adjust = StocktakeImportService._get_adjust(result, adjust_type, warehouse, created_by, remark)
+            for item in adjust_items:
+                item.adjust = adjust
+            StockAdjustItem.objects.bulk_create(adjust_items, batch_size=500)
+            result['adjusted'] += len(adjust_items)
+
+    @staticmethod
+    def _get_adjust(result, adjust_type, warehouse, created_by, remark):
+        """按需创建盘点调整单（增加/减少各一张）"""
+        from utils.order_no import generate_stock_adjust_no
+        from .models import StockAdjust
+
+        if result[adjust_type] is None:
+            result[adjust_type] = StockAdjust.objects.create(
+                order_no=generate_stock_adjust_no(),
+                warehouse=warehouse,
+                adjust_type=adjust_type,
+                reason='check',
+                remark=remark or '盘点导入',
+                created_by=created_by
+            )
+        return result[adjust_type]
@@ -0,0 +1,1193 @@
+"""
+库存模块测试
+"""
+import io
+import zipfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from decimal import Decimal
+
+from basic.models import Category, Goods, Warehouse
+from inventory.cost_service import FifoCostService
+from inventory.goods_inventory_service import GoodsInventoryService
+from inventory.models import (
+    CostLayer, Inventory, InventoryAlert, InventoryLog, MovementCost, StockAdjust, StockIn, StockTransfer,
+    StockTransferItem
+)
+from inventory.services import InventoryService
+from inventory.stocktake_service import StocktakeImportService
+from inventory.warning_service import StockWarningService
+from system.models import DocumentSequence
+from utils.cache import shared_cache
+from utils.export import iter_values
+
+
+User = get_user_model()
+
+
+class InventoryTestMixin:
+    """库存测试基础数据"""
+
+    def setUp(self):
+        """测试数据准备"""
+        self.user = User.objects.create_user(
+            username='admin',
+            password='testpass123'
+        )
+        self.warehouse = Warehouse.objects.create(name='测试仓库')
+        self.category = Category.objects.create(name='电子产品', sort_order=1)
+        self.goods = Goods.objects.create(
+            code='G001',
+            name='测试商品',
+            category=self.category,
+            purchase_price=Decimal('50.00'),
+            sale_price=Decimal('89.00')
+        )
+
+
+class InventoryServiceTest(InventoryTestMixin, TestCase):
+    """库存服务测试"""
+
+    def test_stock_in_creates_inventory(self):
+        """测试首次入库自动创建库存记录"""
+        inventory = InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+
+        self.assertEqual(inventory.quantity, Decimal('10'))
+        log = InventoryLog.objects.get(goods=self.goods)
+        self.assertEqual(log.change_type, 'inbound')
+        self.assertEqual(log.before_quantity, Decimal('0'))
+        self.assertEqual(log.after_quantity, Decimal('10'))
+
+    def test_stock_in_accumulates(self):
+        """测试重复入库累加库存并记录变动前后数量"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        inventory = InventoryService.stock_in(self.goods, self.warehouse, Decimal('5.5'))
+
+        self.assertEqual(inventory.quantity, Decimal('15.5'))
+        log = InventoryLog.objects.order_by('-id').first()
+        self.assertEqual(log.before_quantity, Decimal('10'))
+        self.assertEqual(log.after_quantity, Decimal('15.5'))
+
+    def test_stock_out_success(self):
+        """测试出库扣减库存"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        inventory = InventoryService.stock_out(self.goods, self.warehouse, Decimal('4'))
+
+        self.assertEqual(inventory.quantity, Decimal('6'))
+        log = InventoryLog.objects.filter(change_type='outbound').get()
+        self.assertEqual(log.before_quantity, Decimal('10'))
+        self.assertEqual(log.after_quantity, Decimal('6'))
+
+    def test_stock_out_insufficient(self):
+        """测试库存不足时出库失败且不修改库存"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+
+        with self.assertRaisesMessage(ValueError, '库存不足'):
+            InventoryService.stock_out(self.goods, self.warehouse, Decimal('5'))
+
+        inventory = Inventory.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual(inventory.quantity, Decimal('3'))
+        self.assertFalse(InventoryLog.objects.filter(change_type='outbound').exists())
+
+    def test_stock_out_without_inventory(self):
+        """测试无库存记录时出库失败"""
+        with self.assertRaisesMessage(ValueError, '无库存'):
+            InventoryService.stock_out(self.goods, self.warehouse, Decimal('1'))
+
+
+class ApplyMovementsTest(InventoryTestMixin, TestCase):
+    """批量库存变动测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.goods2 = Goods.objects.create(code='G002', name='测试商品2', category=self.category)
+        self.warehouse2 = Warehouse.objects.create(name='测试仓库2')
+
+    def test_apply_movements_batch(self):
+        """测试批量入库出库在同一批次内按顺序生效"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+
+        logs = InventoryService.apply_movements([
+            {'goods': self.goods, 'warehouse': self.warehouse, 'change_type': 'outbound', 'quantity': Decimal('4')},
+            {'goods': self.goods, 'warehouse': self.warehouse2, 'change_type': 'inbound', 'quantity': Decimal('4')},
+            {'goods': self.goods2, 'warehouse': self.warehouse, 'change_type': 'inbound', 'quantity': Decimal('2')},
+            {'goods': self.goods, 'warehouse': self.warehouse, 'change_type': 'outbound', 'quantity': Decimal('1')},
+        ], created_by=self.user)
+
+        self.assertEqual(len(logs), 4)
+        self.assertEqual(Inventory.objects.get(goods=self.goods, warehouse=self.warehouse).quantity, Decimal('5'))
+        self.assertEqual(Inventory.objects.get(goods=self.goods, warehouse=self.warehouse2).quantity, Decimal('4'))
+        self.assertEqual(Inventory.objects.get(goods=self.goods2, warehouse=self.warehouse).quantity, Decimal('2'))
+        last = InventoryLog.objects.filter(goods=self.goods, warehouse=self.warehouse).order_by('-id').first()
+        self.assertEqual(last.before_quantity, Decimal('6'))
+        self.assertEqual(last.after_quantity, Decimal('5'))
+
+    def test_apply_movements_rollback_on_shortage(self):
+        """测试任一明细库存不足时整批回滚"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+
+        with self.assertRaisesMessage(ValueError, '库存不足'):
+            InventoryService.apply_movements([
+                {'goods': self.goods2, 'warehouse': self.warehouse, 'change_type': 'inbound', 'quantity': Decimal('2')},
+                {'goods': self.goods, 'warehouse': self.warehouse, 'change_type': 'outbound', 'quantity': Decimal('5')},
+            ])
+
+        self.assertFalse(Inventory.objects.filter(goods=self.goods2).exists())
+        self.assertEqual(InventoryLog.objects.count(), 1)
+
+    def test_lock_rows_exact_pairs(self):
+        """测试只锁定涉及的 商品/仓库 组合，不锁这些商品在其他仓库的行"""
+        for goods in (self.goods, self.goods2):
+            for warehouse in (self.warehouse, self.warehouse2):
+                InventoryService.stock_in(goods, warehouse, Decimal('1'))
+
+        keys = {(self.goods.id, self.warehouse.id), (self.goods2.id, self.warehouse2.id)}
+        with CaptureQueriesContext(connection) as queries:
+            rows = InventoryService.lock_rows(keys)
+        self.assertEqual(set(rows), keys)
+        self.assertEqual(len(queries), 1)
+
+    def test_goods_totals_single_update(self):
+        """测试多个商品的总库存在一条 UPDATE 中累加"""
+        with CaptureQueriesContext(connection) as queries:
+            InventoryService.apply_goods_totals({self.goods.id: Decimal('3'), self.goods2.id: Decimal('-2')})
+        total_updates = [q for q in queries.captured_queries if '"total_quantity" =' in q['sql']]
+        self.assertEqual(len(total_updates), 1)
+        self.assertEqual(
+            list(Goods.objects.filter(id__in=[self.goods.id, self.goods2.id]).order_by('id').values_list(
+                'total_quantity', flat=True)),
+            [Decimal('3'), Decimal('-2')]
+        )
+
+
+class StockTransferConfirmTest(InventoryTestMixin, TestCase):
+    """库存调拨确认测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        self.transfer = StockTransfer.objects.create(
+            order_no='ST202602200001',
+            from_warehouse=self.warehouse,
+            to_warehouse=self.warehouse2
+        )
+        StockTransferItem.objects.create(transfer=self.transfer, goods=self.goods, quantity=Decimal('6'))
+
+    def test_confirm_transfer(self):
+        """测试确认调拨同时扣减调出仓库并增加调入仓库"""
+        response = self.client.post(f'/api/v1/inventory/transfer/{self.transfer.id}/confirm/')
+
+        self.assertEqual(response.data['code'], 200)
+        self.assertEqual(Inventory.objects.get(goods=self.goods, warehouse=self.warehouse).quantity, Decimal('4'))
+        self.assertEqual(Inventory.objects.get(goods=self.goods, warehouse=self.warehouse2).quantity, Decimal('6'))
+        self.assertEqual(
+            InventoryLog.objects.filter(related_order_type='StockTransfer', related_order_id=self.transfer.id).count(),
+            2
+        )
+
+    def test_transfer_logs_filter_by_movement_kind(self):
+        """测试调拨流水记录业务类型并按交易类型筛选"""
+        self.client.post(f'/api/v1/inventory/transfer/{self.transfer.id}/confirm/')
+
+        response = self.client.get('/api/v1/inventory/logs/', {'transaction_type': 'transfer_in'})
+        items = response.data['data']['items']
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['warehouse'], self.warehouse2.id)
+        self.assertEqual(items[0]['transaction_type'], 'transfer_in')
+        self.assertEqual(
+            InventoryLog.objects.filter(movement_kind='transfer_out').count(), 1
+        )
+
+    def test_transfer_respects_reservation(self):
+        """测试调拨、直接出库只能扣减可用库存，盘点修正允许占用预留"""
+        InventoryService.reserve([{'goods': self.goods, 'warehouse': self.warehouse, 'quantity': Decimal('5')}])
+
+        response = self.client.post(f'/api/v1/inventory/transfer/{self.transfer.id}/confirm/')
+        self.assertEqual(response.data['code'], 400)
+        self.assertIn('可用库存不足', response.data['msg'])
+        self.assertEqual(Inventory.objects.get(goods=self.goods, warehouse=self.warehouse).quantity, Decimal('10'))
+        with self.assertRaises(ValueError):
+            InventoryService.stock_out(self.goods, self.warehouse, Decimal('6'))
+
+        InventoryService.apply_movements([{
+            'goods': self.goods, 'warehouse': self.warehouse, 'change_type': 'outbound',
+            'quantity': Decimal('7'), 'movement_kind': 'check'
+        }])
+        inv = Inventory.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual((inv.quantity, inv.reserved_quantity), (Decimal('3'), Decimal('5')))
+
+
+class BulkDocumentCreateTest(InventoryTestMixin, TestCase):
+    """调整单/调拨单批量明细创建测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        Goods.objects.bulk_create([
+            Goods(code=f'B{i:03d}', name=f'批量商品{i}', category=self.category) for i in range(40)
+        ])
+        self.goods_ids = list(Goods.objects.filter(code__startswith='B').order_by('id').values_list('id', flat=True))
+        Inventory.objects.bulk_create([
+            Inventory(goods_id=goods_id, warehouse=self.warehouse, quantity=Decimal('10'))
+            for goods_id in self.goods_ids[:20]
+        ])
+        # 预先建好当日单号序列，避免首张单据多出的序列初始化查询影响 SQL 条数对比
+        DocumentSequence.objects.bulk_create([
+            DocumentSequence(prefix=prefix, seq_date=timezone.localdate()) for prefix in ('SA', 'ST')
+        ])
+
+    def create_adjust(self, goods_ids, adjust_type='increase', quantity='2'):
+        return self.client.post('/api/v1/inventory/adjust/', {
+            'warehouse': self.warehouse.id,
+            'adjust_type': adjust_type,
+            'reason': 'other',
+            'items': [{'goods': goods_id, 'adjust_quantity': quantity} for goods_id in goods_ids]
+        }, format='json')
+
+    def test_adjust_query_count_independent_of_lines(self):
+        """测试调整单创建的 SQL 条数不随明细行数增长，并补建缺失的库存行"""
+        with CaptureQueriesContext(connection) as small:
+            self.create_adjust(self.goods_ids[:4] + self.goods_ids[20:24])
+        with CaptureQueriesContext(connection) as large:
+            response = self.create_adjust(self.goods_ids)
+
+        self.assertEqual(response.data['code'], 200)
+        self.assertEqual(len(large), len(small))
+        adjust = StockAdjust.objects.order_by('-id').first()
+        items = {item.goods_id: item for item in adjust.items.all()}
+        self.assertEqual(len(items), 40)
+        self.assertEqual((items[self.goods_ids[0]].before_quantity, items[self.goods_ids[0]].after_quantity),
+                         (Decimal('10'), Decimal('12')))
+        self.assertEqual(items[self.goods_ids[39]].before_quantity, Decimal('0'))
+        self.assertEqual(Inventory.objects.filter(warehouse=self.warehouse).count(), 40)
+
+    def test_adjust_validates_whole_document(self):
+        """测试整单校验失败时不创建单据"""
+        response = self.create_adjust(self.goods_ids[:2] + self.goods_ids[30:31], adjust_type='decrease')
+        self.assertEqual(response.data['code'], 400)
+        self.assertIn('库存不足', response.data['msg'])
+
+        response = self.create_adjust([self.goods_ids[0], 999999])
+        self.assertEqual(response.data['code'], 400)
+        self.assertFalse(StockAdjust.objects.exists())
+
+    def test_transfer_bulk_create(self):
+        """测试调拨单明细批量创建，SQL 条数不随明细行数增长"""
+        def create(goods_ids):
+            return self.client.post('/api/v1/inventory/transfer/', {
+                'from_warehouse': self.warehouse.id,
+                'to_warehouse': self.warehouse2.id,
+                'items': [{'goods': goods_id, 'quantity': '1'} for goods_id in goods_ids]
+            }, format='json')
+
+        with CaptureQueriesContext(connection) as small:
+            create(self.goods_ids[:3])
+        with CaptureQueriesContext(connection) as large:
+            response = create(self.goods_ids)
+
+        self.assertEqual(response.data['code'], 200)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(StockTransfer.objects.order_by('-id').first().items.count(), 40)
+
+
+class ConsistencyCheckTest(InventoryTestMixin, TestCase):
+    """库存一致性校验测试"""
+
+    def test_full_check_detects_mismatch(self):
+        """测试全量校验发现库存与流水不一致"""
+        from inventory.goods_inventory_service import GoodsInventoryService
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('3'))
+        Inventory.objects.filter(goods=self.goods).update(quantity=Decimal('9'))
+
+        report = GoodsInventoryService.check_consistency(mode='full')
+
+        self.assertEqual(report['mode'], 'full')
+        self.assertEqual(report['log_rows'], 2)
+        self.assertEqual(len(report['inconsistencies']), 1)
+        self.assertEqual(report['inconsistencies'][0]['calculated_quantity'], Decimal('7'))
+
+    def test_incremental_check_resumes_from_checkpoint(self):
+        """测试增量校验只汇总检查点之后的流水"""
+        from inventory.goods_inventory_service import GoodsInventoryService
+        from inventory.models import InventoryCheckpoint
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        first = GoodsInventoryService.check_consistency(mode='incremental')
+        self.assertEqual(first['mode'], 'full')
+        self.assertEqual(first['inconsistencies'], [])
+
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('4'))
+        second = GoodsInventoryService.check_consistency(mode='incremental')
+
+        self.assertEqual(second['mode'], 'incremental')
+        self.assertEqual(second['from_log_id'], first['to_log_id'])
+        self.assertEqual(second['log_rows'], 1)
+        self.assertEqual(second['inconsistencies'], [])
+        checkpoint = InventoryCheckpoint.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual(checkpoint.quantity, Decimal('6'))
+        self.assertEqual(checkpoint.last_log_id, second['to_log_id'])
+
+    def test_checkpoint_waits_for_late_committed_log(self):
+        """测试检查点不越过尚未提交的流水ID，该流水提交后增量校验仍会汇总"""
+        from inventory.goods_inventory_service import GoodsInventoryService
+        from inventory.models import InventoryCheckpoint
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('5'))
+        late = InventoryLog.objects.order_by('id').first()
+        InventoryLog.objects.filter(id=late.id).delete()
+
+        first = GoodsInventoryService.check_consistency()
+        self.assertEqual(first['checkpoint_log_id'], late.id - 1)
+        self.assertEqual(len(first['inconsistencies']), 1)
+
+        late.save(force_insert=True)
+        second = GoodsInventoryService.check_consistency()
+        self.assertEqual(second['inconsistencies'], [])
+        self.assertEqual(second['checkpoint_log_id'], second['to_log_id'])
+        checkpoint = InventoryCheckpoint.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual(checkpoint.quantity, Decimal('15'))
+
+    def test_watermark_passes_gap_after_timeout(self):
+        """测试回滚留下的空号超过等待时间后被越过"""
+        from system.services import CommitWatermarkService
+
+        for quantity in ('1', '2', '3'):
+            InventoryService.stock_in(self.goods, self.warehouse, Decimal(quantity))
+        ids = list(InventoryLog.objects.order_by('id').values_list('id', flat=True))
+        InventoryLog.objects.filter(id=ids[1]).delete()
+
+        self.assertEqual(CommitWatermarkService.advance('test', [InventoryLog], gap_timeout=60), ids[0])
+        self.assertEqual(CommitWatermarkService.advance('test', [InventoryLog], gap_timeout=60), ids[0])
+        self.assertEqual(CommitWatermarkService.advance('test', [InventoryLog], gap_timeout=0), ids[2])
+
+    def test_checkpoint_position_per_goods(self):
+        """测试单商品校验只推进该商品的检查点，其余商品仍从各自位置增量汇总"""
+        from inventory.goods_inventory_service import GoodsInventoryService
+        from inventory.models import InventoryCheckpoint
+
+        goods2 = Goods.objects.create(code='G002', name='测试商品2', category=self.category)
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_in(goods2, self.warehouse, Decimal('3'))
+        GoodsInventoryService.check_consistency(mode='full')
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('1'))
+        InventoryService.stock_in(goods2, self.warehouse, Decimal('2'))
+        single = GoodsInventoryService.check_consistency(self.goods.id)
+        self.assertEqual((single['log_rows'], single['inconsistencies']), (1, []))
+        positions = dict(InventoryCheckpoint.objects.values_list('goods_id', 'last_log_id'))
+        self.assertGreater(positions[self.goods.id], positions[goods2.id])
+
+        report = GoodsInventoryService.check_consistency()
+        self.assertEqual((report['log_rows'], report['inconsistencies']), (1, []))
+        self.assertEqual(
+            dict(InventoryCheckpoint.objects.values_list('goods_id', 'quantity')),
+            {self.goods.id: Decimal('11'), goods2.id: Decimal('5')}
+        )
+        self.assertEqual(len(set(InventoryCheckpoint.objects.values_list('last_log_id', flat=True))), 1)
+
+
+class ConsistencyRepairTest(InventoryTestMixin, TestCase):
+    """库存不一致批量修复测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_in(self.goods, self.warehouse2, Decimal('5'))
+        Inventory.objects.filter(goods=self.goods, warehouse=self.warehouse).update(quantity=Decimal('8'))
+        Inventory.objects.filter(goods=self.goods, warehouse=self.warehouse2).update(quantity=Decimal('6'))
+
+    def test_repair_to_ledger(self):
+        """测试以流水为准批量修正库存数量，试运行不写入"""
+        preview = GoodsInventoryService.repair_inconsistencies(dry_run=True)
+        self.assertEqual((preview['planned'], preview['repaired']), (2, 0))
+        self.assertEqual(Inventory.objects.get(goods=self.goods, warehouse=self.warehouse).quantity, Decimal('8'))
+
+        result = GoodsInventoryService.repair_inconsistencies(created_by=self.user)
+        self.assertEqual(result['repaired'], 2)
+        self.assertEqual(
+            list(Inventory.objects.filter(goods=self.goods).order_by('warehouse_id').values_list('quantity', flat=True)),
+            [Decimal('10'), Decimal('5')]
+        )
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.total_quantity, Decimal('15'))
+        self.assertFalse(InventoryLog.objects.filter(change_type='check').exists())
+        self.assertEqual(GoodsInventoryService.check_consistency()['inconsistencies'], [])
+
+    def test_repair_to_inventory_writes_check_logs(self):
+        """测试以库存为准补记盘点流水，并只修复报告中指定的行"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.post('/api/v1/basic/goods/fix_consistency/', {
+            'inconsistencies': [{'goods_id': self.goods.id, 'warehouse_id': self.warehouse.id}],
+            'target': 'inventory'
+        }, format='json')
+
+        self.assertEqual(response.data['code'], 200)
+        self.assertEqual(response.data['data']['repaired'], 1)
+        log = InventoryLog.objects.get(change_type='check')
+        self.assertEqual((log.warehouse_id, log.change_quantity, log.after_quantity),
+                         (self.warehouse.id, Decimal('-2'), Decimal('8')))
+        remaining = GoodsInventoryService.check_consistency()['inconsistencies']
+        self.assertEqual([item['warehouse_id'] for item in remaining], [self.warehouse2.id])
+
+    def test_repair_uses_full_recompute(self):
+        """测试修复按全量重算的流水结存计算修正量，不信任增量检查点"""
+        from inventory.models import InventoryCheckpoint
+
+        GoodsInventoryService.check_consistency(mode='full')
+        InventoryCheckpoint.objects.filter(goods=self.goods, warehouse=self.warehouse).update(quantity=Decimal('7'))
+        Inventory.objects.filter(goods=self.goods, warehouse=self.warehouse2).update(quantity=Decimal('5'))
+
+        result = GoodsInventoryService.repair_inconsistencies([
+            {'goods_id': self.goods.id, 'warehouse_id': self.warehouse.id},
+            {'goods_id': self.goods.id, 'warehouse_id': self.warehouse2.id}
+        ], created_by=self.user)
+        self.assertEqual((result['repaired'], result['resolved'], result['scan']['mode']), (1, 1, 'full'))
+        self.assertEqual(result['corrections'][0]['calculated_quantity'], Decimal('10'))
+        self.assertEqual(Inventory.objects.get(goods=self.goods, warehouse=self.warehouse).quantity, Decimal('10'))
+
+
+class InventorySnapshotTest(InventoryTestMixin, TestCase):
+    """库存结存快照测试"""
+
+    def setUp(self):
+        super().setUp()
+        from datetime import datetime
+        from django.utils import timezone
+
+        def at(log, value):
+            InventoryLog.objects.filter(id=log.id).update(
+                created_at=timezone.make_aware(datetime.strptime(value, '%Y-%m-%d %H:%M'))
+            )
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        at(InventoryLog.objects.latest('id'), '2026-06-10 09:00')
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('3'))
+        at(InventoryLog.objects.latest('id'), '2026-06-20 15:00')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('5'))
+        at(InventoryLog.objects.latest('id'), '2026-07-05 10:00')
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_build_monthly_snapshot(self):
+        """测试增量生成月结快照"""
+        from datetime import date
+        from inventory.models import InventorySnapshot
+        from inventory.snapshot_service import InventorySnapshotService
+
+        created = InventorySnapshotService.build(period='month', until=date(2026, 6, 30))
+        self.assertEqual(created, 1)
+        snapshot = InventorySnapshot.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual(snapshot.snapshot_date, date(2026, 6, 30))
+        self.assertEqual(snapshot.quantity, Decimal('7'))
+
+        created = InventorySnapshotService.build(period='month', until=date(2026, 7, 31))
+        self.assertEqual(created, 1)
+        self.assertEqual(
+            InventorySnapshot.objects.get(snapshot_date=date(2026, 7, 31)).quantity,
+            Decimal('12')
+        )
+
+    def test_as_of_query(self):
+        """测试按日期查询历史库存"""
+        from datetime import date
+        from inventory.snapshot_service import InventorySnapshotService
+
+        InventorySnapshotService.build(period='month', until=date(2026, 6, 30))
+
+        expected = {'2026-06-15': '10.00', '2026-06-30': '7.00', '2026-07-31': '12.00'}
+        for as_of, quantity in expected.items():
+            response = self.client.get('/api/v1/inventory/inventory/', {'as_of': as_of})
+            self.assertEqual(response.data['code'], 200)
+            self.assertEqual(response.data['data']['items'][0]['as_of_quantity'], quantity)
+
+    def test_as_of_invalid_date(self):
+        """测试日期格式错误"""
+        response = self.client.get('/api/v1/inventory/inventory/', {'as_of': '2026-13-01'})
+        self.assertEqual(response.data['code'], 400)
+
+
+class InventoryLogArchiveTest(InventoryTestMixin, TestCase):
+    """库存流水归档测试"""
+
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+        from django.utils import timezone
+
+        self.old_day = timezone.localdate() - timedelta(days=400)
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('4'))
+        InventoryLog.objects.update(created_at=timezone.now() - timedelta(days=400))
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('5'))
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def archive(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('archive_inventory_logs', days=365, batch_size=1, stdout=StringIO())
+
+    def test_archive_moves_old_logs(self):
+        """测试分批归档旧流水且一致性校验包含归档流水"""
+        from inventory.models import InventoryLogArchive
+        from inventory.goods_inventory_service import GoodsInventoryService
+
+        self.archive()
+
+        self.assertEqual(InventoryLog.objects.count(), 1)
+        self.assertEqual(InventoryLogArchive.objects.count(), 2)
+        report = GoodsInventoryService.check_consistency(mode='full')
+        self.assertEqual(report['log_rows'], 3)
+        self.assertEqual(report['inconsistencies'], [])
+
+    def test_log_list_routes_by_date_range(self):
+        """测试流水列表按日期范围路由在线表/归档表"""
+        self.archive()
+        url = '/api/v1/inventory/logs/'
+        old_day = self.old_day.isoformat()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['data']['count'], 1)
+
+        response = self.client.get(url, {'start_date': old_day, 'end_date': old_day})
+        self.assertEqual(response.data['data']['count'], 2)
+        self.assertEqual({item['change_type'] for item in response.data['data']['items']},
+                         {'inbound', 'outbound'})
+
+        response = self.client.get(url, {'start_date': old_day, 'page_size': 2})
+        self.assertEqual(response.data['data']['count'], 3)
+        self.assertEqual(response.data['data']['items'][0]['change_quantity'], '5.00')
+        self.assertIsNotNone(response.data['data']['next'])
+
+        response = self.client.get(url, {'start_date': old_day, 'page_size': 2, 'cursor': ''})
+        items = response.data['data']['items']
+        response = self.client.get(response.data['data']['next'])
+        items += response.data['data']['items']
+        self.assertEqual([item['change_quantity'] for item in items], ['5.00', '4.00', '10.00'])
+        self.assertIsNone(response.data['data']['next'])
+
+
+class InventoryLogCursorPaginationTest(InventoryTestMixin, TestCase):
+    """库存流水游标分页测试"""
+
+    def setUp(self):
+        super().setUp()
+        for quantity in range(1, 6):
+            InventoryService.stock_in(self.goods, self.warehouse, Decimal(quantity))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_cursor_walks_pages(self):
+        """测试游标分页前后翻页且不返回 count"""
+        response = self.client.get('/api/v1/inventory/logs/', {'cursor': '', 'page_size': 2})
+        data = response.data['data']
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['previous'])
+        self.assertEqual([item['change_quantity'] for item in data['items']], ['5.00', '4.00'])
+
+        seen = [item['id'] for item in data['items']]
+        next_link = data['next']
+        while next_link:
+            data = self.client.get(next_link).data['data']
+            seen.extend(item['id'] for item in data['items'])
+            previous_link = data['previous']
+            next_link = data['next']
+
+        self.assertEqual(seen, list(InventoryLog.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+        data = self.client.get(previous_link).data['data']
+        self.assertEqual([item['change_quantity'] for item in data['items']], ['3.00', '2.00'])
+
+    def test_page_number_mode_unchanged(self):
+        """测试未携带 cursor 时仍为页码分页"""
+        response = self.client.get('/api/v1/inventory/logs/', {'page': 2, 'page_size': 2})
+        self.assertEqual(response.data['data']['count'], 5)
+        self.assertEqual(len(response.data['data']['items']), 2)
+
+
+class StockReservationTest(InventoryTestMixin, TestCase):
+    """销售预留与可用库存测试"""
+
+    def setUp(self):
+        super().setUp()
+        from basic.models import Customer
+
+        self.customer = Customer.objects.create(code='C001', name='测试客户', tax_no='TAX001', address='测试地址')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_order(self, quantity):
+        return self.client.post('/api/v1/sale/orders/', {
+            'customer': self.customer.id,
+            'warehouse': self.warehouse.id,
+            'order_date': '2026-10-01',
+            'items': [{'goods': self.goods.id, 'quantity': str(quantity), 'price': '89.00'}]
+        }, format='json')
+
+    def reserved(self):
+        return Inventory.objects.get(goods=self.goods, warehouse=self.warehouse).reserved_quantity
+
+    def test_reservation_lifecycle(self):
+        """测试销售单创建、修改、取消时维护预留数量，且不能超卖"""
+        response = self.create_order(6)
+        self.assertEqual(response.data['code'], 200)
+        self.assertEqual(self.reserved(), Decimal('6'))
+
+        response = self.create_order(5)
+        self.assertEqual(response.data['code'], 400)
+        self.assertIn('可用库存不足', response.data['msg'])
+        self.assertEqual(self.reserved(), Decimal('6'))
+
+        from sale.models import SaleOrder
+        order = SaleOrder.objects.get()
+        response = self.client.put(f'/api/v1/sale/orders/{order.id}/', {
+            'customer': self.customer.id,
+            'warehouse': self.warehouse.id,
+            'order_date': '2026-10-01',
+            'items': [{'goods': self.goods.id, 'quantity': '8', 'price': '89.00'}]
+        }, format='json')
+        self.assertEqual(response.data['code'], 200)
+        self.assertEqual(self.reserved(), Decimal('8'))
+
+        response = self.client.post(f'/api/v1/sale/orders/{order.id}/cancel/')
+        self.assertEqual(response.data['code'], 200)
+        self.assertEqual(self.reserved(), Decimal('0'))
+
+    def test_confirm_consumes_reservation(self):
+        """测试确认出库同时扣减库存和预留"""
+        from sale.models import SaleOrder
+
+        self.create_order(4)
+        order = SaleOrder.objects.get()
+        response = self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/')
+        self.assertEqual(response.data['code'], 200)
+
+        inventory = Inventory.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual(inventory.quantity, Decimal('6'))
+        self.assertEqual(inventory.reserved_quantity, Decimal('0'))
+
+    def test_batch_availability(self):
+        """测试批量可用库存查询"""
+        self.create_order(6)
+        response = self.client.get('/api/v1/inventory/inventory/availability/', {
+            'warehouse': self.warehouse.id,
+            'items': f'{self.goods.id}:5,999999:1'
+        })
+        data = response.data['data']
+        self.assertFalse(data['all_sufficient'])
+        self.assertEqual(data['items'][0]['available'], Decimal('4'))
+        self.assertFalse(data['items'][0]['sufficient'])
+        self.assertEqual(data['items'][1]['available'], Decimal('0'))
+
+        response = self.client.get('/api/v1/inventory/inventory/', {'warehouse': self.warehouse.id})
+        self.assertEqual(response.data['data']['items'][0]['available'], '4.00')
+
+
+class GoodsStockTotalsTest(InventoryTestMixin, TestCase):
+    """商品总库存冗余字段测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_totals_follow_movements(self):
+        """测试单笔与批量库存变动同步维护总库存和库存状态"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.apply_movements([
+            {'goods': self.goods, 'warehouse': self.warehouse2, 'change_type': 'inbound', 'quantity': Decimal('5')},
+            {'goods': self.goods, 'warehouse': self.warehouse, 'change_type': 'outbound', 'quantity': Decimal('2')},
+        ])
+
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.total_quantity, Decimal('13'))
+        self.assertEqual(self.goods.stock_status, 'normal')
+
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('8'))
+        InventoryService.stock_out(self.goods, self.warehouse2, Decimal('5'))
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.total_quantity, Decimal('0'))
+        self.assertEqual(self.goods.stock_status, 'out')
+
+    def test_goods_list_filters_by_stock_status(self):
+        """测试商品列表按库存状态筛选并读取冗余总库存"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        response = self.client.patch(f'/api/v1/basic/goods/{self.goods.id}/', {'min_stock': 5, 'max_stock': 20},
+                                     format='json')
+        self.assertEqual(response.data['code'], 200)
+
+        response = self.client.get('/api/v1/basic/goods/', {'stock_status': 'low'})
+        items = response.data['data']['items']
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['total_quantity'], 3)
+        self.assertEqual(items[0]['stock_status'], {'code': 'low', 'text': '库存不足'})
+
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.total_quantity, Decimal('3'))
+
+
+class InventoryStockStatusTest(InventoryTestMixin, TestCase):
+    """库存行库存状态列测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def status_of(self, warehouse):
+        return Inventory.objects.get(goods=self.goods, warehouse=warehouse).stock_status
+
+    def test_status_follows_quantity_and_thresholds(self):
+        """测试库存变动与阈值调整时重算库存状态"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        InventoryService.stock_in(self.goods, self.warehouse2, Decimal('30'))
+        self.assertEqual(self.status_of(self.warehouse), 'normal')
+
+        self.client.patch(f'/api/v1/basic/goods/{self.goods.id}/', {'min_stock': 5, 'max_stock': 20}, format='json')
+        self.assertEqual(self.status_of(self.warehouse), 'low')
+        self.assertEqual(self.status_of(self.warehouse2), 'over')
+
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('3'))
+        self.assertEqual(self.status_of(self.warehouse), 'out')
+
+    def test_refresh_multiple_thresholds_single_update(self):
+        """测试不同阈值的多个商品在一条 UPDATE 中重算库存状态"""
+        goods2 = Goods.objects.create(code='G002', name='测试商品2', category=self.category)
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        InventoryService.stock_in(goods2, self.warehouse, Decimal('30'))
+        Goods.objects.filter(id=self.goods.id).update(min_stock=5)
+        Goods.objects.filter(id=goods2.id).update(max_stock=20)
+
+        with CaptureQueriesContext(connection) as queries:
+            changes = InventoryService.refresh_stock_status({self.goods.id, goods2.id})
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(
+            sorted((item['goods_id'], item['new_status'], item['min_stock'], item['max_stock']) for item in changes),
+            [(self.goods.id, 'low', Decimal('5'), Decimal('0')), (goods2.id, 'over', Decimal('0'), Decimal('20'))]
+        )
+        self.assertEqual(InventoryAlert.objects.filter(goods_id__in=[self.goods.id, goods2.id]).count(), 2)
+
+    def test_list_filters_by_status_column(self):
+        """测试库存列表按状态列筛选和统计"""
+        Goods.objects.filter(id=self.goods.id).update(min_stock=5)
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        InventoryService.stock_in(self.goods, self.warehouse2, Decimal('8'))
+
+        response = self.client.get('/api/v1/inventory/inventory/', {'stock_status': 'low'})
+        data = response.data['data']
+        self.assertEqual(len(data['items']), 1)
+        self.assertEqual(data['items'][0]['warehouse'], self.warehouse.id)
+        self.assertEqual(data['items'][0]['stock_status'], {'code': 'low', 'text': '库存不足'})
+        self.assertEqual(response.data['stats']['low_stock'], 1)
+
+
+class InventoryAlertTest(InventoryTestMixin, TestCase):
+    """库存预警表测试"""
+
+    def setUp(self):
+        super().setUp()
+        Goods.objects.filter(id=self.goods.id).update(min_stock=5, max_stock=20)
+        self.goods.refresh_from_db()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def active_alerts(self):
+        return list(InventoryAlert.objects.filter(status='active').values_list('alert_type', flat=True))
+
+    def test_alerts_change_only_on_threshold_crossing(self):
+        """测试库存跨越阈值时开启/解除预警，阈值内变动不产生新预警"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        self.assertEqual(self.active_alerts(), ['low'])
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('1'))
+        self.assertEqual(InventoryAlert.objects.count(), 1)
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('6'))
+        self.assertEqual(self.active_alerts(), [])
+        self.assertIsNotNone(InventoryAlert.objects.get().resolved_at)
+
+        InventoryService.apply_movements([
+            {'goods': self.goods, 'warehouse': self.warehouse, 'change_type': 'outbound', 'quantity': Decimal('10')},
+        ])
+        self.assertEqual(self.active_alerts(), ['out'])
+        self.assertEqual(InventoryAlert.objects.count(), 2)
+
+    def test_warning_endpoints(self):
+        """测试库存预警列表读取预警表，商品预警一次查询返回"""
+        warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        InventoryService.stock_in(self.goods, warehouse2, Decimal('30'))
+
+        response = self.client.get('/api/v1/inventory/inventory/warning/')
+        items = {item['warning_type']: item for item in response.data['data']}
+        self.assertEqual(set(items), {'low', 'over'})
+        self.assertEqual(items['low']['quantity'], Decimal('3'))
+        self.assertEqual(items['low']['min_stock'], 5)
+        self.assertEqual(items['low']['id'], Inventory.objects.get(goods=self.goods, warehouse=self.warehouse).id)
+        self.assertEqual(items['low']['alert_id'], InventoryAlert.objects.get(warehouse=self.warehouse, alert_type='low').id)
+
+        response = self.client.get('/api/v1/inventory/inventory/warning/', {'warehouse': warehouse2.id})
+        self.assertEqual([item['warning_type'] for item in response.data['data']], ['over'])
+
+        InventoryService.stock_out(self.goods, warehouse2, Decimal('30'))
+        with self.assertNumQueries(1):
+            warnings = GoodsInventoryService.get_stock_warning_goods()
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0]['status_code'], 'low')
+        self.assertEqual(warnings[0]['category'], '电子产品')
+
+    def test_rebuild_alerts(self):
+        """测试按实时库存校正预警表"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        InventoryAlert.objects.all().delete()
+        Inventory.objects.filter(goods=self.goods).update(quantity=0)
+
+        result = StockWarningService.rebuild()
+        self.assertEqual(result, {'opened': 1, 'resolved': 0, 'active': 1})
+        self.assertEqual(self.active_alerts(), ['out'])
+        self.assertEqual(StockWarningService.rebuild()['opened'], 0)
+
+
+class GoodsStockSummaryTest(InventoryTestMixin, TestCase):
+    """商品库存汇总缓存测试"""
+
+    def setUp(self):
+        super().setUp()
+        shared_cache().clear()
+        Goods.objects.create(code='G002', name='停用商品', category=self.category, status=0)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_summary_single_query_and_cached(self):
+        """测试汇总一次查询完成，重复读取命中缓存"""
+        with self.assertNumQueries(1):
+            summary = GoodsInventoryService.compute_goods_stock_summary()
+        self.assertEqual(summary['total_goods'], 1)
+        self.assertEqual(summary['out_of_stock'], 1)
+        self.assertEqual(summary['warning_count'], 1)
+
+        GoodsInventoryService.get_goods_stock_summary()
+        # 命中共享缓存：只读取版本号和缓存数据，不再汇总
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/basic/goods/stock_summary/')
+        self.assertEqual(response.data['data']['total_goods'], 1)
+
+    def test_summary_invalidated_by_movement_and_threshold(self):
+        """测试库存变动和阈值调整后汇总缓存失效"""
+        GoodsInventoryService.get_goods_stock_summary()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        summary = GoodsInventoryService.get_goods_stock_summary()
+        self.assertEqual(summary['normal_stock'], 1)
+        self.assertEqual(summary['total_quantity'], Decimal('3'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/v1/basic/goods/{self.goods.id}/', {'min_stock': 5, 'max_stock': 20},
+                              format='json')
+        summary = GoodsInventoryService.get_goods_stock_summary()
+        self.assertEqual(summary['low_stock'], 1)
+        self.assertEqual(summary['warning_count'], 1)
+
+    def test_invalidation_across_cache_instances(self):
+        """测试后台任务进程中的库存变动使 Web 进程（独立的缓存实例）的汇总缓存失效"""
+        from django.core.cache.backends.db import DatabaseCache
+
+        location = settings.CACHES['shared']['LOCATION']
+        web, worker = DatabaseCache(location, {}), DatabaseCache(location, {})
+
+        def using(instance):
+            return mock.patch('utils.cache.caches', {'shared': instance})
+
+        with using(web):
+            self.assertEqual(GoodsInventoryService.get_goods_stock_summary()['total_quantity'], Decimal('0'))
+        with using(worker), self.captureOnCommitCallbacks(execute=True):
+            InventoryService.stock_in(self.goods, self.warehouse, Decimal('3'))
+        with using(web):
+            self.assertEqual(GoodsInventoryService.get_goods_stock_summary()['total_quantity'], Decimal('3'))
+
+    def test_lost_version_key_not_reused(self):
+        """测试版本键被淘汰后不会回到旧版本号读到旧数据"""
+        GoodsInventoryService.get_goods_stock_summary()
+        Goods.objects.filter(id=self.goods.id).update(total_quantity=Decimal('9'))
+        shared_cache().delete(GoodsInventoryService.SUMMARY_VERSION_KEY)
+        self.assertEqual(GoodsInventoryService.get_goods_stock_summary()['total_quantity'], Decimal('9'))
+
+
+class StreamingExportTest(InventoryTestMixin, TestCase):
+    """流式导出测试"""
+
+    def setUp(self):
+        super().setUp()
+        for quantity in ('5', '3', '2'):
+            InventoryService.stock_in(self.goods, self.warehouse, Decimal(quantity), unit_cost=Decimal('10'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_iter_values_keyset_batches(self):
+        """测试按主键分批读取覆盖全部行且顺序正确"""
+        queryset = InventoryLog.objects.filter(goods=self.goods)
+        with self.assertNumQueries(2):
+            rows = list(iter_values(queryset, ('change_quantity',), chunk_size=2, descending=True))
+        self.assertEqual(rows, [(Decimal('2'),), (Decimal('3'),), (Decimal('5'),)])
+
+    def test_inventory_log_csv_export(self):
+        """测试流水导出为带 BOM 的 CSV，类型导出中文名称"""
+        response = self.client.get('/api/v1/inventory/logs/export/', {'export': 'csv', 'goods': self.goods.id})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('操作时间,商品编码'))
+        self.assertIn(',G001,测试商品,测试仓库,入库,', lines[1])
+
+        response = self.client.get('/api/v1/inventory/logs/export/', {'export': 'pdf'})
+        self.assertEqual(response.data['code'], 400)
+
+    def test_report_xlsx_export(self):
+        """测试库存报表导出为可解析的 XLSX"""
+        response = self.client.get('/api/v1/reports/inventory/', {'export': 'xlsx'})
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIsNone(workbook.testzip())
+        self.assertEqual(sheet.count('<row>'), 2)
+        self.assertIn('<t xml:space="preserve">G001</t>', sheet)
+        self.assertIn('<c><v>10.00</v></c><c><v>10.0000</v></c><c><v>100', sheet)
+
+
+class MovingAverageCostTest(InventoryTestMixin, TestCase):
+    """移动加权平均成本测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def receive(self, order_no, quantity, price):
+        """按采购单入库"""
+        from basic.models import Supplier
+        from inventory.document_service import StockDocumentService
+        from purchase.models import PurchaseItem, PurchaseOrder
+
+        supplier = Supplier.objects.get_or_create(
+            code='SUP001', defaults={'name': '测试供应商', 'tax_no': 'TAX001', 'address': '测试地址'}
+        )[0]
+        order = PurchaseOrder.objects.create(order_no=order_no, supplier=supplier, warehouse=self.warehouse)
+        PurchaseItem.objects.create(order=order, goods=self.goods, quantity=quantity, price=price,
+                                    amount=quantity * price)
+        stock_in = StockIn.objects.create(order_no=f'RK{order_no}', purchase_order=order, warehouse=self.warehouse)
+        StockDocumentService.confirm_stock_in(stock_in, self.user)
+
+    def test_weighted_average_on_receipts(self):
+        """测试多次采购入库按加权平均更新单位成本，出库不改变单位成本"""
+        self.receive('PO001', Decimal('10'), Decimal('10'))
+        self.receive('PO002', Decimal('30'), Decimal('14'))
+        inventory = Inventory.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual(inventory.unit_cost, Decimal('13.0000'))
+
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('25'))
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('5'))
+        inventory.refresh_from_db()
+        self.assertEqual((inventory.quantity, inventory.unit_cost), (Decimal('20'), Decimal('13.0000')))
+
+        inventory = InventoryService.stock_in(self.goods, self.warehouse, Decimal('20'), unit_cost=Decimal('15'))
+        self.assertEqual(inventory.unit_cost, Decimal('14.0000'))
+
+        response = self.client.get('/api/v1/reports/inventory/')
+        row = response.data['data']['results'][0]
+        self.assertEqual((row['avg_price'], row['total_value']), (14.0, 560.0))
+
+    def test_cost_defaults_and_transfer(self):
+        """测试无入库单价时取商品进货价，调拨按调出仓成本入账"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        self.assertEqual(Inventory.objects.get(goods=self.goods).unit_cost, Decimal('50.0000'))
+
+        warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        InventoryService.stock_in(self.goods, warehouse2, Decimal('10'), unit_cost=Decimal('20'))
+        transfer = StockTransfer.objects.create(order_no='ST001', from_warehouse=warehouse2,
+                                                to_warehouse=self.warehouse)
+        StockTransferItem.objects.create(transfer=transfer, goods=self.goods, quantity=Decimal('10'))
+        self.client.post(f'/api/v1/inventory/transfer/{transfer.id}/confirm/')
+
+        inventory = Inventory.objects.get(goods=self.goods, warehouse=self.warehouse)
+        self.assertEqual((inventory.quantity, inventory.unit_cost), (Decimal('20'), Decimal('35.0000')))
+
+
+class FifoCostTest(InventoryTestMixin, TestCase):
+    """FIFO 成本计算测试"""
+
+    def test_fifo_cogs_resumes_from_checkpoint(self):
+        """测试出库按先进先出计算成本，再次计算只处理新增流水"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'), unit_cost=Decimal('10'))
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'), unit_cost=Decimal('20'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('15'))
+
+        result = FifoCostService.run(workers=1)
+        self.assertEqual((result['goods'], result['logs']), (1, 3))
+        outbound = MovementCost.objects.get(quantity__lt=0)
+        self.assertEqual((outbound.amount, outbound.unit_cost), (Decimal('-200.0000'), Decimal('13.3333')))
+        self.assertEqual(
+            FifoCostService.valuation()[(self.goods.id, self.warehouse.id)],
+            {'quantity': Decimal('5'), 'value': Decimal('100')}
+        )
+
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('3'))
+        result = FifoCostService.run(workers=1, chunk_size=1)
+        self.assertEqual(result['logs'], 1)
+        self.assertEqual(MovementCost.objects.count(), 4)
+        self.assertEqual(MovementCost.objects.order_by('-log_id').first().amount, Decimal('-60.0000'))
+        self.assertEqual(
+            list(CostLayer.objects.order_by('source_log_id').values_list('remaining_quantity', flat=True)),
+            [Decimal('0'), Decimal('2')]
+        )
+        self.assertEqual(FifoCostService.run(workers=1)['logs'], 0)
+
+    def test_late_committed_log_not_skipped(self):
+        """测试ID较小但提交较晚的流水未出现时不越过，提交后按流水顺序计算"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'), unit_cost=Decimal('10'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('4'))
+        late = InventoryLog.objects.order_by('id').first()
+        InventoryLog.objects.filter(id=late.id).delete()
+
+        self.assertEqual(FifoCostService.run(workers=1)['logs'], 0)
+        late.save(force_insert=True)
+        self.assertEqual(FifoCostService.run(workers=1)['logs'], 2)
+        outbound = MovementCost.objects.get(quantity__lt=0)
+        self.assertEqual(outbound.amount, Decimal('-40.0000'))
+
+    def test_deficit_resumes_from_checkpoint(self):
+        """测试负库存缺口随进度保存，中断后续算时后续入库先冲抵缺口"""
+        # 负库存只会来自历史导入等不经出库校验的流水，这里直接写入
+        InventoryLog.objects.create(
+            goods=self.goods, warehouse=self.warehouse, change_type='outbound', movement_kind='other',
+            change_quantity=Decimal('4'), before_quantity=Decimal('0'), after_quantity=Decimal('-4')
+        )
+        self.assertEqual(FifoCostService.run(workers=1)['logs'], 1)
+        self.assertEqual(
+            list(CostLayer.objects.values_list('quantity', 'remaining_quantity')),
+            [(Decimal('0'), Decimal('-4'))]
+        )
+        self.assertEqual(FifoCostService.valuation(), {})
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'), unit_cost=Decimal('10'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('3'))
+        self.assertEqual(FifoCostService.run(workers=1, chunk_size=1)['logs'], 2)
+        self.assertEqual(MovementCost.objects.order_by('-log_id').first().amount, Decimal('-30.0000'))
+        self.assertEqual(
+            list(CostLayer.objects.values_list('quantity', 'remaining_quantity')),
+            [(Decimal('10'), Decimal('3'))]
+        )
+        self.assertEqual(
+            FifoCostService.valuation()[(self.goods.id, self.warehouse.id)],
+            {'quantity': Decimal('3'), 'value': Decimal('30')}
+        )
+
+    def test_transfer_carries_fifo_cost(self):
+        """测试调入仓按调出仓消耗的 FIFO 成本形成成本层"""
+        warehouse2 = Warehouse.objects.create(name='测试仓库2')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('4'), unit_cost=Decimal('10'))
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('4'), unit_cost=Decimal('30'))
+        transfer = StockTransfer.objects.create(order_no='ST001', from_warehouse=self.warehouse,
+                                                to_warehouse=warehouse2)
+        StockTransferItem.objects.create(transfer=transfer, goods=self.goods, quantity=Decimal('6'))
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        client.post(f'/api/v1/inventory/transfer/{transfer.id}/confirm/')
+
+        FifoCostService.run(workers=1, chunk_size=2)
+        self.assertEqual(FifoCostService.order_cogs(transfer), {self.goods.id: Decimal('100')})
+        layer = CostLayer.objects.get(warehouse=warehouse2)
+        self.assertEqual((layer.remaining_quantity, layer.unit_cost), (Decimal('6'), Decimal('16.6667')))
+
+
+class StocktakeImportTest(InventoryTestMixin, TestCase):
+    """盘点导入测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.goods2 = Goods.objects.create(code='G002', name='测试商品2', category=self.category)
+        self.goods3 = Goods.objects.create(code='G003', name='测试商品3', category=self.category)
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_in(self.goods2, self.warehouse, Decimal('5'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, content, **extra):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        file = SimpleUploadedFile('stocktake.csv', content.encode('utf-8'), content_type='text/csv')
+        return self.client.post('/api/v1/inventory/adjust/stocktake/',
+                                {'file': file, 'warehouse': self.warehouse.id, **extra}, format='multipart')
+
+    def test_import_generates_adjust_documents(self):
+        """测试盘点差异按批生成增加/减少调整单，确认后库存等于盘点数量"""
+        response = self.upload('商品编码,盘点数量,备注\nG001,7,破损\nG002,5,\nG003,2,\n')
+        data = response.data['data']
+        self.assertEqual((data['lines'], data['adjusted']), (3, 2))
+
+        adjusts = {item['adjust_type']: item['id'] for item in data['adjusts']}
+        decrease = StockAdjust.objects.get(id=adjusts['decrease'])
+        self.assertEqual(decrease.reason, 'check')
+        self.assertEqual(list(decrease.items.values_list('goods_id', 'adjust_quantity')),
+                         [(self.goods.id, Decimal('-3'))])
+
+        for adjust_id in adjusts.values():
+            response = self.client.post(f'/api/v1/inventory/adjust/{adjust_id}/confirm/')
+            self.assertEqual(response.data['code'], 200)
+
+        self.assertEqual(
+            dict(Inventory.objects.filter(warehouse=self.warehouse).values_list('goods__code', 'quantity')),
+            {'G001': Decimal('7'), 'G002': Decimal('5'), 'G003': Decimal('2')}
+        )
+        self.assertEqual(InventoryLog.objects.filter(movement_kind='check').count(), 2)
+
+        # 历史数据按调整单原因回填：盘点调整单的流水为 check
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module('inventory.migrations.0015_backfill_check_movement_kind')
+        InventoryLog.objects.filter(movement_kind='check').update(movement_kind='adjust')
+        with mock.patch('builtins.print'):
+            migration.backfill_check_kind(apps, None)
+        self.assertEqual(InventoryLog.objects.filter(movement_kind='check').count(), 2)
+
+    def test_import_errors_roll_back(self):
+        """测试错误行、重复商品时整体回滚并提示行号"""
+        with mock.patch.object(StocktakeImportService, 'CHUNK_SIZE', 1):
+            response = self.upload('G001,7\nG999,1\nG002,abc\n')
+            self.assertEqual(response.data['code'], 400)
+            self.assertIn('第2行商品编码 G999 不存在', response.data['msg'])
+            self.assertIn('第3行盘点数量 abc 格式错误', response.data['msg'])
+
+            response = self.upload('G001,7\nG002,1\nG001,8\n')
+            self.assertIn('商品编码 G001 重复盘点', response.data['msg'])
+
+            # 无差异的行同样参与重复检查，跨批次也能发现
+            response = self.upload('G002,5\nG001,7\nG002,5\n')
+            self.assertIn('第3行商品编码 G002 重复盘点', response.data['msg'])
+        response = self.upload('G002,5\nG002,5\n')
+        self.assertIn('第2行商品编码 G002 重复盘点', response.data['msg'])
+        self.assertFalse(StockAdjust.objects.exists())
@@ -1,17 +1,21 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from django.db import transaction, models
-from django.db.models import Q, Sum, Count
+from django.db.models import Q, Sum, Count, Max, Min
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status as http_status
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, ValidationError as DRFValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter, SearchFilter
 
-from .models import Inventory, InventoryLog, StockIn, StockOut, StockAdjust, StockAdjustItem, StockTransfer, StockTransferItem
-from basic.models import Goods
+from .models import Inventory, InventoryAlert, InventoryLog, InventoryLogArchive, StockIn, StockOut, StockAdjust, StockTransfer
+from basic.models import Warehouse
 from .serializers import (
     InventorySerializer, InventoryListSerializer, InventoryLogSerializer,
     StockInSerializer, StockInCreateSerializer, StockOutSerializer,
@@ -19,9 +23,16 @@ from .serializers import (
     StockTransferSerializer, StockTransferCreateSerializer
 )
 from .services import InventoryService
-from utils.views import BaseModelViewSet
-from utils.order_no import generate_order_no
+from .document_service import StockDocumentService
+from .snapshot_service import InventorySnapshotService
+from .stocktake_service import StocktakeImportService
+from .warning_service import StockWarningService
+from utils.views import BaseModelViewSet, is_async_request
+from utils.dates import day_start
+from utils.pagination import KeysetPagination
+from utils.export import EXPORT_FORMATS, iter_values, streaming_export
 from system.permissions import ModulePermission
+from system.services import JobService, OutboxService
 
 
 class InventoryViewSet(BaseModelViewSet):
@@ -34,7 +45,7 @@ class InventoryViewSet(BaseModelViewSet):
     filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
     filterset_fields = ['warehouse', 'goods']
     search_fields = ['goods__name', 'goods__code']
-    ordering_fields = ['quantity', 'updated_at', 'goods__name', 'goods__code']
+    ordering_fields = ['quantity', 'updated_at', 'goods__name', 'goods__code', 'stock_status']
     ordering = ['-updated_at']
     module_name = '库存查询'
 
@@ -55,23 +66,8 @@ class InventoryViewSet(BaseModelViewSet):
             queryset = queryset.filter(goods__category_id=category_id)
         
         stock_status = params.get('stock_status')
-        if stock_status:
-            if stock_status == 'out':
-                queryset = queryset.filter(quantity__lte=0)
-            elif stock_status == 'low':
-                queryset = queryset.filter(
-                    quantity__gt=0
-                ).extra(
-                    where=['quantity <= (SELECT min_stock FROM biz_goods WHERE biz_goods.id = biz_inventory.goods_id AND min_stock > 0)']
-                )
-            elif stock_status == 'over':
-                queryset = queryset.filter(
-                    quantity__gt=0
-                ).extra(
-                    where=['quantity >= (SELECT max_stock FROM biz_goods WHERE biz_goods.id = biz_inventory.goods_id AND max_stock > 0)']
-                )
-            elif stock_status == 'normal':
-                queryset = queryset.filter(quantity__gt=0)
+        if stock_status in dict(Inventory._meta.get_field('stock_status').choices):
+            queryset = queryset.filter(stock_status=stock_status)
         
         quantity_min = params.get('quantity_min')
         if quantity_min:
@@ -87,10 +83,20 @@ class InventoryViewSet(BaseModelViewSet):
             except (ValueError, TypeError):
                 pass
         
+        as_of = params.get('as_of')
+        if as_of and self.action == 'list':
+            try:
+                as_of_date = parse_date(as_of)
+            except ValueError:
+                as_of_date = None
+            if as_of_date is None:
+                raise DRFValidationError({'as_of': '日期格式错误，应为 YYYY-MM-DD'})
+            queryset = InventorySnapshotService.annotate_as_of(queryset, as_of_date)
+        
         return queryset
 
     def list(self, request, *args, **kwargs):
-        """列表查询，包含统计信息"""
+        """列表查询，包含统计信息；传入 as_of=YYYY-MM-DD 时附带该日期的历史库存 as_of_quantity"""
         try:
             queryset = self.filter_queryset(self.get_queryset())
             
@@ -101,14 +107,18 @@ class InventoryViewSet(BaseModelViewSet):
                 stats = queryset.aggregate(
                     total_quantity=Sum('quantity'),
                     total_items=Count('id'),
-                    out_of_stock=Count('id', filter=Q(quantity__lte=0))
+                    out_of_stock=Count('id', filter=Q(stock_status='out')),
+                    low_stock=Count('id', filter=Q(stock_status='low')),
+                    over_stock=Count('id', filter=Q(stock_status='over'))
                 )
                 
                 response = self.get_paginated_response(serializer.data)
                 response.data['stats'] = {
                     'total_quantity': stats['total_quantity'] or 0,
                     'total_items': stats['total_items'] or 0,
-                    'out_of_stock': stats['out_of_stock'] or 0
+                    'out_of_stock': stats['out_of_stock'] or 0,
+                    'low_stock': stats['low_stock'] or 0,
+                    'over_stock': stats['over_stock'] or 0
                 }
                 return response
             
@@ -118,6 +128,12 @@ class InventoryViewSet(BaseModelViewSet):
                 'msg': '查询成功',
                 'data': serializer.data
             })
+        except DRFValidationError as e:
+            return Response({
+                'code': 400,
+                'msg': str(e.detail.get('as_of', ['参数错误'])[0]),
+                'data': None
+            })
         except Exception as e:
             return Response({
                 'code': 500,
@@ -171,7 +187,7 @@ class InventoryViewSet(BaseModelViewSet):
             total_stats = queryset.aggregate(
                 total_quantity=Sum('quantity'),
                 total_items=Count('id'),
-                out_of_stock=Count('id', filter=Q(quantity__lte=0))
+                out_of_stock=Count('id', filter=Q(stock_status='out'))
             )
             
             warehouse_stats = queryset.values(
@@ -208,50 +224,104 @@ class InventoryViewSet(BaseModelViewSet):
                 'data': None
             }, status=http_status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """
+        批量可用库存查询（可用 = 库存数量 - 销售预留数量）
+        参数：warehouse=仓库ID，items=商品ID:需求数量,商品ID:需求数量（需求数量可省略）
+        """
+        warehouse_id = request.query_params.get('warehouse')
+        items_param = request.query_params.get('items', '')
+        
+        try:
+            warehouse_id = int(warehouse_id)
+            requested = {}
+            for part in items_param.split(','):
+                if not part.strip():
+                    continue
+                goods_id, _, quantity = part.partition(':')
+                requested[int(goods_id)] = Decimal(quantity) if quantity else None
+        except (TypeError, ValueError, ArithmeticError):
+            return Response({'code': 400, 'msg': '参数格式错误，应为 warehouse=ID&items=商品ID:数量,...', 'data': None})
+        
+        if not requested:
+            return Response({'code': 400, 'msg': '请指定需要查询的商品', 'data': None})
+        
+        availability = InventoryService.get_availability(warehouse_id, list(requested))
+        items = []
+        for goods_id, quantity in requested.items():
+            row = availability[goods_id]
+            items.append({
+                'goods': goods_id,
+                'quantity': row['quantity'],
+                'reserved_quantity': row['reserved_quantity'],
+                'available': row['available'],
+                'requested': quantity,
+                'sufficient': quantity is None or row['available'] >= quantity
+            })
+        
+        return Response({
+            'code': 200,
+            'msg': '查询成功',
+            'data': {
+                'warehouse': warehouse_id,
+                'all_sufficient': all(item['sufficient'] for item in items),
+                'items': items
+            }
+        })
+
     @action(detail=False, methods=['get'])
     def warning(self, request):
-        """库存预警列表"""
+        """
+        库存预警列表
+        直接读取预警表中的生效预警（按 status 索引），支持 warehouse/goods/category/warning_type 筛选
+        id 为库存记录ID（与改造前一致），alert_id 为预警记录ID
+        """
         try:
-            queryset = self.get_queryset()
-            
+            params = request.query_params
+            queryset = InventoryAlert.objects.filter(status='active')
+            if params.get('warehouse'):
+                queryset = queryset.filter(warehouse_id=params.get('warehouse'))
+            if params.get('goods'):
+                queryset = queryset.filter(goods_id=params.get('goods'))
+            if params.get('category'):
+                queryset = queryset.filter(goods__category_id=params.get('category'))
+            if params.get('warning_type') in StockWarningService.WARNING_STATUSES:
+                queryset = queryset.filter(alert_type=params.get('warning_type'))
+
+            inventory = Inventory.objects.filter(
+                goods_id=models.OuterRef('goods_id'),
+                warehouse_id=models.OuterRef('warehouse_id')
+            )
+            rows = queryset.annotate(
+                inventory_id=models.Subquery(inventory.values('id')[:1]),
+                current_quantity=models.Subquery(inventory.values('quantity')[:1])
+            ).order_by('-triggered_at', '-id').values(
+                'id', 'inventory_id', 'goods__name', 'goods__code', 'warehouse__name', 'current_quantity',
+                'goods__min_stock', 'goods__max_stock', 'alert_type', 'triggered_at'
+            )
+
             warning_items = []
-            for item in queryset:
-                quantity = item.quantity or 0
-                min_stock = item.goods.min_stock if item.goods else 0
-                max_stock = item.goods.max_stock if item.goods else 0
-                
-                if quantity <= 0:
-                    warning_items.append({
-                        'id': item.id,
-                        'goods_name': item.goods.name if item.goods else '',
-                        'goods_code': item.goods.code if item.goods else '',
-                        'warehouse_name': item.warehouse.name if item.warehouse else '',
-                        'quantity': quantity,
-                        'warning_type': 'out',
-                        'warning_text': '缺货'
-                    })
-                elif min_stock > 0 and quantity <= min_stock:
-                    warning_items.append({
-                        'id': item.id,
-                        'goods_name': item.goods.name if item.goods else '',
-                        'goods_code': item.goods.code if item.goods else '',
-                        'warehouse_name': item.warehouse.name if item.warehouse else '',
-                        'quantity': quantity,
-                        'min_stock': min_stock,
-                        'warning_type': 'low',
-                        'warning_text': f'库存不足(安全库存: {min_stock})'
-                    })
-                elif max_stock > 0 and quantity >= max_stock:
-                    warning_items.append({
-                        'id': item.id,
-                        'goods_name': item.goods.name if item.goods else '',
-                        'goods_code': item.goods.code if item.goods else '',
-                        'warehouse_name': item.warehouse.name if item.warehouse else '',
-                        'quantity': quantity,
-                        'max_stock': max_stock,
-                        'warning_type': 'over',
-                        'warning_text': f'库存过剩(上限: {max_stock})'
-                    })
+            for row in rows:
+                item = {
+                    'id': row['inventory_id'],
+                    'alert_id': row['id'],
+                    'goods_name': row['goods__name'],
+                    'goods_code': row['goods__code'],
+                    'warehouse_name': row['warehouse__name'],
+                    'quantity': row['current_quantity'] or 0,
+                    'warning_type': row['alert_type'],
+                    'triggered_at': row['triggered_at']
+                }
+                if row['alert_type'] == 'out':
+                    item['warning_text'] = '缺货'
+                elif row['alert_type'] == 'low':
+                    item['min_stock'] = row['goods__min_stock']
+                    item['warning_text'] = f'库存不足(安全库存: {row["goods__min_stock"]})'
+                else:
+                    item['max_stock'] = row['goods__max_stock']
+                    item['warning_text'] = f'库存过剩(上限: {row["goods__max_stock"]})'
+                warning_items.append(item)
             
             return Response({
                 'code': 200,
@@ -267,7 +337,12 @@ class InventoryViewSet(BaseModelViewSet):
 
 
 class InventoryLogViewSet(BaseModelViewSet):
-    """库存流水视图集"""
+    """库存流水视图集
+
+    超过在线保留期的流水由 archive_inventory_logs 命令迁入归档表。
+    带 start_date 的查询按日期范围自动路由：范围晚于最后一条归档流水只查在线表，
+    范围早于最早一条在线流水只查归档表，跨越两者时合并查询；不带 start_date 的日常查询只查在线表。
+    """
     permission_classes = [IsAuthenticated, ModulePermission]
     queryset = InventoryLog.objects.select_related(
         'goods', 'warehouse', 'created_by'
@@ -278,42 +353,162 @@ class InventoryLogViewSet(BaseModelViewSet):
     search_fields = ['goods__name', 'goods__code']
     ordering_fields = ['created_at', 'change_quantity']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
     module_name = '库存流水'
 
-    def get_queryset(self):
-        """支持日期范围筛选和交易类型筛选"""
-        queryset = super().get_queryset()
-        
+    def get_date_range(self):
+        """解析 start_date/end_date 为 [开始时间, 结束时间) 的时间区间"""
         params = self.request.query_params
-        
-        start_date = params.get('start_date')
-        if start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        
-        end_date = params.get('end_date')
-        if end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
+        date_range = []
+        for name, offset in (('start_date', 0), ('end_date', 1)):
+            value = params.get(name)
+            if not value:
+                date_range.append(None)
+                continue
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise DRFValidationError({name: '日期格式错误，应为 YYYY-MM-DD'})
+            date_range.append(day_start(parsed + timedelta(days=offset)))
+        return date_range
+
+    def get_storage(self):
+        """
+        根据日期范围选择流水存储
+        :return: hot 在线表 / archive 归档表 / both 合并查询
+        """
+        if hasattr(self, '_storage'):
+            return self._storage
+
+        start, end = self.get_date_range()
+        storage = 'hot'
+        if start is not None:
+            archived_until = InventoryLogArchive.objects.aggregate(last=Max('created_at'))['last']
+            if archived_until is not None and start <= archived_until:
+                hot_since = InventoryLog.objects.aggregate(first=Min('created_at'))['first']
+                if end is not None and (hot_since is None or end <= hot_since):
+                    storage = 'archive'
+                else:
+                    storage = 'both'
+
+        self._storage = storage
+        return storage
+
+    def filter_params(self, queryset):
+        """日期范围、关联单据类型、交易类型筛选（在线表与归档表通用）"""
+        params = self.request.query_params
+
+        start, end = self.get_date_range()
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lt=end)
         
         related_order_type = params.get('related_order_type')
         if related_order_type:
             queryset = queryset.filter(related_order_type=related_order_type)
         
-        # 交易类型筛选
+        # 交易类型筛选（业务类型列 + (movement_kind, created_at) 索引）
         transaction_type = params.get('transaction_type')
-        if transaction_type:
-            if transaction_type == 'purchase_in':
-                queryset = queryset.filter(remark__contains='采购入库')
-            elif transaction_type == 'sale_out':
-                queryset = queryset.filter(remark__contains='销售出库')
-            elif transaction_type == 'transfer_in':
-                queryset = queryset.filter(remark__contains='调拨入库')
-            elif transaction_type == 'transfer_out':
-                queryset = queryset.filter(remark__contains='调拨出库')
-            elif transaction_type == 'adjust':
-                queryset = queryset.filter(remark__contains='库存调整')
+        if transaction_type and transaction_type in dict(InventoryLog.MOVEMENT_KIND_CHOICES):
+            queryset = queryset.filter(movement_kind=transaction_type)
         
         return queryset
 
+    def get_queryset(self):
+        """支持日期范围筛选和交易类型筛选"""
+        if self.action in ('list', 'export') and self.get_storage() == 'archive':
+            queryset = InventoryLogArchive.objects.select_related(
+                'goods', 'warehouse', 'created_by'
+            ).order_by('-created_at')
+        else:
+            queryset = super().get_queryset()
+        return self.filter_params(queryset)
+
+    def list(self, request, *args, **kwargs):
+        """流水列表，按日期范围路由到在线表/归档表"""
+        try:
+            if self.get_storage() != 'both':
+                return super().list(request, *args, **kwargs)
+            return self.list_combined()
+        except DRFValidationError as e:
+            return Response({
+                'code': 400,
+                'msg': str(next(iter(e.detail.values()))),
+                'data': None
+            })
+
+    def list_combined(self):
+        """
+        跨在线表与归档表的合并查询
+        两表分别筛选后仅 UNION 排序键和ID做分页，再按当前页ID取回完整记录
+        """
+        hot = self.filter_queryset(self.get_queryset())
+        archive = self.filter_queryset(self.filter_params(
+            InventoryLogArchive.objects.select_related('goods', 'warehouse', 'created_by')
+        ))
+
+        if self.paginator.is_cursor_request(self.request):
+            hot = self.paginator.filter_position(hot, self.request)
+            archive = self.paginator.filter_position(archive, self.request)
+            ordering = ['-created_at']
+        else:
+            ordering = list(hot.query.order_by) or ['-created_at']
+        fields = ['id'] + [field.lstrip('-') for field in ordering if field.lstrip('-') != 'id']
+        id_order = '-id' if ordering[0].startswith('-') else 'id'
+        combined = hot.order_by().values(*fields).union(
+            archive.order_by().values(*fields), all=True
+        ).order_by(*ordering, id_order)
+
+        page = self.paginate_queryset(combined)
+        ids = [row['id'] for row in page]
+        rows = {}
+        for queryset in (hot, archive):
+            rows.update(queryset.order_by().in_bulk(ids))
+        serializer = self.get_serializer([rows[pk] for pk in ids if pk in rows], many=True)
+        return self.get_paginated_response(serializer.data)
+
+    EXPORT_HEADER = ['操作时间', '商品编码', '商品名称', '仓库', '变动类型', '业务类型', '变动数量',
+                     '变动前数量', '变动后数量', '单位成本', '备注', '操作人']
+    EXPORT_FIELDS = ('created_at', 'goods__code', 'goods__name', 'warehouse__name', 'change_type', 'movement_kind',
+                     'change_quantity', 'before_quantity', 'after_quantity', 'unit_cost', 'remark',
+                     'created_by__username')
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        流式导出流水（?export=csv|xlsx），筛选条件与列表相同，按日期范围路由到在线表/归档表
+        按主键倒序分批读取，跨两表时先导出在线表再导出归档表（归档流水均早于在线流水）
+        """
+        file_format = request.query_params.get('export', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'code': 400, 'msg': '不支持的导出格式，应为 csv 或 xlsx', 'data': None})
+        try:
+            storage = self.get_storage()
+            querysets = [self.filter_queryset(self.get_queryset())]
+        except DRFValidationError as e:
+            return Response({
+                'code': 400,
+                'msg': str(next(iter(e.detail.values()))),
+                'data': None
+            })
+        if storage == 'both':
+            querysets.append(self.filter_queryset(self.filter_params(InventoryLogArchive.objects.all())))
+
+        change_types = dict(InventoryLog.CHANGE_TYPE_CHOICES)
+        movement_kinds = dict(InventoryLog.MOVEMENT_KIND_CHOICES)
+        rows = (
+            (*row[:4], change_types.get(row[4], row[4]), movement_kinds.get(row[5], row[5]), *row[6:])
+            for queryset in querysets
+            for row in iter_values(queryset, self.EXPORT_FIELDS, descending=True)
+        )
+        return streaming_export(
+            self.EXPORT_HEADER, rows, f'inventory_logs_{timezone.localdate():%Y%m%d}', file_format,
+            sheet_name=self.module_name
+        )
+
 
 class StockInViewSet(BaseModelViewSet):
     permission_classes = [IsAuthenticated, ModulePermission]
@@ -327,6 +522,7 @@ class StockInViewSet(BaseModelViewSet):
     ordering_fields = ['created_at', 'total_amount']
     ordering = ['-created_at']
     module_name = '库存入库'
+    job_object_type = 'StockIn'
 
     def get_serializer_class(self):
         """根据动作选择序列化器"""
@@ -362,37 +558,28 @@ class StockInViewSet(BaseModelViewSet):
                 'data': None
             })
         
+        if JobService.active_job(f'StockIn:{stock_in.id}') is not None:
+            return Response({
+                'code': 400,
+                'msg': '该入库单正在后台确认中，请稍后查看结果',
+                'data': None
+            })
+        
+        if is_async_request(request):
+            job = JobService.enqueue(
+                'inventory.confirm_stock_in', {'stock_in_id': stock_in.id},
+                object_key=f'StockIn:{stock_in.id}', created_by=request.user
+            )
+            self.log_action(request, 'confirm', f'提交后台确认入库单: {stock_in.order_no}')
+            return Response({
+                'code': 200,
+                'msg': '已提交后台处理',
+                'data': {'job_id': job.id}
+            })
+        
         try:
             with transaction.atomic():
-                purchase_order = stock_in.purchase_order
-                
-                for item in purchase_order.items.all():
-                    received_qty = item.quantity - item.received_quantity
-                    if received_qty > 0:
-                        InventoryService.stock_in(
-                            goods=item.goods,
-                            warehouse=stock_in.warehouse,
-                            quantity=received_qty,
-                            related_order=stock_in,
-                            remark=f'采购入库 - {purchase_order.order_no}',
-                            created_by=request.user
-                        )
-                        item.received_quantity = item.quantity
-                        item.save()
-                
-                all_received = all(
-                    item.received_quantity >= item.quantity 
-                    for item in purchase_order.items.all()
-                )
-                
-                if all_received:
-                    purchase_order.status = 'completed'
-                else:
-                    purchase_order.status = 'partial'
-                purchase_order.save()
-                
-                stock_in.status = 'confirmed'
-                stock_in.save()
+                StockDocumentService.confirm_stock_in(stock_in, created_by=request.user)
                 
                 self.log_action(request, 'confirm', f'确认入库单: {stock_in.order_no}')
                 
@@ -430,7 +617,8 @@ class StockOutViewSet(BaseModelViewSet):
 
     def perform_create(self, serializer):
         """创建出库单时自动生成订单号"""
-        order_no = generate_order_no(prefix='SO')
+        from utils.order_no import generate_stock_out_no
+        order_no = generate_stock_out_no()
         serializer.save(
             order_no=order_no,
             created_by=self.request.user
@@ -458,8 +646,7 @@ class StockAdjustViewSet(BaseModelViewSet):
     def perform_create(self, serializer):
         from utils.order_no import generate_stock_adjust_no
         order_no = generate_stock_adjust_no()
-        adjust = serializer.save(order_no=order_no, created_by=self.request.user)
-        self._create_adjust_items(adjust)
+        serializer.save(order_no=order_no, created_by=self.request.user)
 
     @action(detail=False, methods=['get'], url_path='by-no/(?P<order_no>[^/.]+)')
     def by_no(self, request, order_no=None):
@@ -473,39 +660,48 @@ class StockAdjustViewSet(BaseModelViewSet):
             'data': serializer.data
         })
 
-    def _create_adjust_items(self, adjust):
-        items_data = self.request.data.get('items', [])
-        for item_data in items_data:
-            goods_id = item_data['goods']
-            adjust_qty = item_data['adjust_quantity']
-            
-            try:
-                goods = Goods.objects.get(id=goods_id)
-            except Goods.DoesNotExist:
-                raise ValueError(f'商品ID {goods_id} 不存在')
-            
-            try:
-                inv = Inventory.objects.get(goods_id=goods_id, warehouse=adjust.warehouse)
-                before_qty = inv.quantity
-            except Inventory.DoesNotExist:
-                before_qty = 0
-                inv = Inventory.objects.create(goods_id=goods_id, warehouse=adjust.warehouse, quantity=0)
-            
-            if adjust.adjust_type == 'increase':
-                after_qty = before_qty + adjust_qty
-            else:
-                after_qty = before_qty - adjust_qty
-                if after_qty < 0:
-                    raise ValueError(f'商品 {goods.name} 库存不足，当前库存 {before_qty}，无法减少 {adjust_qty}')
-            
-            StockAdjustItem.objects.create(
-                adjust=adjust,
-                goods_id=goods_id,
-                before_quantity=before_qty,
-                adjust_quantity=adjust_qty if adjust.adjust_type == 'increase' else -adjust_qty,
-                after_quantity=after_qty,
-                remark=item_data.get('remark', '')
+    @action(detail=False, methods=['post'])
+    def stocktake(self, request):
+        """
+        盘点导入：上传 CSV（列：商品编码,盘点数量[,备注]，可带表头），
+        与当前库存比对后生成盘点调整单（草稿），确认后生效
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'code': 400, 'msg': '请上传盘点文件', 'data': None})
+        
+        warehouse_id = request.data.get('warehouse')
+        warehouse = Warehouse.objects.filter(id=warehouse_id).first() if str(warehouse_id or '').isdigit() else None
+        if warehouse is None:
+            return Response({'code': 400, 'msg': '请选择有效的盘点仓库', 'data': None})
+        
+        try:
+            result = StocktakeImportService.import_csv(
+                upload, warehouse,
+                created_by=request.user,
+                remark=request.data.get('remark', ''),
+                encoding=request.data.get('encoding') or 'utf-8-sig'
             )
+        except (ValueError, LookupError) as e:
+            return Response({'code': 400, 'msg': str(e), 'data': None})
+        
+        adjusts = [adjust for adjust in (result['increase'], result['decrease']) if adjust is not None]
+        self.log_action(
+            request, 'create',
+            f'盘点导入: {warehouse.name}，共 {result["lines"]} 行，差异 {result["adjusted"]} 行'
+        )
+        return Response({
+            'code': 200,
+            'msg': '导入成功',
+            'data': {
+                'lines': result['lines'],
+                'adjusted': result['adjusted'],
+                'adjusts': [
+                    {'id': adjust.id, 'order_no': adjust.order_no, 'adjust_type': adjust.adjust_type}
+                    for adjust in adjusts
+                ]
+            }
+        })
 
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
@@ -517,31 +713,27 @@ class StockAdjustViewSet(BaseModelViewSet):
         
         try:
             with transaction.atomic():
-                for item in adjust.items.all():
-                    if item.adjust_quantity > 0:
-                        InventoryService.stock_in(
-                            goods=item.goods,
-                            warehouse=adjust.warehouse,
-                            quantity=item.adjust_quantity,
-                            related_order=adjust,
-                            remark=f'库存调整 - {adjust.order_no}',
-                            created_by=request.user
-                        )
-                    else:
-                        InventoryService.stock_out(
-                            goods=item.goods,
-                            warehouse=adjust.warehouse,
-                            quantity=abs(item.adjust_quantity),
-                            related_order=adjust,
-                            remark=f'库存调整 - {adjust.order_no}',
-                            created_by=request.user
-                        )
+                movements = [
+                    {
+                        'goods': item.goods,
+                        'warehouse': adjust.warehouse,
+                        'change_type': 'inbound' if item.adjust_quantity > 0 else 'outbound',
+                        'quantity': abs(item.adjust_quantity),
+                        'remark': f'库存调整 - {adjust.order_no}',
+                        'movement_kind': 'check' if adjust.reason == 'check' else 'adjust'
+                    }
+                    for item in adjust.items.select_related('goods')
+                ]
+                InventoryService.apply_movements(movements, related_order=adjust, created_by=request.user)
                 
                 adjust.status = 'confirmed'
                 adjust.confirmed_at = timezone.now()
                 adjust.save()
+                OutboxService.publish_status_change(adjust, 'stock_adjust.confirmed')
                 
                 return Response({'code': 200, 'msg': '确认成功', 'data': None})
+        except ValueError as e:
+            return Response({'code': 400, 'msg': str(e), 'data': None})
         except Exception as e:
             return Response({'code': 500, 'msg': str(e), 'data': None})
 
@@ -567,16 +759,7 @@ class StockTransferViewSet(BaseModelViewSet):
     def perform_create(self, serializer):
         from utils.order_no import generate_stock_transfer_no
         order_no = generate_stock_transfer_no()
-        transfer = serializer.save(order_no=order_no, created_by=self.request.user)
-        
-        items_data = serializer.validated_data.get('items', [])
-        for item_data in items_data:
-            StockTransferItem.objects.create(
-                transfer=transfer,
-                goods=item_data['goods'],
-                quantity=item_data['quantity'],
-                remark=item_data.get('remark', '')
-            )
+        serializer.save(order_no=order_no, created_by=self.request.user)
 
     @action(detail=False, methods=['get'], url_path='by-no/(?P<order_no>[^/.]+)')
     def by_no(self, request, order_no=None):
@@ -600,29 +783,38 @@ class StockTransferViewSet(BaseModelViewSet):
         
         try:
             with transaction.atomic():
-                for item in transfer.items.all():
-                    InventoryService.stock_out(
-                        goods=item.goods,
-                        warehouse=transfer.from_warehouse,
-                        quantity=item.quantity,
-                        related_order=transfer,
-                        remark=f'调拨出库 - {transfer.order_no}',
-                        created_by=request.user
-                    )
-                    
-                    InventoryService.stock_in(
-                        goods=item.goods,
-                        warehouse=transfer.to_warehouse,
-                        quantity=item.quantity,
-                        related_order=transfer,
-                        remark=f'调拨入库 - {transfer.order_no}',
-                        created_by=request.user
-                    )
+                items = list(transfer.items.select_related('goods'))
+                # 调入仓按调出仓的移动平均单位成本入账
+                source_costs = dict(Inventory.objects.filter(
+                    warehouse=transfer.from_warehouse,
+                    goods_id__in=[item.goods_id for item in items]
+                ).values_list('goods_id', 'unit_cost'))
+                movements = []
+                for item in items:
+                    movements.append({
+                        'goods': item.goods,
+                        'warehouse': transfer.from_warehouse,
+                        'change_type': 'outbound',
+                        'quantity': item.quantity,
+                        'remark': f'调拨出库 - {transfer.order_no}'
+                    })
+                    movements.append({
+                        'goods': item.goods,
+                        'warehouse': transfer.to_warehouse,
+                        'change_type': 'inbound',
+                        'quantity': item.quantity,
+                        'unit_cost': source_costs.get(item.goods_id),
+                        'remark': f'调拨入库 - {transfer.order_no}'
+                    })
+                InventoryService.apply_movements(movements, related_order=transfer, created_by=request.user)
                 
                 transfer.status = 'confirmed'
                 transfer.confirmed_at = timezone.now()
                 transfer.save()
+                OutboxService.publish_status_change(transfer, 'stock_transfer.confirmed')
                 
                 return Response({'code': 200, 'msg': '确认成功', 'data': None})
+        except ValueError as e:
+            return Response({'code': 400, 'msg': str(e), 'data': None})
         except Exception as e:
             return Response({'code': 500, 'msg': str(e), 'data': None})
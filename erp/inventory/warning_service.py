@@ -0,0 +1,143 @@
+"""
+库存预警服务模块
+预警集合用一条关联商品阈值的 SQL 计算；InventoryAlert 表只在库存状态跨越阈值时增量维护，
+查询生效预警时直接走 (status, alert_type) 索引
+"""
+from django.db import transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils import timezone
+
+
+class StockWarningService:
+    """库存预警服务"""
+
+    WARNING_STATUSES = ('out', 'low', 'over')
+
+    @staticmethod
+    def live_status_expression():
+        """按库存数量关联商品最低/最高库存实时计算库存状态的 SQL 表达式（用于 Inventory 查询集）"""
+        return Case(
+            When(quantity__lte=0, then=Value('out')),
+            When(goods__min_stock__gt=0, quantity__lte=F('goods__min_stock'), then=Value('low')),
+            When(goods__max_stock__gt=0, quantity__gte=F('goods__max_stock'), then=Value('over')),
+            default=Value('normal'),
+            output_field=CharField(max_length=10)
+        )
+
+    @staticmethod
+    def threshold_of(alert_type, min_stock, max_stock):
+        """预警类型对应的触发阈值"""
+        if alert_type == 'low':
+            return min_stock or 0
+        if alert_type == 'over':
+            return max_stock or 0
+        return 0
+
+    @staticmethod
+    def compute_warning_set(warehouse_id=None):
+        """
+        一条 SQL 计算当前预警集合（不依赖冗余的 stock_status 字段）
+        :param warehouse_id: 仓库ID，为空则计算全部仓库
+        :return: {(goods_id, warehouse_id): {'alert_type', 'quantity', 'threshold'}}
+        """
+        from inventory.models import Inventory
+
+        queryset = Inventory.objects.all()
+        if warehouse_id:
+            queryset = queryset.filter(warehouse_id=warehouse_id)
+
+        rows = queryset.annotate(
+            live_status=StockWarningService.live_status_expression()
+        ).filter(
+            live_status__in=StockWarningService.WARNING_STATUSES
+        ).values_list('goods_id', 'warehouse_id', 'live_status', 'quantity', 'goods__min_stock', 'goods__max_stock')
+
+        return {
+            (goods_id, wh_id): {
+                'alert_type': live_status,
+                'quantity': quantity,
+                'threshold': StockWarningService.threshold_of(live_status, min_stock, max_stock)
+            }
+            for goods_id, wh_id, live_status, quantity, min_stock, max_stock in rows
+        }
+
+    @staticmethod
+    def apply_status_changes(changes):
+        """
+        根据库存状态变化增量维护预警表：原预警解除，新状态为预警状态时生成新预警
+        :param changes: InventoryService.refresh_stock_status 返回的状态变化列表
+        """
+        from inventory.models import InventoryAlert
+
+        if not changes:
+            return
+
+        now = timezone.now()
+        resolved = Q()
+        for change in changes:
+            if change['old_status'] in StockWarningService.WARNING_STATUSES:
+                resolved |= Q(goods_id=change['goods_id'], warehouse_id=change['warehouse_id'])
+        if resolved:
+            InventoryAlert.objects.filter(resolved, status='active').update(status='resolved', resolved_at=now)
+
+        InventoryAlert.objects.bulk_create([
+            InventoryAlert(
+                goods_id=change['goods_id'],
+                warehouse_id=change['warehouse_id'],
+                alert_type=change['new_status'],
+                quantity=change['quantity'],
+                threshold=StockWarningService.threshold_of(
+                    change['new_status'], change['min_stock'], change['max_stock']
+                ),
+                triggered_at=now
+            )
+            for change in changes
+            if change['new_status'] in StockWarningService.WARNING_STATUSES
+        ])
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(dry_run=False):
+        """
+        按实时计算的预警集合校正预警表（用于历史数据修复）
+        :return: {'opened': 新生成预警数, 'resolved': 解除预警数, 'active': 校正后生效预警数}
+        """
+        from inventory.models import InventoryAlert
+
+        expected = StockWarningService.compute_warning_set()
+        active = {
+            (goods_id, warehouse_id): (alert_id, alert_type)
+            for alert_id, goods_id, warehouse_id, alert_type in InventoryAlert.objects.filter(
+                status='active'
+            ).values_list('id', 'goods_id', 'warehouse_id', 'alert_type')
+        }
+
+        stale_ids = [
+            alert_id for key, (alert_id, alert_type) in active.items()
+            if key not in expected or expected[key]['alert_type'] != alert_type
+        ]
+        missing = [
+            (key, warning) for key, warning in expected.items()
+            if key not in active or active[key][1] != warning['alert_type']
+        ]
+
+        if not dry_run:
+            now = timezone.now()
+            InventoryAlert.objects.filter(id__in=stale_ids).update(status='resolved', resolved_at=now)
+            InventoryAlert.objects.bulk_create([
+                InventoryAlert(
+                    goods_id=key[0],
+                    warehouse_id=key[1],
+                    alert_type=warning['alert_type'],
+                    quantity=warning['quantity'],
+                    threshold=warning['threshold'],
+                    triggered_at=now
+                )
+                for key, warning in missing
+            ], batch_size=1000)
+
+        return {
+            'opened': len(missing),
+            'resolved': len(stale_ids),
+            'active': len(expected)
+        }
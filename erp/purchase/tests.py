@@ -2,6 +2,7 @@
 采购订单模块测试
 """
 from django.test import TestCase
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -384,3 +385,50 @@ class PurchaseOrderSerializerTest(TestCase):
         
         serializer = PurchaseOrderCreateSerializer(data=data)
         self.assertFalse(serializer.is_valid())
+
+
+class OrderNoAllocatorTest(TestCase):
+    """单号分配测试"""
+
+    def setUp(self):
+        """测试数据准备"""
+        from utils import order_no
+
+        order_no._blocks.clear()
+        self.supplier = Supplier.objects.create(code='SUP001', name='测试供应商')
+        self.warehouse = Warehouse.objects.create(name='测试仓库')
+        self.today = timezone.localdate().strftime('%Y%m%d')
+
+    def test_seed_from_existing_orders(self):
+        """测试首次分配从当日已有单号之后开始，号段内连续分配"""
+        from purchase.models import PurchaseOrder
+        from utils.order_no import generate_purchase_order_no
+
+        PurchaseOrder.objects.create(
+            order_no=f'PO{self.today}0007', supplier=self.supplier, warehouse=self.warehouse, order_date=timezone.localdate()
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            first = generate_purchase_order_no()
+        second = generate_purchase_order_no()
+
+        self.assertEqual(first, f'PO{self.today}0008')
+        self.assertEqual(second, f'PO{self.today}0009')
+
+    def test_rolled_back_lease_not_reused(self):
+        """测试租用号段的事务回滚后号段不进入内存池，序号随事务回滚，不会分配出重复单号"""
+        from django.db import transaction
+        from utils.order_no import generate_stock_adjust_no
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    rolled_back = generate_stock_adjust_no()
+                    raise RuntimeError
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            numbers = [generate_stock_adjust_no() for _ in range(30)]
+
+        self.assertEqual(rolled_back, f'SA{self.today}0001')
+        self.assertEqual(numbers[0], f'SA{self.today}0001')
+        self.assertEqual(len(set(numbers)), 30)
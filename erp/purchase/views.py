@@ -1,6 +1,7 @@
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from .models import PurchaseOrder, PurchaseItem
 from .serializers import (
@@ -9,6 +10,7 @@ from .serializers import (
 )
 from utils.views import BaseModelViewSet
 from system.permissions import ModulePermission
+from reports.services import RollupService
 
 
 class PurchaseOrderViewSet(BaseModelViewSet):
@@ -32,6 +34,22 @@ class PurchaseOrderViewSet(BaseModelViewSet):
     def perform_create(self, serializer):
         """创建时设置创建人"""
         serializer.save(created_by=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """修改已完成的采购单时，先移出日汇总，保存后按新的表头重新计入"""
+        was_completed = serializer.instance.status == 'completed'
+        if was_completed:
+            RollupService.apply_order(serializer.instance, sign=-1)
+        purchase_order = serializer.save()
+        RollupService.sync_order(purchase_order, was_completed=False)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """删除已完成的采购单时移出日汇总"""
+        if instance.status == 'completed':
+            RollupService.apply_order(instance, sign=-1)
+        instance.delete()
     
     @action(detail=False, methods=['get'], url_path='by-no/(?P<order_no>[^/.]+)')
     def by_no(self, request, order_no=None):
@@ -0,0 +1,323 @@
+"""
+数据分析服务模块
+按白名单维度与指标把分析请求编译为一条 GROUP BY 查询：
+数据源为已完成销售/采购明细、库存流水（在线表与归档表合并）、收付款；维度为日期桶（日/周/月）、仓库、分类、客户、供应商、商品等；
+指标为金额合计、数量合计、计数。结果按规范化后的查询缓存在共享缓存中（发件箱分发进程负责失效），
+返回行数有上限，并报告查询耗时。
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from utils.cache import bump_cache_version, cache_version, shared_cache
+from utils.dates import day_start
+
+logger = logging.getLogger(__name__)
+
+
+def _movement_amount():
+    """库存流水金额：带符号数量 × 单位成本（未记录成本的流水按 0 计）"""
+    from inventory.models import InventoryLogBase
+
+    return Sum(
+        InventoryLogBase.signed_quantity() * Coalesce('unit_cost', Decimal('0')),
+        output_field=models.DecimalField(max_digits=20, decimal_places=4)
+    )
+
+
+def _movement_quantity():
+    from inventory.models import InventoryLogBase
+
+    return Sum(InventoryLogBase.signed_quantity())
+
+
+class AnalyticsService:
+    """数据分析服务"""
+
+    CACHE_KEY = 'reports:analytics'
+    VERSION_KEY = 'reports:analytics:version'
+
+    BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+    # 数据源：模型、日期字段（是否为日期时间）、固定筛选、维度 {名称: (字段, 附加筛选)}、指标 {名称: 聚合表达式工厂}；
+    # archive_model 为字段相同的归档表，两表分别分组后合并（归档数据源的指标必须可加：合计、按行计数）
+    SOURCES = {
+        'sale': {
+            'model': 'sale.SaleItem',
+            'date_field': 'order__order_date',
+            'is_datetime': False,
+            'filter': Q(order__status='completed'),
+            'dimensions': {
+                'warehouse': ('order__warehouse__name', None),
+                'category': ('goods__category__name', None),
+                'customer': ('order__customer__name', None),
+                'goods': ('goods__name', None),
+            },
+            'measures': {
+                'amount': lambda: Sum('amount'),
+                'quantity': lambda: Sum('quantity'),
+                'count': lambda: Count('order_id', distinct=True),
+            },
+        },
+        'purchase': {
+            'model': 'purchase.PurchaseItem',
+            'date_field': 'order__order_date',
+            'is_datetime': False,
+            'filter': Q(order__status='completed'),
+            'dimensions': {
+                'warehouse': ('order__warehouse__name', None),
+                'category': ('goods__category__name', None),
+                'supplier': ('order__supplier__name', None),
+                'goods': ('goods__name', None),
+            },
+            'measures': {
+                'amount': lambda: Sum('amount'),
+                'quantity': lambda: Sum('quantity'),
+                'count': lambda: Count('order_id', distinct=True),
+            },
+        },
+        'movement': {
+            'model': 'inventory.InventoryLog',
+            'archive_model': 'inventory.InventoryLogArchive',
+            'date_field': 'created_at',
+            'is_datetime': True,
+            'filter': Q(),
+            'dimensions': {
+                'warehouse': ('warehouse__name', None),
+                'category': ('goods__category__name', None),
+                'goods': ('goods__name', None),
+                'movement_kind': ('movement_kind', None),
+            },
+            'measures': {
+                'amount': _movement_amount,
+                'quantity': _movement_quantity,
+                'count': lambda: Count('id'),
+            },
+        },
+        'payment': {
+            'model': 'finance.Payment',
+            'date_field': 'created_at',
+            'is_datetime': True,
+            'filter': Q(),
+            'dimensions': {
+                'customer': ('related_party_name', Q(related_party_type='customer')),
+                'supplier': ('related_party_name', Q(related_party_type='supplier')),
+                'payment_type': ('type', None),
+            },
+            'measures': {
+                'amount': lambda: Sum('total_amount'),
+                'paid_amount': lambda: Sum('paid_amount'),
+                'count': lambda: Count('id'),
+            },
+        },
+    }
+
+    @staticmethod
+    def normalize(params):
+        """
+        校验并规范化分析请求
+        :param params: {'source', 'dimensions', 'measures', 'start_date', 'end_date', 'limit'}，
+                       维度、指标为逗号分隔字符串或列表
+        :return: 规范化后的查询（可作为缓存键）
+        :raises ValueError: 数据源、维度、指标、日期或行数不合法
+        """
+        def split(value):
+            if isinstance(value, str):
+                value = value.split(',')
+            result = []
+            for item in value or []:
+                item = item.strip()
+                if item and item not in result:
+                    result.append(item)
+            return result
+
+        source_name = params.get('source')
+        source = AnalyticsService.SOURCES.get(source_name)
+        if source is None:
+            raise ValueError(f'不支持的数据源，可选：{"、".join(AnalyticsService.SOURCES)}')
+
+        dimensions = split(params.get('dimensions'))
+        allowed = [*AnalyticsService.BUCKETS, *source['dimensions']]
+        invalid = [name for name in dimensions if name not in allowed]
+        if invalid:
+            raise ValueError(f'不支持的维度：{"、".join(invalid)}，可选：{"、".join(allowed)}')
+        if len([name for name in dimensions if name in AnalyticsService.BUCKETS]) > 1:
+            raise ValueError('日期维度（day/week/month）只能选择一个')
+
+        measures = split(params.get('measures')) or ['amount']
+        invalid = [name for name in measures if name not in source['measures']]
+        if invalid:
+            raise ValueError(f'不支持的指标：{"、".join(invalid)}，可选：{"、".join(source["measures"])}')
+
+        dates = {}
+        for name in ('start_date', 'end_date'):
+            value = params.get(name)
+            try:
+                parsed = parse_date(value) if value else None
+            except ValueError:
+                parsed = None
+            if value and parsed is None:
+                raise ValueError(f'{name} 日期格式错误，应为 YYYY-MM-DD')
+            dates[name] = parsed.isoformat() if parsed else None
+
+        max_rows = settings.ANALYTICS_MAX_ROWS
+        try:
+            limit = int(params.get('limit') or max_rows)
+        except (TypeError, ValueError):
+            raise ValueError('limit 必须为整数')
+        if limit < 1:
+            raise ValueError('limit 必须大于 0')
+
+        return {
+            'source': source_name,
+            'dimensions': dimensions,
+            'measures': measures,
+            'start_date': dates['start_date'],
+            'end_date': dates['end_date'],
+            'limit': min(limit, max_rows),
+        }
+
+    @staticmethod
+    def build_queryset(query, model_label=None):
+        """
+        把规范化查询编译为一条分组聚合查询集（无维度时只用于 aggregate 的筛选部分）
+        :param model_label: 查询的模型，默认为数据源的主模型（可传入归档模型）
+        """
+        source = AnalyticsService.SOURCES[query['source']]
+        queryset = apps.get_model(model_label or source['model']).objects.filter(source['filter'])
+
+        # 日期区间直接比较列值（不对列套函数），日期时间字段按本地时区的 [开始日零点, 结束日次日零点)
+        date_field = source['date_field']
+        for name, lookup, offset in (('start_date', 'gte', 0), ('end_date', 'lt', 1)):
+            value = query[name]
+            if not value:
+                continue
+            value = parse_date(value)
+            if source['is_datetime']:
+                value = day_start(value + timedelta(days=offset))
+            elif lookup == 'lt':
+                lookup = 'lte'
+            queryset = queryset.filter(**{f'{date_field}__{lookup}': value})
+
+        group = {}
+        for name in query['dimensions']:
+            if name in AnalyticsService.BUCKETS:
+                output_field = models.DateTimeField() if source['is_datetime'] else models.DateField()
+                group[f'd_{name}'] = AnalyticsService.BUCKETS[name](date_field, output_field=output_field)
+            else:
+                field, condition = source['dimensions'][name]
+                if condition is not None:
+                    queryset = queryset.filter(condition)
+                group[f'd_{name}'] = F(field)
+
+        if not group:
+            return queryset.order_by()
+        # 维度、指标使用带前缀的别名，避免与模型字段同名冲突
+        aggregates = {f'm_{name}': source['measures'][name]() for name in query['measures']}
+        return queryset.values(**group).annotate(**aggregates).order_by(*group)
+
+    @staticmethod
+    def run(query):
+        """
+        执行规范化查询（不读缓存）
+        :return: {'columns', 'rows', 'row_count', 'truncated', 'query_ms'}
+        """
+        source = AnalyticsService.SOURCES[query['source']]
+        columns = [*query['dimensions'], *query['measures']]
+        aliases = [*(f'd_{name}' for name in query['dimensions']), *(f'm_{name}' for name in query['measures'])]
+        labels = [source['model'], *([source['archive_model']] if 'archive_model' in source else [])]
+        start = time.perf_counter()
+        if query['dimensions']:
+            # 各表分别取 limit + 1 行：两表按相同维度排序，合并后的前 limit + 1 组在各表中都不会被截掉
+            results = [list(AnalyticsService.build_queryset(query, label)[:query['limit'] + 1]) for label in labels]
+            rows = results[0] if len(results) == 1 else AnalyticsService._merge(query, results)
+        else:
+            results = [
+                [AnalyticsService.build_queryset(query, label).aggregate(
+                    **{f'm_{name}': source['measures'][name]() for name in query['measures']}
+                )]
+                for label in labels
+            ]
+            rows = AnalyticsService._merge(query, results)
+        query_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        truncated = len(rows) > query['limit']
+        rows = rows[:query['limit']]
+        logger.info(f'数据分析查询: {query} {len(rows)} 行，耗时 {query_ms} 毫秒')
+        return {
+            'columns': columns,
+            'rows': [
+                {column: AnalyticsService._serialize(row[alias]) for column, alias in zip(columns, aliases)}
+                for row in rows
+            ],
+            'row_count': len(rows),
+            'truncated': truncated,
+            'query_ms': query_ms,
+        }
+
+    @staticmethod
+    def _merge(query, results):
+        """合并多张表的分组结果：维度相同的行指标相加，按维度重新排序（空值在前，与数据库升序一致）"""
+        dimensions = [f'd_{name}' for name in query['dimensions']]
+        measures = [f'm_{name}' for name in query['measures']]
+        merged = {}
+        for rows in results:
+            for row in rows:
+                key = tuple(row[alias] for alias in dimensions)
+                if key not in merged:
+                    merged[key] = dict(row)
+                    continue
+                target = merged[key]
+                for alias in measures:
+                    if row[alias] is not None:
+                        target[alias] = row[alias] if target[alias] is None else target[alias] + row[alias]
+        return [merged[key] for key in sorted(merged, key=lambda key: [(value is not None, value) for value in key])]
+
+    @staticmethod
+    def _serialize(value):
+        if isinstance(value, Decimal):
+            return float(value)
+        if hasattr(value, 'isoformat'):
+            if isinstance(value, datetime) and timezone.is_aware(value):
+                value = timezone.localtime(value).date()
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _cache_key(query):
+        """按规范化查询生成缓存键，带失效版本号"""
+        version = cache_version(AnalyticsService.VERSION_KEY)
+        digest = hashlib.md5(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+        return f'{AnalyticsService.CACHE_KEY}:{version}:{digest}'
+
+    @staticmethod
+    def query(params):
+        """
+        执行分析请求（结果缓存 ANALYTICS_CACHE_TIMEOUT 秒，业务事件分发时提前失效）
+        :return: 查询结果，附带规范化查询与是否命中缓存
+        :raises ValueError: 请求参数不合法
+        """
+        query = AnalyticsService.normalize(params)
+        key = AnalyticsService._cache_key(query)
+        result = shared_cache().get(key)
+        cached = result is not None
+        if not cached:
+            result = AnalyticsService.run(query)
+            shared_cache().set(key, result, settings.ANALYTICS_CACHE_TIMEOUT)
+        return {'query': query, 'cached': cached, **result}
+
+    @staticmethod
+    def invalidate():
+        """事务提交后使分析结果缓存失效"""
+        transaction.on_commit(lambda: bump_cache_version(AnalyticsService.VERSION_KEY))
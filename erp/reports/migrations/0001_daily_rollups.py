@@ -0,0 +1,101 @@
+# Generated by Django 4.2 on 2026-10-18 12:51
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    """按已完成单据回填采购/销售日汇总（整单汇总行 + 商品行）"""
+    sides = (
+        ('purchase', 'PurchaseOrder', 'PurchaseItem', 'PurchaseDailyRollup', 'supplier_id'),
+        ('sale', 'SaleOrder', 'SaleItem', 'SaleDailyRollup', 'customer_id'),
+    )
+    for app_label, order_name, item_name, rollup_name, party_id in sides:
+        Order = apps.get_model(app_label, order_name)
+        Item = apps.get_model(app_label, item_name)
+        Rollup = apps.get_model('reports', rollup_name)
+
+        items = Item.objects.filter(order__status='completed')
+        order_key = ('order__order_date', 'order__warehouse_id', f'order__{party_id}')
+        header_quantity = {
+            tuple(row[field] for field in order_key): row['quantity']
+            for row in items.values(*order_key).annotate(quantity=Sum('quantity')).order_by()
+        }
+        rows = [
+            Rollup(
+                date=row['order_date'], warehouse_id=row['warehouse_id'], goods_id=None,
+                quantity=header_quantity.get((row['order_date'], row['warehouse_id'], row[party_id]), 0),
+                amount=row['amount'] or 0, order_count=row['order_count'], **{party_id: row[party_id]}
+            )
+            for row in Order.objects.filter(status='completed').values(
+                'order_date', 'warehouse_id', party_id
+            ).annotate(amount=Sum('total_amount'), order_count=Count('id')).order_by()
+        ]
+        rows.extend(
+            Rollup(
+                date=row['order__order_date'], warehouse_id=row['order__warehouse_id'], goods_id=row['goods_id'],
+                quantity=row['quantity'] or 0, amount=row['amount'] or 0, order_count=row['order_count'],
+                **{party_id: row[f'order__{party_id}']}
+            )
+            for row in items.values(*order_key, 'goods_id').annotate(
+                quantity=Sum('quantity'), amount=Sum('amount'), order_count=Count('order_id', distinct=True)
+            ).order_by()
+        )
+        Rollup.objects.bulk_create(rows, batch_size=1000)
+        print(f'{rollup_name} 回填完成，共写入 {len(rows)} 条汇总')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('basic', '0013_goods_stock_totals'),
+        ('purchase', '0003_add_unique_constraint'),
+        ('sale', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='数量')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='金额')),
+                ('order_count', models.IntegerField(default=0, verbose_name='订单数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='basic.customer', verbose_name='客户')),
+                ('goods', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='basic.goods', verbose_name='商品')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': '销售日汇总',
+                'verbose_name_plural': '销售日汇总',
+                'db_table': 'rpt_sale_daily',
+                'unique_together': {('date', 'warehouse', 'customer', 'goods')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PurchaseDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='数量')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='金额')),
+                ('order_count', models.IntegerField(default=0, verbose_name='订单数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('goods', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='basic.goods', verbose_name='商品')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='basic.supplier', verbose_name='供应商')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='basic.warehouse', verbose_name='仓库')),
+            ],
+            options={
+                'verbose_name': '采购日汇总',
+                'verbose_name_plural': '采购日汇总',
+                'db_table': 'rpt_purchase_daily',
+                'unique_together': {('date', 'warehouse', 'supplier', 'goods')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
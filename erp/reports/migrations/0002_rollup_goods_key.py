@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def fill_goods_key(apps, schema_editor):
+    """商品行回填商品键；合并可空 goods 唯一约束未拦住的重复整单汇总行"""
+    for rollup_name, party_id in (('PurchaseDailyRollup', 'supplier_id'), ('SaleDailyRollup', 'customer_id')):
+        Rollup = apps.get_model('reports', rollup_name)
+        Rollup.objects.filter(goods__isnull=False).update(goods_key=F('goods_id'))
+
+        duplicates = Rollup.objects.filter(goods__isnull=True).values(
+            'date', 'warehouse_id', party_id
+        ).annotate(rows=Count('id')).filter(rows__gt=1).order_by()
+        for group in duplicates:
+            rows = list(Rollup.objects.filter(
+                goods__isnull=True, date=group['date'], warehouse_id=group['warehouse_id'],
+                **{party_id: group[party_id]}
+            ).order_by('id'))
+            kept = rows[0]
+            for row in rows[1:]:
+                kept.quantity += row.quantity
+                kept.amount += row.amount
+                kept.order_count += row.order_count
+            kept.save(update_fields=['quantity', 'amount', 'order_count'])
+            Rollup.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basic', '0013_goods_stock_totals'),
+        ('reports', '0001_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='purchasedailyrollup',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='saledailyrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='purchasedailyrollup',
+            name='goods_key',
+            field=models.BigIntegerField(default=0, verbose_name='商品键'),
+        ),
+        migrations.AddField(
+            model_name='saledailyrollup',
+            name='goods_key',
+            field=models.BigIntegerField(default=0, verbose_name='商品键'),
+        ),
+        migrations.RunPython(fill_goods_key, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='purchasedailyrollup',
+            unique_together={('date', 'warehouse', 'supplier', 'goods_key')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='saledailyrollup',
+            unique_together={('date', 'warehouse', 'customer', 'goods_key')},
+        ),
+    ]
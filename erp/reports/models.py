@@ -0,0 +1,46 @@
+from django.db import models
+from basic.models import Customer, Goods, Supplier, Warehouse
+
+
+class DailyRollupBase(models.Model):
+    """
+    已完成单据按 日期 × 仓库 × 往来单位 × 商品 的日汇总
+    商品为空的行为整单汇总：金额为单据总金额，订单数为单据数；
+    商品行的订单数为包含该商品的单据数。单据完成时累加，撤销时扣减，可按日期区间重建。
+    唯一约束建在非空的 goods_key 上（商品行为商品ID，整单汇总行为0）：可空的 goods 列上 NULL 互不相等，
+    唯一约束拦不住重复的整单汇总行。
+    """
+    date = models.DateField(verbose_name='日期')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='+', verbose_name='仓库')
+    goods = models.ForeignKey(Goods, on_delete=models.CASCADE, null=True, blank=True, related_name='+',
+                              verbose_name='商品')
+    goods_key = models.BigIntegerField(default=0, verbose_name='商品键')
+    quantity = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='数量')
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='金额')
+    order_count = models.IntegerField(default=0, verbose_name='订单数')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        abstract = True
+
+
+class PurchaseDailyRollup(DailyRollupBase):
+    """采购日汇总"""
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='+', verbose_name='供应商')
+
+    class Meta:
+        db_table = 'rpt_purchase_daily'
+        verbose_name = '采购日汇总'
+        verbose_name_plural = verbose_name
+        unique_together = ['date', 'warehouse', 'supplier', 'goods_key']
+
+
+class SaleDailyRollup(DailyRollupBase):
+    """销售日汇总"""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+', verbose_name='客户')
+
+    class Meta:
+        db_table = 'rpt_sale_daily'
+        verbose_name = '销售日汇总'
+        verbose_name_plural = verbose_name
+        unique_together = ['date', 'warehouse', 'customer', 'goods_key']
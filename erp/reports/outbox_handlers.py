@@ -0,0 +1,20 @@
+"""
+报表模块发件箱事件处理
+单据状态变更和库存变动都会影响仪表盘和数据分析结果，收到任意业务事件时使其缓存失效
+"""
+from system.services import OutboxService
+
+from .analytics_service import AnalyticsService
+from .services import DashboardService
+
+
+@OutboxService.register('*')
+def invalidate_dashboard(event):
+    """业务事件分发时使仪表盘缓存失效（幂等）"""
+    DashboardService.invalidate()
+
+
+@OutboxService.register('*')
+def invalidate_analytics(event):
+    """业务事件分发时使数据分析结果缓存失效（幂等）"""
+    AnalyticsService.invalidate()
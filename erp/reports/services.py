@@ -0,0 +1,388 @@
+"""
+报表服务模块
+- RollupService：采购/销售日汇总表。单据完成时在同一事务内累加，撤销（删除、修改已完成单据）时扣减，
+  rebuild_report_rollups 命令可按日期区间重建。采购、销售报表和仪表盘从汇总表读取，
+  查询耗时与单据历史量无关。
+- FinanceReportService：收付款汇总（按日期时间区间筛选，一次条件聚合）与应收/应付账龄
+  （按往来单位一次分组查询，未收付金额按账龄区间条件求和）。
+- DashboardService：仪表盘数据全部在数据库端分组聚合：近7日采购/销售金额各一次按日期分组查询日汇总表，
+  分类库存金额一次按分类分组查询。整份数据按日期缓存，有效期较短，
+  业务事件（发件箱）分发时在共享缓存中递增版本号使缓存提前失效（分发命令与 Web 进程不是同一进程）。
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from utils.cache import bump_cache_version, cache_version, shared_cache
+from utils.dates import day_start
+
+
+class RollupService:
+    """采购/销售日汇总服务"""
+
+    # {汇总类别: (单据模型, 明细模型, 汇总模型, 往来单位字段)}
+    SIDES = {
+        'purchase': ('purchase.PurchaseOrder', 'purchase.PurchaseItem', 'reports.PurchaseDailyRollup', 'supplier'),
+        'sale': ('sale.SaleOrder', 'sale.SaleItem', 'reports.SaleDailyRollup', 'customer'),
+    }
+    VALUE_FIELDS = ('quantity', 'amount', 'order_count')
+
+    @staticmethod
+    def side_models(side):
+        """汇总类别对应的 (单据模型, 明细模型, 汇总模型, 往来单位字段)"""
+        order_label, item_label, rollup_label, party = RollupService.SIDES[side]
+        return apps.get_model(order_label), apps.get_model(item_label), apps.get_model(rollup_label), party
+
+    @staticmethod
+    def side_of(order):
+        """单据对应的汇总类别"""
+        for side, (order_label, _, _, _) in RollupService.SIDES.items():
+            if order._meta.label == order_label:
+                return side
+        raise ValueError(f'不支持的单据类型: {order._meta.label}')
+
+    @staticmethod
+    def order_facts(order):
+        """
+        单据的汇总增量：{商品ID: [数量, 金额, 订单数]}，键 None 为整单汇总
+        """
+        lines = order.items.values('goods_id').annotate(
+            quantity=Sum('quantity'), amount=Sum('amount')
+        ).order_by('goods_id')
+        facts = {row['goods_id']: [row['quantity'], row['amount'], 1] for row in lines}
+        facts[None] = [sum((fact[0] for fact in facts.values()), Decimal('0')), order.total_amount, 1]
+        return facts
+
+    @staticmethod
+    def apply_order(order, sign=1):
+        """
+        将单据计入（sign=1）或移出（sign=-1）日汇总，应在业务事务内调用
+        已有汇总行加锁后批量更新，缺失的行批量创建；并发创建同一行冲突时逐行原子累加
+        """
+        _, _, rollup_model, party = RollupService.side_models(RollupService.side_of(order))
+        facts = RollupService.order_facts(order)
+        key = {'date': order.order_date, 'warehouse_id': order.warehouse_id, f'{party}_id': getattr(order, f'{party}_id')}
+        now = timezone.now()
+
+        existing = {}
+        goods_ids = [goods_id for goods_id in facts if goods_id is not None]
+        for row in rollup_model.objects.select_for_update().filter(
+            goods_key__in=[0, *goods_ids], **key
+        ).order_by('id'):
+            existing.setdefault(row.goods_id, row)
+
+        updated = []
+        created = []
+        for goods_id, values in facts.items():
+            row = existing.get(goods_id)
+            if row is None:
+                row = rollup_model(goods_id=goods_id, goods_key=goods_id or 0, **key)
+                created.append(row)
+            else:
+                updated.append(row)
+            for field, value in zip(RollupService.VALUE_FIELDS, values):
+                setattr(row, field, getattr(row, field) + sign * value)
+            row.updated_at = now
+
+        rollup_model.objects.bulk_update(updated, [*RollupService.VALUE_FIELDS, 'updated_at'], batch_size=500)
+        try:
+            with transaction.atomic():
+                rollup_model.objects.bulk_create(created, batch_size=500)
+        except IntegrityError:
+            for row in created:
+                RollupService._increment(rollup_model, key, row)
+
+    @staticmethod
+    def _increment(rollup_model, key, row):
+        """逐行原子累加，行不存在时创建"""
+        values = {field: getattr(row, field) for field in RollupService.VALUE_FIELDS}
+        queryset = rollup_model.objects.filter(goods_key=row.goods_key, **key)
+        if not queryset.update(updated_at=row.updated_at, **{field: F(field) + value for field, value in values.items()}):
+            rollup_model.objects.create(goods_id=row.goods_id, goods_key=row.goods_key, **key, **values)
+
+    @staticmethod
+    def sync_order(order, was_completed):
+        """
+        单据状态或表头变更后同步日汇总（在业务事务内调用）
+        :param was_completed: 变更前单据是否已计入汇总（已完成状态）
+        """
+        is_completed = order.status == 'completed'
+        if is_completed and not was_completed:
+            RollupService.apply_order(order)
+        elif was_completed and not is_completed:
+            RollupService.apply_order(order, sign=-1)
+
+    @staticmethod
+    def rebuild(side, start_date=None, end_date=None, batch_size=1000):
+        """
+        按日期区间重建日汇总：删除区间内汇总行，再从已完成单据分组聚合写入
+        :return: 写入的汇总行数
+        """
+        order_model, item_model, rollup_model, party = RollupService.side_models(side)
+
+        date_range = {}
+        if start_date:
+            date_range['gte'] = start_date
+        if end_date:
+            date_range['lte'] = end_date
+        order_filter = {f'order_date__{op}': value for op, value in date_range.items()}
+        item_filter = {f'order__order_date__{op}': value for op, value in date_range.items()}
+        rollup_filter = {f'date__{op}': value for op, value in date_range.items()}
+        party_id = f'{party}_id'
+        order_key = ('order__order_date', 'order__warehouse_id', f'order__{party_id}')
+
+        with transaction.atomic():
+            rollup_model.objects.filter(**rollup_filter).delete()
+            items = item_model.objects.filter(order__status='completed', **item_filter)
+
+            header_quantity = {
+                tuple(row[field] for field in order_key): row['quantity']
+                for row in items.values(*order_key).annotate(quantity=Sum('quantity')).order_by()
+            }
+            rows = [
+                rollup_model(
+                    date=row['order_date'], warehouse_id=row['warehouse_id'], goods_id=None, goods_key=0,
+                    quantity=header_quantity.get((row['order_date'], row['warehouse_id'], row[party_id]), 0),
+                    amount=row['amount'] or 0, order_count=row['order_count'],
+                    **{party_id: row[party_id]}
+                )
+                for row in order_model.objects.filter(status='completed', **order_filter).values(
+                    'order_date', 'warehouse_id', party_id
+                ).annotate(amount=Sum('total_amount'), order_count=Count('id')).order_by()
+            ]
+            lines = items.values(*order_key, 'goods_id').annotate(
+                quantity=Sum('quantity'), amount=Sum('amount'), order_count=Count('order_id', distinct=True)
+            ).order_by()
+            rows.extend(
+                rollup_model(
+                    date=row['order__order_date'], warehouse_id=row['order__warehouse_id'], goods_id=row['goods_id'],
+                    goods_key=row['goods_id'],
+                    quantity=row['quantity'] or 0, amount=row['amount'] or 0, order_count=row['order_count'],
+                    **{party_id: row[f'order__{party_id}']}
+                )
+                for row in lines
+            )
+            rollup_model.objects.bulk_create(rows, batch_size=batch_size)
+        return len(rows)
+
+    @staticmethod
+    def summary(side, start_date=None, end_date=None):
+        """区间内已完成单据的总金额与订单数（读取整单汇总行）"""
+        _, _, rollup_model, _ = RollupService.side_models(side)
+        queryset = rollup_model.objects.filter(goods__isnull=True)
+        if start_date:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(date__lte=end_date)
+        totals = queryset.aggregate(total_amount=Sum('amount'), order_count=Sum('order_count'))
+        return {'total_amount': totals['total_amount'] or 0, 'order_count': totals['order_count'] or 0}
+
+    @staticmethod
+    def daily_totals(side, start_date, end_date):
+        """按日期分组的已完成单据金额：{日期: 金额}"""
+        _, _, rollup_model, _ = RollupService.side_models(side)
+        rows = rollup_model.objects.filter(
+            goods__isnull=True, date__gte=start_date, date__lte=end_date
+        ).values('date').annotate(total=Sum('amount')).order_by()
+        return {row['date']: row['total'] or 0 for row in rows}
+
+
+class FinanceReportService:
+    """财务报表服务"""
+
+    # 账龄区间：(键, 最少天数, 最多天数)，天数为统计日期与单据创建日期之差
+    AGING_BUCKETS = (
+        ('days_0_30', 0, 30),
+        ('days_31_60', 31, 60),
+        ('days_61_90', 61, 90),
+        ('days_over_90', 91, None),
+    )
+    PARTY_TYPES = ('customer', 'supplier')
+    UNSETTLED_STATUSES = ('pending', 'partial')
+
+    @staticmethod
+    def parse_date_range(start_date=None, end_date=None):
+        """
+        解析 YYYY-MM-DD 日期为 [开始日零点, 结束日次日零点) 的时间区间（本地时区），直接比较 created_at 列值以使用索引
+        :raises ValueError: 日期格式错误
+        """
+        date_range = []
+        for name, value, offset in (('start_date', start_date, 0), ('end_date', end_date, 1)):
+            if not value:
+                date_range.append(None)
+                continue
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise ValueError(f'{name} 日期格式错误，应为 YYYY-MM-DD')
+            date_range.append(day_start(parsed + timedelta(days=offset)))
+        return tuple(date_range)
+
+    @staticmethod
+    def filter_payments(queryset, date_range=(None, None), payment_type=None):
+        """按创建时间区间与收付类型筛选"""
+        start, end = date_range
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lt=end)
+        if payment_type:
+            queryset = queryset.filter(type=payment_type)
+        return queryset
+
+    @staticmethod
+    def summary(queryset):
+        """一次条件聚合计算总额、收款、付款与单据数"""
+        totals = queryset.aggregate(
+            total_payment=Sum('total_amount'),
+            income=Sum('total_amount', filter=Q(type='receive')),
+            expense=Sum('total_amount', filter=Q(type='pay')),
+            payment_count=Count('id')
+        )
+        income = totals['income'] or 0
+        expense = totals['expense'] or 0
+        return {
+            'total_payment': float(totals['total_payment'] or 0),
+            'income': float(income),
+            'expense': float(expense),
+            'net_profit': float(income - expense),
+            'payment_count': totals['payment_count']
+        }
+
+    @staticmethod
+    def aging(party_type=None, today=None):
+        """
+        应收（客户）/应付（供应商）账龄：按往来单位一次分组查询，未收付金额 = 总金额 - 已付金额，
+        按单据创建日期距统计日期的天数分入 0-30 / 31-60 / 61-90 / 90天以上
+        :param party_type: customer / supplier，为空时两者都统计
+        :param today: 统计日期，默认当天
+        :return: {'as_of', 'parties': [...], 'totals': {往来单位类型: {...}}}
+        """
+        from finance.models import Payment
+        today = today or timezone.localdate()
+        party_types = [party_type] if party_type else list(FinanceReportService.PARTY_TYPES)
+        outstanding = ExpressionWrapper(
+            F('total_amount') - F('paid_amount'), output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+
+        buckets = {}
+        for key, min_days, max_days in FinanceReportService.AGING_BUCKETS:
+            condition = Q(created_at__lt=day_start(today - timedelta(days=min_days - 1)))
+            if max_days is not None:
+                condition &= Q(created_at__gte=day_start(today - timedelta(days=max_days)))
+            buckets[key] = Sum(outstanding, filter=condition)
+
+        rows = Payment.objects.filter(
+            status__in=FinanceReportService.UNSETTLED_STATUSES,
+            related_party_type__in=party_types,
+            total_amount__gt=F('paid_amount')
+        ).values('related_party_type', 'related_party_id').annotate(
+            related_party_name=Max('related_party_name'),
+            total=Sum(outstanding),
+            payment_count=Count('id'),
+            **buckets
+        ).order_by('-total', 'related_party_type', 'related_party_id')
+
+        keys = [key for key, _, _ in FinanceReportService.AGING_BUCKETS] + ['total']
+        totals = {name: {key: Decimal('0') for key in keys} for name in party_types}
+        parties = []
+        for row in rows:
+            for key in keys:
+                totals[row['related_party_type']][key] += row[key] or 0
+            parties.append({
+                'party_type': row['related_party_type'],
+                'party_id': row['related_party_id'],
+                'party_name': row['related_party_name'],
+                'payment_count': row['payment_count'],
+                **{key: float(row[key] or 0) for key in keys}
+            })
+        return {
+            'as_of': today.isoformat(),
+            'parties': parties,
+            'totals': {name: {key: float(value) for key, value in values.items()} for name, values in totals.items()}
+        }
+
+
+class DashboardService:
+    """仪表盘数据服务"""
+
+    CACHE_KEY = 'reports:dashboard'
+    VERSION_KEY = 'reports:dashboard:version'
+    DAYS = 7
+
+    @staticmethod
+    def compute(today=None):
+        """
+        计算仪表盘数据
+        :param today: 统计日期，默认当天
+        :return: 仪表盘数据
+        """
+        from basic.models import Goods
+        from inventory.models import Inventory
+        from purchase.models import PurchaseOrder
+        from sale.models import SaleOrder
+
+        today = today or timezone.localdate()
+        dates = [today - timedelta(days=i) for i in range(DashboardService.DAYS - 1, -1, -1)]
+        purchases = RollupService.daily_totals('purchase', dates[0], today)
+        sales = RollupService.daily_totals('sale', dates[0], today)
+
+        # 库存金额按 数量 × 移动平均单位成本 在数据库端按分类汇总
+        category_value = {}
+        category_rows = Inventory.objects.values('goods__category__name').annotate(
+            value=Sum(Inventory.stock_value_expression())
+        ).order_by('goods__category__name')
+        for row in category_rows:
+            category = row['goods__category__name'] or '未分类'
+            category_value[category] = category_value.get(category, 0) + (row['value'] or 0)
+
+        return {
+            'today_purchase': float(purchases.get(today, 0)),
+            'today_sale': float(sales.get(today, 0)),
+            'purchase_count': PurchaseOrder.objects.count(),
+            'sale_count': SaleOrder.objects.count(),
+            'goods_count': Goods.objects.filter(status=1).count(),
+            'total_inventory_value': float(sum(category_value.values())),
+            'chart_7_days': {
+                'dates': [date.strftime('%m-%d') for date in dates],
+                'sales': [float(sales.get(date, 0)) for date in dates],
+                'purchases': [float(purchases.get(date, 0)) for date in dates]
+            },
+            'chart_category': {
+                'categories': list(category_value.keys()),
+                'values': [float(value) for value in category_value.values()]
+            }
+        }
+
+    @staticmethod
+    def _cache_key(today):
+        """带版本号和日期的缓存键，跨天自动换键，失效时递增版本号"""
+        version = cache_version(DashboardService.VERSION_KEY)
+        return f'{DashboardService.CACHE_KEY}:{version}:{today:%Y%m%d}'
+
+    @staticmethod
+    def get_dashboard():
+        """
+        获取仪表盘数据（缓存 DASHBOARD_CACHE_TIMEOUT 秒，业务事件分发时提前失效）
+        :return: 仪表盘数据
+        """
+        today = timezone.localdate()
+        key = DashboardService._cache_key(today)
+        data = shared_cache().get(key)
+        if data is None:
+            data = DashboardService.compute(today)
+            shared_cache().set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+        return data
+
+    @staticmethod
+    def invalidate():
+        """事务提交后使仪表盘缓存失效"""
+        transaction.on_commit(lambda: bump_cache_version(DashboardService.VERSION_KEY))
@@ -0,0 +1,342 @@
+"""
+报表模块测试
+"""
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from decimal import Decimal
+
+from basic.models import Category, Goods
+from inventory.models import InventoryLog
+from inventory.services import InventoryService
+from inventory.tests import InventoryTestMixin
+from reports.analytics_service import AnalyticsService
+from reports.models import SaleDailyRollup
+from reports.services import DashboardService, FinanceReportService, RollupService
+from sale.models import SaleOrder
+from system.services import OutboxService
+from utils.cache import shared_cache
+
+
+class DashboardCacheTest(InventoryTestMixin, TestCase):
+    """仪表盘聚合与缓存测试"""
+
+    def setUp(self):
+        super().setUp()
+        from basic.models import Supplier
+        from purchase.models import PurchaseOrder
+
+        shared_cache().clear()
+        supplier = Supplier.objects.create(code='SUP001', name='测试供应商')
+        today = timezone.localdate()
+        for days, amount in ((0, '100'), (0, '50'), (3, '80'), (10, '999')):
+            PurchaseOrder.objects.create(
+                order_no=f'PO-D{days}-{amount}', supplier=supplier, warehouse=self.warehouse,
+                order_date=today - timedelta(days=days), status='completed', total_amount=Decimal(amount)
+            )
+        RollupService.rebuild('purchase')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('4'), unit_cost=Decimal('25'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_dashboard_grouped_queries_and_cached(self):
+        """测试仪表盘按日期、分类分组聚合，查询数固定，重复读取命中缓存"""
+        with self.assertNumQueries(6):
+            data = DashboardService.compute()
+        self.assertEqual(data['today_purchase'], 150.0)
+        self.assertEqual(data['chart_7_days']['purchases'], [0, 0, 0, 80.0, 0, 0, 150.0])
+        self.assertEqual(data['chart_category'], {'categories': ['电子产品'], 'values': [100.0]})
+        self.assertEqual(data['total_inventory_value'], 100.0)
+
+        self.client.get('/api/v1/reports/dashboard/')
+        # 命中共享缓存：只读取版本号和缓存数据，不再聚合
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/reports/dashboard/')
+        self.assertEqual(response.data['data']['purchase_count'], 4)
+
+    def test_dashboard_invalidated_by_outbox_event(self):
+        """测试发件箱分发业务事件后仪表盘缓存失效"""
+        DashboardService.get_dashboard()
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('4'), unit_cost=Decimal('25'))
+        self.assertEqual(DashboardService.get_dashboard()['total_inventory_value'], 100.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OutboxService.dispatch()
+        self.assertEqual(DashboardService.get_dashboard()['total_inventory_value'], 200.0)
+
+    def test_invalidation_across_cache_instances(self):
+        """测试分发进程递增版本号后，Web 进程（独立的缓存实例）读到新数据"""
+        from django.core.cache.backends.db import DatabaseCache
+
+        location = settings.CACHES['shared']['LOCATION']
+        web, dispatcher = DatabaseCache(location, {}), DatabaseCache(location, {})
+        with mock.patch('utils.cache.caches', {'shared': web}):
+            DashboardService.get_dashboard()
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('4'), unit_cost=Decimal('25'))
+
+        with mock.patch('utils.cache.caches', {'shared': dispatcher}), \
+                self.captureOnCommitCallbacks(execute=True):
+            OutboxService.dispatch()
+        with mock.patch('utils.cache.caches', {'shared': web}):
+            self.assertEqual(DashboardService.get_dashboard()['total_inventory_value'], 200.0)
+
+
+class ReportRollupTest(InventoryTestMixin, TestCase):
+    """采购/销售日汇总测试"""
+
+    def setUp(self):
+        super().setUp()
+        from basic.models import Customer
+
+        self.goods2 = Goods.objects.create(code='G002', name='测试商品2', category=self.category)
+        self.customer = Customer.objects.create(code='C001', name='测试客户', tax_no='TAX001', address='测试地址')
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('20'))
+        InventoryService.stock_in(self.goods2, self.warehouse, Decimal('20'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_sale_order(self, quantity):
+        response = self.client.post('/api/v1/sale/orders/', {
+            'customer': self.customer.id,
+            'warehouse': self.warehouse.id,
+            'order_date': '2026-10-01',
+            'items': [
+                {'goods': self.goods.id, 'quantity': quantity, 'price': '10'},
+                {'goods': self.goods2.id, 'quantity': '1', 'price': '5'}
+            ]
+        }, format='json')
+        return SaleOrder.objects.get(id=response.data['data']['id'])
+
+    def rollups(self):
+        return {
+            row.goods_id: (row.quantity, row.amount, row.order_count)
+            for row in SaleDailyRollup.objects.all()
+        }
+
+    def test_rollup_follows_completion_and_delete(self):
+        """测试销售单完成时累加日汇总，删除已完成单据时扣减，报表从汇总表读取"""
+        first = self.create_sale_order('2')
+        second = self.create_sale_order('3')
+        self.assertFalse(SaleDailyRollup.objects.exists())
+
+        for order in (first, second):
+            self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/')
+        self.assertEqual(self.rollups(), {
+            None: (Decimal('7'), Decimal('60'), 2),
+            self.goods.id: (Decimal('5'), Decimal('50'), 2),
+            self.goods2.id: (Decimal('2'), Decimal('10'), 2),
+        })
+
+        response = self.client.get('/api/v1/reports/sale/')
+        self.assertEqual(response.data['data']['summary'], {'total_amount': 60.0, 'order_count': 2})
+
+        self.client.delete(f'/api/v1/sale/orders/{first.id}/')
+        self.assertEqual(self.rollups()[None], (Decimal('4'), Decimal('35'), 1))
+        self.assertEqual(self.rollups()[self.goods.id], (Decimal('3'), Decimal('30'), 1))
+
+    def test_rebuild_matches_incremental(self):
+        """测试按日期区间重建结果与增量维护一致，区间外的汇总不受影响"""
+        order = self.create_sale_order('2')
+        self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/')
+        incremental = self.rollups()
+
+        SaleDailyRollup.objects.update(amount=0)
+        RollupService.rebuild('sale', start_date=order.order_date, end_date=order.order_date)
+        self.assertEqual(self.rollups(), incremental)
+
+        RollupService.rebuild('sale', end_date=order.order_date - timedelta(days=1))
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_header_rollup_unique(self):
+        """测试整单汇总行（商品为空）同样受唯一约束，并发插入冲突时原子累加"""
+        from django.db import IntegrityError, transaction
+
+        order = self.create_sale_order('2')
+        self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/')
+        header = SaleDailyRollup.objects.get(goods__isnull=True)
+        self.assertEqual(header.goods_key, 0)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SaleDailyRollup.objects.create(date=header.date, warehouse_id=header.warehouse_id,
+                                           customer_id=header.customer_id)
+
+        key = {'date': header.date, 'warehouse_id': header.warehouse_id, 'customer_id': header.customer_id}
+        RollupService._increment(SaleDailyRollup, key, SaleDailyRollup(
+            goods_key=0, amount=Decimal('5'), updated_at=timezone.now(), **key
+        ))
+        self.assertEqual(SaleDailyRollup.objects.filter(goods__isnull=True).count(), 1)
+        self.assertEqual(SaleDailyRollup.objects.get(goods__isnull=True).amount, header.amount + Decimal('5'))
+
+
+class AnalyticsTest(InventoryTestMixin, TestCase):
+    """数据分析接口测试"""
+
+    def setUp(self):
+        super().setUp()
+        from basic.models import Customer
+        from sale.models import SaleItem
+
+        shared_cache().clear()
+        other = Category.objects.create(name='办公用品', sort_order=2)
+        self.goods2 = Goods.objects.create(code='G002', name='测试商品2', category=other)
+        customer = Customer.objects.create(code='C001', name='测试客户', tax_no='TAX001', address='测试地址')
+        for order_no, order_date, status in (('SO1', '2026-09-05', 'completed'), ('SO2', '2026-10-08', 'completed'),
+                                             ('SO3', '2026-10-09', 'pending')):
+            order = SaleOrder.objects.create(order_no=order_no, customer=customer, warehouse=self.warehouse,
+                                             order_date=order_date, status=status)
+            for goods, quantity in ((self.goods, '2'), (self.goods2, '1')):
+                SaleItem.objects.create(order=order, goods=goods, quantity=Decimal(quantity), price=Decimal('10'),
+                                        amount=Decimal(quantity) * 10)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def analytics(self, **params):
+        return self.client.get('/api/v1/reports/analytics/', params).data
+
+    def test_grouped_query_and_cache(self):
+        """测试按 月 × 分类 一次分组查询，相同的规范化查询命中缓存"""
+        params = {'source': 'sale', 'dimensions': 'month,category', 'measures': 'amount,quantity,count'}
+        with self.assertNumQueries(1):
+            result = AnalyticsService.run(AnalyticsService.normalize(params))
+        self.assertEqual(AnalyticsService.query(params)['rows'], result['rows'])
+        self.assertEqual(result['columns'], ['month', 'category', 'amount', 'quantity', 'count'])
+        self.assertEqual(result['rows'], [
+            {'month': '2026-09-01', 'category': '办公用品', 'amount': 10.0, 'quantity': 1.0, 'count': 1},
+            {'month': '2026-09-01', 'category': '电子产品', 'amount': 20.0, 'quantity': 2.0, 'count': 1},
+            {'month': '2026-10-01', 'category': '办公用品', 'amount': 10.0, 'quantity': 1.0, 'count': 1},
+            {'month': '2026-10-01', 'category': '电子产品', 'amount': 20.0, 'quantity': 2.0, 'count': 1},
+        ])
+
+        # 命中共享缓存：只读取版本号和缓存结果
+        with self.assertNumQueries(2):
+            data = self.analytics(source='sale', dimensions=' month, category,month', measures='amount,quantity,count')
+        self.assertTrue(data['data']['cached'])
+        self.assertIn('query_ms', data['data'])
+
+    def test_invalidation_across_cache_instances(self):
+        """测试分发进程使结果失效后，Web 进程（独立的缓存实例）重新查询"""
+        from django.core.cache.backends.db import DatabaseCache
+
+        location = settings.CACHES['shared']['LOCATION']
+        web, dispatcher = DatabaseCache(location, {}), DatabaseCache(location, {})
+        params = {'source': 'movement', 'measures': 'quantity'}
+        with mock.patch('utils.cache.caches', {'shared': web}):
+            self.assertEqual(AnalyticsService.query(params)['rows'], [{'quantity': None}])
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('4'), unit_cost=Decimal('5'))
+
+        with mock.patch('utils.cache.caches', {'shared': dispatcher}), \
+                self.captureOnCommitCallbacks(execute=True):
+            OutboxService.dispatch()
+        with mock.patch('utils.cache.caches', {'shared': web}):
+            result = AnalyticsService.query(params)
+        self.assertFalse(result['cached'])
+        self.assertEqual(result['rows'], [{'quantity': 4.0}])
+
+    def test_whitelist_row_cap_and_totals(self):
+        """测试维度白名单、行数上限和无维度汇总"""
+        data = self.analytics(source='sale', dimensions='supplier')
+        self.assertEqual(data['code'], 400)
+        self.assertIn('不支持的维度', data['msg'])
+        self.assertEqual(self.analytics(source='order')['code'], 400)
+
+        data = self.analytics(source='sale', dimensions='goods', limit=1)['data']
+        self.assertEqual((data['row_count'], data['truncated']), (1, True))
+
+        data = self.analytics(source='sale', measures='amount,count', start_date='2026-10-01')['data']
+        self.assertEqual(data['rows'], [{'amount': 30.0, 'count': 1}])
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('4'), unit_cost=Decimal('5'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('1'))
+        data = self.analytics(source='movement', dimensions='goods', measures='quantity,amount,count')['data']
+        self.assertEqual(data['rows'], [{'goods': '测试商品', 'quantity': 3.0, 'amount': 15.0, 'count': 2}])
+
+    def test_movement_includes_archived_logs(self):
+        """测试库存流水数据源合并归档表，归档前后统计结果不变"""
+        from django.core.management import call_command
+
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'), unit_cost=Decimal('5'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('4'))
+        InventoryLog.objects.update(created_at=timezone.now() - timedelta(days=400))
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('5'), unit_cost=Decimal('5'))
+
+        queries = [
+            {'source': 'movement', 'dimensions': 'month,goods', 'measures': 'quantity,amount,count'},
+            {'source': 'movement', 'dimensions': 'goods', 'measures': 'quantity,count'},
+            {'source': 'movement', 'measures': 'quantity,count'},
+        ]
+        before = [AnalyticsService.run(AnalyticsService.normalize(params))['rows'] for params in queries]
+        call_command('archive_inventory_logs', days=365, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(InventoryLog.objects.count(), 1)
+
+        after = [AnalyticsService.run(AnalyticsService.normalize(params))['rows'] for params in queries]
+        self.assertEqual(after, before)
+        self.assertEqual(len(after[0]), 2)
+        self.assertEqual(after[1], [{'goods': '测试商品', 'quantity': 11.0, 'count': 3}])
+        self.assertEqual(after[2], [{'quantity': 11.0, 'count': 3}])
+
+
+class FinanceReportTest(InventoryTestMixin, TestCase):
+    """财务报表与账龄测试"""
+
+    def setUp(self):
+        super().setUp()
+        from finance.models import Payment
+
+        self.today = timezone.localdate()
+        # (单据编号, 类型, 往来单位类型, 往来单位ID, 总金额, 已付金额, 状态, 距今天数)
+        for order_no, payment_type, party_type, party_id, total, paid, status, days in (
+            ('PR1', 'receive', 'customer', 1, '100', '0', 'pending', 5),
+            ('PR2', 'receive', 'customer', 1, '200', '50', 'partial', 45),
+            ('PR3', 'receive', 'customer', 2, '300', '0', 'pending', 120),
+            ('PR4', 'receive', 'customer', 2, '80', '80', 'paid', 10),
+            ('PP1', 'pay', 'supplier', 1, '400', '100', 'partial', 70),
+        ):
+            payment = Payment.objects.create(
+                order_no=order_no, type=payment_type, related_party_type=party_type, related_party_id=party_id,
+                related_party_name=f'{party_type}{party_id}', total_amount=Decimal(total),
+                paid_amount=Decimal(paid), status=status
+            )
+            Payment.objects.filter(id=payment.id).update(created_at=timezone.now() - timedelta(days=days))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_summary_single_query(self):
+        """测试汇总一次条件聚合，单据数为实际数量而非列表长度"""
+        from finance.models import Payment
+
+        with self.assertNumQueries(1):
+            summary = FinanceReportService.summary(Payment.objects.all())
+        self.assertEqual(summary, {'total_payment': 1080.0, 'income': 680.0, 'expense': 400.0,
+                                   'net_profit': 280.0, 'payment_count': 5})
+
+        start = (self.today - timedelta(days=60)).isoformat()
+        data = self.client.get('/api/v1/reports/finance/', {'start_date': start}).data['data']
+        self.assertEqual(data['summary']['payment_count'], 3)
+        self.assertEqual(data['summary']['income'], 380.0)
+        self.assertEqual(len(data['payments']), 3)
+
+        response = self.client.get('/api/v1/reports/finance/', {'start_date': '2026-13-01'})
+        self.assertEqual(response.data['code'], 400)
+
+    def test_aging_buckets(self):
+        """测试账龄按往来单位一次分组查询，已结清单据不计入"""
+        with self.assertNumQueries(1):
+            result = FinanceReportService.aging(today=self.today)
+        parties = {(row['party_type'], row['party_id']): row for row in result['parties']}
+        self.assertEqual(parties[('customer', 1)]['days_0_30'], 100.0)
+        self.assertEqual(parties[('customer', 1)]['days_31_60'], 150.0)
+        self.assertEqual(parties[('customer', 1)]['payment_count'], 2)
+        self.assertEqual(parties[('customer', 2)]['days_over_90'], 300.0)
+        self.assertEqual(parties[('customer', 2)]['payment_count'], 1)
+        self.assertEqual(parties[('supplier', 1)]['days_61_90'], 300.0)
+        self.assertEqual(result['totals']['customer'], {'days_0_30': 100.0, 'days_31_60': 150.0, 'days_61_90': 0.0,
+                                                        'days_over_90': 300.0, 'total': 550.0})
+
+        data = self.client.get('/api/v1/reports/finance/aging/', {'party_type': 'supplier'}).data
+        self.assertEqual(data['code'], 200)
+        self.assertEqual([row['party_type'] for row in data['data']['parties']], ['supplier'])
+        self.assertEqual(self.client.get('/api/v1/reports/finance/aging/', {'party_type': 'x'}).data['code'], 400)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import PurchaseReportView, SaleReportView, InventoryReportView, DashboardView, FinanceReportView
+from .views import PurchaseReportView, SaleReportView, InventoryReportView, DashboardView, FinanceReportView, AnalyticsView, AgingReportView
 
 urlpatterns = [
     path('purchase/', PurchaseReportView.as_view(), name='purchase-report'),
@@ -7,4 +7,6 @@ urlpatterns = [
     path('inventory/', InventoryReportView.as_view(), name='inventory-report'),
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('finance/', FinanceReportView.as_view(), name='finance-report'),
+    path('finance/aging/', AgingReportView.as_view(), name='aging-report'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
 ]
@@ -8,6 +8,9 @@ from sale.models import SaleOrder
 from inventory.models import Inventory
 from finance.models import Payment
 from system.permissions import ModulePermission
+from utils.export import EXPORT_FORMATS, iter_values, streaming_export
+from .analytics_service import AnalyticsService
+from .services import DashboardService, FinanceReportService, RollupService
 
 
 class ReportsModulePermission(ModulePermission):
@@ -17,27 +20,63 @@ class ReportsModulePermission(ModulePermission):
         '库存报表': 'reports',
         '财务报表': 'reports',
         '仪表盘': 'reports',
+        '数据分析': 'reports',
     }
 
 
-class PurchaseReportView(APIView):
+class ReportExportMixin:
+    """报表流式导出：请求带 ?export=csv|xlsx 时按当前筛选条件导出全部明细（不受页面 50 行限制）"""
+    export_name = ''
+    export_header = []
+    export_fields = ()
+
+    def get_report_queryset(self, request):
+        raise NotImplementedError
+
+    def export_rows(self, request):
+        """导出行迭代器（按主键分批读取 values_list 投影）"""
+        return iter_values(self.get_report_queryset(request), self.export_fields)
+
+    def export(self, request):
+        file_format = request.query_params.get('export')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'code': 400, 'msg': '不支持的导出格式，应为 csv 或 xlsx', 'data': None})
+        return streaming_export(
+            self.export_header, self.export_rows(request),
+            f'{self.export_name}_{timezone.localdate():%Y%m%d}', file_format, sheet_name=self.module_name
+        )
+
+
+class PurchaseReportView(ReportExportMixin, APIView):
     """采购报表"""
     permission_classes = [IsAuthenticated, ReportsModulePermission]
     module_name = '采购报表'
+    export_name = 'purchase_report'
+    export_header = ['采购单号', '供应商', '仓库', '采购日期', '总金额', '已付金额']
+    export_fields = ('order_no', 'supplier__name', 'warehouse__name', 'order_date', 'total_amount', 'paid_amount')
 
-    def get(self, request):
+    def get_report_queryset(self, request):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
-        queryset = PurchaseOrder.objects.filter(status='completed')
+        queryset = PurchaseOrder.objects.filter(status='completed').select_related('supplier')
         
         if start_date:
             queryset = queryset.filter(order_date__gte=start_date)
         if end_date:
             queryset = queryset.filter(order_date__lte=end_date)
+        return queryset
+
+    def get(self, request):
+        if request.query_params.get('export'):
+            return self.export(request)
+        
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        queryset = self.get_report_queryset(request)
         
-        total_amount = queryset.aggregate(total=Sum('total_amount'))['total'] or 0
-        order_count = queryset.count()
+        # 汇总数据读取日汇总表，只有最近 50 张单据明细查询单据表
+        summary = RollupService.summary('purchase', start_date, end_date)
         
         orders = []
         for order in queryset[:50]:
@@ -55,32 +94,44 @@ class PurchaseReportView(APIView):
             'msg': '成功',
             'data': {
                 'summary': {
-                    'total_amount': float(total_amount),
-                    'order_count': order_count
+                    'total_amount': float(summary['total_amount']),
+                    'order_count': summary['order_count']
                 },
                 'orders': orders
             }
         })
 
 
-class SaleReportView(APIView):
+class SaleReportView(ReportExportMixin, APIView):
     """销售报表"""
     permission_classes = [IsAuthenticated, ReportsModulePermission]
     module_name = '销售报表'
+    export_name = 'sale_report'
+    export_header = ['销售单号', '客户', '仓库', '销售日期', '总金额', '已收金额']
+    export_fields = ('order_no', 'customer__name', 'warehouse__name', 'order_date', 'total_amount', 'received_amount')
 
-    def get(self, request):
+    def get_report_queryset(self, request):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
-        queryset = SaleOrder.objects.filter(status='completed')
+        queryset = SaleOrder.objects.filter(status='completed').select_related('customer')
         
         if start_date:
             queryset = queryset.filter(order_date__gte=start_date)
         if end_date:
             queryset = queryset.filter(order_date__lte=end_date)
+        return queryset
+
+    def get(self, request):
+        if request.query_params.get('export'):
+            return self.export(request)
         
-        total_amount = queryset.aggregate(total=Sum('total_amount'))['total'] or 0
-        order_count = queryset.count()
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        queryset = self.get_report_queryset(request)
+        
+        # 汇总数据读取日汇总表，只有最近 50 张单据明细查询单据表
+        summary = RollupService.summary('sale', start_date, end_date)
         
         orders = []
         for order in queryset[:50]:
@@ -98,30 +149,41 @@ class SaleReportView(APIView):
             'msg': '成功',
             'data': {
                 'summary': {
-                    'total_amount': float(total_amount),
-                    'order_count': order_count
+                    'total_amount': float(summary['total_amount']),
+                    'order_count': summary['order_count']
                 },
                 'orders': orders
             }
         })
 
 
-class InventoryReportView(APIView):
+class InventoryReportView(ReportExportMixin, APIView):
     """库存报表"""
     permission_classes = [IsAuthenticated, ReportsModulePermission]
     module_name = '库存报表'
+    export_name = 'inventory_report'
+    export_header = ['商品编码', '商品名称', '规格', '单位', '分类', '仓库', '库存数量', '平均单价', '库存金额', '最低库存']
+    export_fields = ('goods__code', 'goods__name', 'goods__spec', 'goods__unit__name', 'goods__category__name',
+                     'warehouse__name', 'quantity', 'unit_cost', 'total_value', 'goods__min_stock')
 
-    def get(self, request):
-        from basic.models import Goods, Unit, Category
-        
+    def get_report_queryset(self, request):
         goods_name = request.query_params.get('goods_name', '')
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 20))
         
-        queryset = Inventory.objects.select_related('goods', 'warehouse').all()
+        queryset = Inventory.objects.select_related(
+            'goods', 'goods__unit', 'goods__category', 'warehouse'
+        ).annotate(total_value=Inventory.stock_value_expression()).order_by('id')
         
         if goods_name:
             queryset = queryset.filter(goods__name__icontains=goods_name)
+        return queryset
+
+    def get(self, request):
+        if request.query_params.get('export'):
+            return self.export(request)
+        
+        page = int(request.query_params.get('page', 1))
+        page_size = int(request.query_params.get('page_size', 20))
+        queryset = self.get_report_queryset(request)
         
         total = queryset.count()
         start = (page - 1) * page_size
@@ -130,8 +192,9 @@ class InventoryReportView(APIView):
         items = []
         for inv in queryset[start:end]:
             goods = inv.goods
-            avg_price = goods.purchase_price if goods.purchase_price else 0
-            total_value = inv.quantity * avg_price
+            # 库存变动时维护的移动加权平均单位成本
+            avg_price = inv.unit_cost
+            total_value = inv.stock_value
             
             items.append({
                 'id': inv.id,
@@ -161,103 +224,66 @@ class DashboardView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        today = timezone.now().date()
-        
-        today_purchase = PurchaseOrder.objects.filter(
-            order_date=today,
-            status='completed'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        today_sale = SaleOrder.objects.filter(
-            order_date=today,
-            status='completed'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        purchase_count = PurchaseOrder.objects.count()
-        sale_count = SaleOrder.objects.count()
-        
-        from basic.models import Goods
-        goods_count = Goods.objects.filter(status=1).count()
-        
-        from datetime import timedelta
-        last_7_days = []
-        last_7_days_sales = []
-        last_7_days_purchases = []
-        
-        for i in range(6, -1, -1):
-            date = today - timedelta(days=i)
-            last_7_days.append(date.strftime('%m-%d'))
-            
-            sale_amount = SaleOrder.objects.filter(
-                order_date=date,
-                status='completed'
-            ).aggregate(total=Sum('total_amount'))['total'] or 0
-            last_7_days_sales.append(float(sale_amount))
-            
-            purchase_amount = PurchaseOrder.objects.filter(
-                order_date=date,
-                status='completed'
-            ).aggregate(total=Sum('total_amount'))['total'] or 0
-            last_7_days_purchases.append(float(purchase_amount))
-        
-        category_value = {}
-        total_inventory_value = 0
-        for inv in Inventory.objects.select_related('goods').all():
-            goods = inv.goods
-            category = goods.category.name if goods.category else '未分类'
-            value = inv.quantity * (goods.purchase_price or 0)
-            category_value[category] = category_value.get(category, 0) + value
-            total_inventory_value += value
-        
-        category_names = list(category_value.keys())
-        category_values = [float(v) for v in category_value.values()]
-        
         return Response({
             'code': 200,
             'msg': '成功',
-            'data': {
-                'today_purchase': float(today_purchase),
-                'today_sale': float(today_sale),
-                'purchase_count': purchase_count,
-                'sale_count': sale_count,
-                'goods_count': goods_count,
-                'total_inventory_value': float(total_inventory_value),
-                'chart_7_days': {
-                    'dates': last_7_days,
-                    'sales': last_7_days_sales,
-                    'purchases': last_7_days_purchases
-                },
-                'chart_category': {
-                    'categories': category_names,
-                    'values': category_values
-                }
-            }
+            'data': DashboardService.get_dashboard()
+        })
+
+
+class AnalyticsView(APIView):
+    """
+    数据分析：按白名单维度与指标分组聚合
+    参数：source=sale|purchase|movement|payment，dimensions=day,category,...，measures=amount,quantity,count，
+    start_date/end_date，limit（不超过 ANALYTICS_MAX_ROWS）
+    """
+    permission_classes = [IsAuthenticated, ReportsModulePermission]
+    module_name = '数据分析'
+
+    def get(self, request):
+        try:
+            data = AnalyticsService.query(request.query_params)
+        except ValueError as e:
+            return Response({'code': 400, 'msg': str(e), 'data': None})
+        return Response({
+            'code': 200,
+            'msg': '成功',
+            'data': data
         })
 
 
-class FinanceReportView(APIView):
+class FinanceReportView(ReportExportMixin, APIView):
     """财务报表"""
     permission_classes = [IsAuthenticated, ReportsModulePermission]
     module_name = '财务报表'
+    export_name = 'finance_report'
+    export_header = ['单据编号', '类型', '关联单据', '往来单位', '金额', '已付金额', '付款方式', '创建时间', '备注']
+    export_fields = ('order_no', 'type', 'related_order_no', 'related_party_name', 'total_amount', 'paid_amount',
+                     'payment_method', 'created_at', 'remark')
+
+    def get_report_queryset(self, request):
+        return FinanceReportService.filter_payments(
+            Payment.objects.all(), self.date_range, request.query_params.get('payment_type')
+        )
+
+    def export_rows(self, request):
+        """类型、付款方式导出为中文名称"""
+        types = dict(Payment.TYPE_CHOICES)
+        methods = dict(Payment.PAYMENT_METHOD_CHOICES)
+        for row in super().export_rows(request):
+            yield (row[0], types.get(row[1], row[1]), *row[2:6], methods.get(row[6], row[6]), *row[7:])
 
     def get(self, request):
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        payment_type = request.query_params.get('payment_type')
+        try:
+            self.date_range = FinanceReportService.parse_date_range(
+                request.query_params.get('start_date'), request.query_params.get('end_date')
+            )
+        except ValueError as e:
+            return Response({'code': 400, 'msg': str(e), 'data': None})
+        if request.query_params.get('export'):
+            return self.export(request)
         
-        queryset = Payment.objects.all()
-        
-        if start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
-        if payment_type:
-            queryset = queryset.filter(type=payment_type)
-        
-        total_payment = queryset.aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        income = queryset.filter(type='receive').aggregate(total=Sum('total_amount'))['total'] or 0
-        expense = queryset.filter(type='pay').aggregate(total=Sum('total_amount'))['total'] or 0
+        queryset = self.get_report_queryset(request)
         
         payments = []
         for payment in queryset[:50]:
@@ -276,13 +302,23 @@ class FinanceReportView(APIView):
             'code': 200,
             'msg': '成功',
             'data': {
-                'summary': {
-                    'total_payment': float(total_payment),
-                    'income': float(income),
-                    'expense': float(expense),
-                    'net_profit': float(income - expense),
-                    'payment_count': len(payments)
-                },
+                'summary': FinanceReportService.summary(queryset),
                 'payments': payments
             }
         })
+
+
+class AgingReportView(APIView):
+    """应收/应付账龄报表（?party_type=customer|supplier，为空时两者都统计）"""
+    permission_classes = [IsAuthenticated, ReportsModulePermission]
+    module_name = '财务报表'
+
+    def get(self, request):
+        party_type = request.query_params.get('party_type') or None
+        if party_type is not None and party_type not in FinanceReportService.PARTY_TYPES:
+            return Response({'code': 400, 'msg': '往来单位类型应为 customer 或 supplier', 'data': None})
+        return Response({
+            'code': 200,
+            'msg': '成功',
+            'data': FinanceReportService.aging(party_type)
+        })
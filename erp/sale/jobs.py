@@ -0,0 +1,40 @@
+"""
+销售模块后台任务
+"""
+from django.conf import settings
+from django.db import transaction
+
+from system.services import JobService
+
+
+@JobService.register('sale.confirm_sale_order')
+def confirm_sale_order(job, progress):
+    """
+    后台确认出库：先创建草稿出库单并记入任务参数，再按明细分批出库并上报进度
+    同一销售单之前失败的任务遗留的草稿出库单直接续用（已出库的明细行不会重复出库），不再新建
+    """
+    from inventory.models import StockOut
+    from .models import SaleOrder
+    from .services import SaleOrderService
+
+    sale_order = SaleOrder.objects.select_related('warehouse').get(id=job.params['sale_order_id'])
+
+    stock_out = None
+    if job.params.get('stock_out_id'):
+        stock_out = StockOut.objects.filter(id=job.params['stock_out_id'], status='draft').first()
+    if stock_out is None:
+        stock_out = SaleOrderService.failed_job_stock_out(sale_order)
+        if stock_out is not None:
+            JobService.update_params(job, stock_out_id=stock_out.id)
+    if stock_out is None:
+        if sale_order.status != 'pending':
+            raise ValueError('该销售单状态不允许确认，只有待出库状态才能确认')
+        with transaction.atomic():
+            stock_out = SaleOrderService.create_stock_out(sale_order, job.created_by)
+            JobService.update_params(job, stock_out_id=stock_out.id)
+
+    stock_out = SaleOrderService.confirm(
+        sale_order, created_by=job.created_by, stock_out=stock_out,
+        chunk_size=settings.JOB_CHUNK_SIZE, progress=progress
+    )
+    return {'stock_out_id': stock_out.id, 'stock_out_no': stock_out.order_no}
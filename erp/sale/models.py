@@ -11,6 +11,8 @@ class SaleOrder(models.Model):
         ('completed', '已出库'),
         ('cancelled', '已取消'),
     ]
+    # 占用库存预留的状态
+    RESERVING_STATUSES = ('pending', 'partial')
 
     order_no = models.CharField(max_length=30, unique=True, verbose_name='销售单号')
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, verbose_name='客户')
@@ -34,6 +36,14 @@ class SaleOrder(models.Model):
     def __str__(self):
         return self.order_no
 
+    def reservation_lines(self):
+        """未出库数量对应的库存预留明细"""
+        return [
+            {'goods': item.goods, 'warehouse': self.warehouse, 'quantity': item.quantity - item.shipped_quantity}
+            for item in self.items.select_related('goods')
+            if item.quantity > item.shipped_quantity
+        ]
+
 
 class SaleItem(models.Model):
     """销售明细"""
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from decimal import Decimal
+from django.db import transaction
 from .models import SaleOrder, SaleItem
 
 
@@ -79,8 +80,26 @@ class SaleOrderCreateSerializer(serializers.ModelSerializer):
         
         return data
     
+    def to_representation(self, instance):
+        """
+        创建后按详情格式返回，与详情、修改接口的返回一致
+        明细中的商品是模型对象，按创建序列化器输出会转换失败
+        """
+        return SaleOrderSerializer(instance, context=self.context).data
+
+    @staticmethod
+    def reserve_stock(sale_order):
+        """按销售单未出库数量预留库存，可用库存不足时返回校验错误"""
+        from inventory.services import InventoryService
+
+        try:
+            InventoryService.reserve(sale_order.reservation_lines())
+        except ValueError as e:
+            raise serializers.ValidationError({'items': str(e)})
+
+    @transaction.atomic
     def create(self, validated_data):
-        """创建销售单，同时处理明细"""
+        """创建销售单，同时处理明细并预留库存"""
         from basic.models import Goods
         from utils.order_no import generate_sale_order_no
         
@@ -113,18 +132,26 @@ class SaleOrderCreateSerializer(serializers.ModelSerializer):
                 remark=item_data.get('remark', '')
             )
         
+        self.reserve_stock(sale_order)
         return sale_order
     
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """更新销售单，同时处理明细"""
+        """更新销售单，同时处理明细；先释放原预留，修改后按新明细和仓库重新预留"""
         from basic.models import Goods
+        from inventory.services import InventoryService
         
         items_data = validated_data.pop('items', None)
         
         if items_data is not None:
             if instance.status in ['completed', 'cancelled']:
                 raise serializers.ValidationError('已完成或已取消的订单不能修改')
-            
+        
+        reserving = instance.status in SaleOrder.RESERVING_STATUSES
+        if reserving:
+            InventoryService.release(instance.reservation_lines())
+        
+        if items_data is not None:
             instance.items.all().delete()
             
             total_amount = Decimal('0')
@@ -150,4 +177,6 @@ class SaleOrderCreateSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         
+        if reserving:
+            self.reserve_stock(instance)
         return instance
@@ -0,0 +1,133 @@
+"""
+销售单服务模块
+确认出库逻辑供接口同步调用和后台任务分批调用共用：
+同步确认时由调用方包裹在一个事务内；后台任务先创建草稿出库单，再按明细分批出库，
+每批独立提交并上报进度，中断后重跑只会处理尚未出库的数量。
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from inventory.document_service import StockDocumentService
+from inventory.models import StockOut, StockOutItem
+from inventory.services import InventoryService
+from utils.order_no import generate_stock_out_no
+
+
+class SaleOrderService:
+    """销售单服务"""
+
+    @staticmethod
+    def create_stock_out(sale_order, created_by=None):
+        """为销售单创建草稿出库单"""
+        return StockOut.objects.create(
+            order_no=generate_stock_out_no(),
+            sale_order=sale_order,
+            warehouse=sale_order.warehouse,
+            total_amount=0,
+            status='draft',
+            created_by=created_by
+        )
+
+    @staticmethod
+    def failed_job_stock_out(sale_order):
+        """
+        之前失败的后台出库任务遗留的草稿出库单（可能已出库部分明细），没有时返回 None
+        同步确认与重新提交的后台任务都续用该出库单，避免同一次出库拆成两张出库单
+        """
+        from system.models import BackgroundJob
+
+        params_list = BackgroundJob.objects.filter(
+            object_key=f'SaleOrder:{sale_order.id}', status='failed'
+        ).order_by('-id').values_list('params', flat=True)
+        for params in params_list:
+            if not params.get('stock_out_id'):
+                continue
+            stock_out = StockOut.objects.filter(id=params['stock_out_id'], sale_order=sale_order, status='draft').first()
+            if stock_out is not None:
+                return stock_out
+        return None
+
+    @staticmethod
+    def ship_items(sale_order, stock_out, item_ids, created_by=None):
+        """
+        出库指定销售明细的未出库数量并消耗对应预留（在调用方事务内执行，明细行加锁后重新计算未出库数量）
+        :return: 处理的明细行数
+        """
+        from sale.models import SaleItem
+
+        items = list(SaleItem.objects.select_for_update().filter(id__in=item_ids).select_related('goods').order_by('id'))
+
+        movements = []
+        shipped_items = []
+        stock_out_items = []
+        for item in items:
+            shipped_qty = item.quantity - item.shipped_quantity
+            if shipped_qty > 0:
+                movements.append({
+                    'goods': item.goods,
+                    'warehouse': sale_order.warehouse,
+                    'change_type': 'outbound',
+                    'quantity': shipped_qty,
+                    'remark': f'销售出库 - {sale_order.order_no}'
+                })
+                item.shipped_quantity = item.quantity
+                shipped_items.append(item)
+
+                stock_out_items.append(StockOutItem(
+                    stock_out=stock_out,
+                    goods=item.goods,
+                    quantity=shipped_qty,
+                    price=item.price,
+                    amount=shipped_qty * item.price
+                ))
+
+        InventoryService.release(movements)
+        InventoryService.apply_movements(movements, related_order=sale_order, created_by=created_by)
+        SaleItem.objects.bulk_update(shipped_items, ['shipped_quantity'], batch_size=500)
+        StockOutItem.objects.bulk_create(stock_out_items, batch_size=500)
+        return len(items)
+
+    @staticmethod
+    def confirm(sale_order, created_by=None, stock_out=None, chunk_size=None, progress=None):
+        """
+        确认出库：出库销售单全部未出库数量，确认出库单并更新销售单状态
+        :param sale_order: 销售单
+        :param created_by: 操作人
+        :param stock_out: 续跑时已创建的草稿出库单，为空时续用失败任务遗留的草稿出库单，没有则新建
+        :param chunk_size: 每批处理的明细行数，为空时一次处理
+        :param progress: 进度回调 progress(已处理行数, 总行数)
+        :return: 出库单
+        """
+        from reports.services import RollupService
+        from system.services import OutboxService
+
+        if stock_out is None:
+            stock_out = SaleOrderService.failed_job_stock_out(sale_order)
+        if stock_out is None:
+            stock_out = SaleOrderService.create_stock_out(sale_order, created_by)
+        item_ids = list(sale_order.items.order_by('id').values_list('id', flat=True))
+
+        done = 0
+        for chunk in StockDocumentService.chunked(item_ids, chunk_size):
+            with transaction.atomic():
+                done += SaleOrderService.ship_items(sale_order, stock_out, chunk, created_by)
+            if progress is not None:
+                progress(done, len(item_ids))
+
+        with transaction.atomic():
+            stock_out.total_amount = stock_out.items.aggregate(total=Sum('amount'))['total'] or 0
+            stock_out.status = 'confirmed'
+            stock_out.confirmed_at = timezone.now()
+            stock_out.save()
+
+            was_completed = sale_order.status == 'completed'
+            all_shipped = not sale_order.items.filter(shipped_quantity__lt=F('quantity')).exists()
+            sale_order.status = 'completed' if all_shipped else 'partial'
+            sale_order.save()
+            RollupService.sync_order(sale_order, was_completed)
+            OutboxService.publish_status_change(
+                sale_order, 'sale_order.shipped', stock_out_id=stock_out.id, stock_out_no=stock_out.order_no
+            )
+
+        return stock_out
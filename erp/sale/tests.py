@@ -0,0 +1,210 @@
+"""
+销售订单模块测试
+"""
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from decimal import Decimal
+
+from basic.models import Customer, Goods, Supplier
+from inventory.models import Inventory, StockIn, StockOut
+from inventory.services import InventoryService
+from inventory.tests import InventoryTestMixin
+from purchase.models import PurchaseItem, PurchaseOrder
+from sale.models import SaleItem, SaleOrder
+from sale.services import SaleOrderService
+from system.models import BackgroundJob
+from system.services import JobService
+
+
+
+class SaleOrderApiTest(InventoryTestMixin, TestCase):
+    """销售单接口测试"""
+
+    def setUp(self):
+        super().setUp()
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        self.customer = Customer.objects.create(code='C001', name='测试客户', tax_no='TAX001', address='测试地址')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_returns_detail(self):
+        """测试创建销售单返回详情格式（含ID、单号和明细），与详情接口一致"""
+        response = self.client.post('/api/v1/sale/orders/', {
+            'customer': self.customer.id,
+            'warehouse': self.warehouse.id,
+            'order_date': '2026-10-01',
+            'items': [{'goods': self.goods.id, 'quantity': '4', 'price': '89.00'}]
+        }, format='json')
+        self.assertEqual((response.status_code, response.data['code']), (200, 200))
+        data = response.data['data']
+        order = SaleOrder.objects.get()
+        self.assertEqual((data['id'], data['order_no'], data['status']), (order.id, order.order_no, 'pending'))
+        self.assertEqual([(item['goods'], item['quantity']) for item in data['items']], [(self.goods.id, '4.00')])
+        self.assertEqual(data, self.client.get(f'/api/v1/sale/orders/{order.id}/').data['data'])
+
+
+@override_settings(JOB_CHUNK_SIZE=1)
+class BackgroundConfirmJobTest(InventoryTestMixin, TestCase):
+    """单据后台确认任务测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.goods2 = Goods.objects.create(code='G002', name='测试商品2', category=self.category)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_stock_in_confirm_job(self):
+        """测试入库单提交后台确认，分批入库并上报进度"""
+        supplier = Supplier.objects.create(code='SUP001', name='测试供应商', tax_no='TAX001', address='测试地址')
+        order = PurchaseOrder.objects.create(order_no='PO001', supplier=supplier, warehouse=self.warehouse)
+        for goods in (self.goods, self.goods2):
+            PurchaseItem.objects.create(order=order, goods=goods, quantity=Decimal('5'), price=Decimal('10'),
+                                        amount=Decimal('50'))
+        stock_in = StockIn.objects.create(order_no='RK001', purchase_order=order, warehouse=self.warehouse)
+
+        response = self.client.post(f'/api/v1/inventory/stock-in/{stock_in.id}/confirm/', {'async': True},
+                                    format='json')
+        job_id = response.data['data']['job_id']
+        response = self.client.post(f'/api/v1/inventory/stock-in/{stock_in.id}/confirm/')
+        self.assertEqual(response.data['code'], 400)
+
+        job = JobService.run_next()
+        self.assertEqual(job.status, 'succeeded')
+
+        response = self.client.get(f'/api/v1/auth/jobs/{job_id}/')
+        data = response.data['data']
+        self.assertEqual((data['progress_done'], data['progress_total'], data['progress_percent']), (2, 2, 100))
+        self.assertEqual(data['result']['stock_in_no'], 'RK001')
+
+        stock_in.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((stock_in.status, order.status), ('confirmed', 'completed'))
+        self.assertEqual(Inventory.objects.filter(warehouse=self.warehouse, quantity=5).count(), 2)
+
+    def test_sale_confirm_job_resumes(self):
+        """测试销售出库后台任务中断后续跑，只出库剩余数量"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_in(self.goods2, self.warehouse, Decimal('10'))
+        customer = Customer.objects.create(code='C001', name='测试客户', tax_no='TAX001', address='测试地址')
+        response = self.client.post('/api/v1/sale/orders/', {
+            'customer': customer.id,
+            'warehouse': self.warehouse.id,
+            'order_date': '2026-10-01',
+            'items': [
+                {'goods': self.goods.id, 'quantity': '4', 'price': '89.00'},
+                {'goods': self.goods2.id, 'quantity': '3', 'price': '20.00'},
+            ]
+        }, format='json')
+        order = SaleOrder.objects.get(id=response.data['data']['id'])
+
+        response = self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/?async=1')
+        job = JobService.claim()
+
+        # 模拟执行器在第一批之后中断
+        stock_out = SaleOrderService.create_stock_out(order, self.user)
+        JobService.update_params(job, stock_out_id=stock_out.id)
+        SaleOrderService.ship_items(order, stock_out, [order.items.order_by('id').first().id], self.user)
+
+        job = JobService.run(job)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result['stock_out_id'], stock_out.id)
+
+        order.refresh_from_db()
+        stock_out.refresh_from_db()
+        self.assertEqual(order.status, 'completed')
+        self.assertEqual((stock_out.status, stock_out.total_amount), ('confirmed', Decimal('416.00')))
+        self.assertEqual(stock_out.items.count(), 2)
+        self.assertEqual(
+            list(Inventory.objects.filter(warehouse=self.warehouse).order_by('goods_id').values_list(
+                'quantity', 'reserved_quantity')),
+            [(Decimal('6'), Decimal('0')), (Decimal('7'), Decimal('0'))]
+        )
+        self.assertFalse(SaleItem.objects.filter(order=order, shipped_quantity=0).exists())
+
+    def test_active_job_blocks_update_and_delete(self):
+        """测试单据有未结束的后台任务时拒绝修改和删除，重复提交返回同一任务"""
+        stock_in = StockIn.objects.create(order_no='RK001', warehouse=self.warehouse)
+        job = JobService.enqueue('inventory.confirm_stock_in', {'stock_in_id': stock_in.id},
+                                 object_key=f'StockIn:{stock_in.id}', created_by=self.user)
+        again = JobService.enqueue('inventory.confirm_stock_in', {'stock_in_id': stock_in.id},
+                                   object_key=f'StockIn:{stock_in.id}', created_by=self.user)
+        self.assertEqual(again.id, job.id)
+
+        response = self.client.patch(f'/api/v1/inventory/stock-in/{stock_in.id}/', {'remark': '改'}, format='json')
+        self.assertEqual((response.status_code, response.data['code']), (409, 409))
+        response = self.client.delete(f'/api/v1/inventory/stock-in/{stock_in.id}/')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(StockIn.objects.filter(id=stock_in.id).exists())
+
+        job = JobService.run_next()
+        self.assertEqual((job.status, BackgroundJob.objects.get(id=job.id).active_key), ('failed', None))
+        response = self.client.delete(f'/api/v1/inventory/stock-in/{stock_in.id}/')
+        self.assertEqual(response.data['code'], 200)
+
+    def test_failed_job_draft_reused(self):
+        """测试重新提交的后台出库任务复用失败任务遗留的草稿出库单"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        customer = Customer.objects.create(code='C001', name='测试客户', tax_no='TAX001', address='测试地址')
+        response = self.client.post('/api/v1/sale/orders/', {
+            'customer': customer.id,
+            'warehouse': self.warehouse.id,
+            'order_date': '2026-10-01',
+            'items': [{'goods': self.goods.id, 'quantity': '4', 'price': '89.00'}]
+        }, format='json')
+        order = SaleOrder.objects.get(id=response.data['data']['id'])
+
+        self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/?async=1')
+        job = JobService.claim()
+        orphan = SaleOrderService.create_stock_out(order, self.user)
+        JobService.update_params(job, stock_out_id=orphan.id)
+        type(job).objects.filter(id=job.id).update(status='failed', active_key=None)
+
+        self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/?async=1')
+        job = JobService.run_next()
+        self.assertEqual((job.status, job.result['stock_out_id']), ('succeeded', orphan.id))
+        self.assertEqual(StockOut.objects.filter(sale_order=order).count(), 1)
+
+    def test_sync_confirm_after_failed_job(self):
+        """测试后台出库中途失败后，同步确认续用遗留的草稿出库单，不拆成两张出库单"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_in(self.goods2, self.warehouse, Decimal('10'))
+        customer = Customer.objects.create(code='C001', name='测试客户', tax_no='TAX001', address='测试地址')
+        response = self.client.post('/api/v1/sale/orders/', {
+            'customer': customer.id,
+            'warehouse': self.warehouse.id,
+            'order_date': '2026-10-01',
+            'items': [
+                {'goods': self.goods.id, 'quantity': '4', 'price': '89.00'},
+                {'goods': self.goods2.id, 'quantity': '3', 'price': '20.00'},
+            ]
+        }, format='json')
+        order = SaleOrder.objects.get(id=response.data['data']['id'])
+
+        ship_items = SaleOrderService.ship_items
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise ValueError('模拟中途失败')
+            return ship_items(*args, **kwargs)
+
+        self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/?async=1')
+        with mock.patch.object(SaleOrderService, 'ship_items', side_effect=fail_second_chunk):
+            job = JobService.run_next()
+        self.assertEqual(job.status, 'failed')
+        draft = StockOut.objects.get(sale_order=order)
+        self.assertEqual((draft.status, draft.items.count()), ('draft', 1))
+
+        response = self.client.post(f'/api/v1/sale/orders/{order.id}/confirm/')
+        self.assertEqual(response.data['data']['stock_out_id'], draft.id)
+        draft.refresh_from_db()
+        self.assertEqual((draft.status, draft.items.count(), draft.total_amount), ('confirmed', 2, Decimal('416.00')))
+        self.assertEqual(StockOut.objects.filter(sale_order=order).count(), 1)
+        self.assertFalse(SaleItem.objects.filter(order=order, shipped_quantity=0).exists())
+        self.assertEqual(
+            list(Inventory.objects.filter(warehouse=self.warehouse).order_by('goods_id').values_list('quantity', flat=True)),
+            [Decimal('6'), Decimal('7')]
+        )
@@ -4,16 +4,17 @@ from rest_framework.response import Response
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from .models import SaleOrder, SaleItem
+from .services import SaleOrderService
 from .serializers import (
     SaleOrderSerializer, SaleOrderCreateSerializer, 
     SaleItemSerializer
 )
-from utils.views import BaseModelViewSet
+from utils.views import BaseModelViewSet, is_async_request
 from utils.order_no import generate_sale_order_no
 from inventory.services import InventoryService
-from inventory.models import StockOut, StockOutItem
+from reports.services import RollupService
 from system.permissions import ModulePermission
-from django.utils import timezone
+from system.services import JobService, OutboxService
 
 
 class SaleOrderViewSet(BaseModelViewSet):
@@ -25,6 +26,7 @@ class SaleOrderViewSet(BaseModelViewSet):
     filterset_fields = ['customer', 'warehouse', 'status']
     search_fields = ['order_no']
     module_name = '销售订单'
+    job_object_type = 'SaleOrder'
 
     def get_serializer_class(self):
         """根据动作选择序列化器"""
@@ -35,6 +37,56 @@ class SaleOrderViewSet(BaseModelViewSet):
     def perform_create(self, serializer):
         """创建销售单时设置创建人"""
         serializer.save(created_by=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """修改已完成的销售单时，先移出日汇总，保存后按新的表头重新计入"""
+        was_completed = serializer.instance.status == 'completed'
+        if was_completed:
+            RollupService.apply_order(serializer.instance, sign=-1)
+        sale_order = serializer.save()
+        RollupService.sync_order(sale_order, was_completed=False)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """删除销售单时释放未出库数量的库存预留，已完成的销售单移出日汇总"""
+        if instance.status in SaleOrder.RESERVING_STATUSES:
+            InventoryService.release(instance.reservation_lines())
+        elif instance.status == 'completed':
+            RollupService.apply_order(instance, sign=-1)
+        instance.delete()
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """取消销售单，释放未出库数量的库存预留"""
+        sale_order = self.get_object()
+        
+        if sale_order.status not in SaleOrder.RESERVING_STATUSES:
+            return Response({
+                'code': 400,
+                'msg': '该销售单状态不允许取消，只有待出库或部分出库状态才能取消',
+                'data': None
+            })
+        
+        if JobService.active_job(f'SaleOrder:{sale_order.id}') is not None:
+            return Response({
+                'code': 400,
+                'msg': '该销售单正在后台出库中，不能取消',
+                'data': None
+            })
+        
+        with transaction.atomic():
+            InventoryService.release(sale_order.reservation_lines())
+            sale_order.status = 'cancelled'
+            sale_order.save()
+            OutboxService.publish_status_change(sale_order, 'sale_order.cancelled')
+        
+        self.log_action(request, 'update', f'取消销售单: {sale_order.order_no}')
+        return Response({
+            'code': 200,
+            'msg': '取消成功',
+            'data': None
+        })
     
     @action(detail=False, methods=['get'], url_path='by-no/(?P<order_no>[^/.]+)')
     def by_no(self, request, order_no=None):
@@ -59,55 +111,28 @@ class SaleOrderViewSet(BaseModelViewSet):
                 'data': None
             })
         
+        if JobService.active_job(f'SaleOrder:{sale_order.id}') is not None:
+            return Response({
+                'code': 400,
+                'msg': '该销售单正在后台出库中，请稍后查看结果',
+                'data': None
+            })
+        
+        if is_async_request(request):
+            job = JobService.enqueue(
+                'sale.confirm_sale_order', {'sale_order_id': sale_order.id},
+                object_key=f'SaleOrder:{sale_order.id}', created_by=request.user
+            )
+            self.log_action(request, 'confirm', f'提交后台确认出库单: {sale_order.order_no}')
+            return Response({
+                'code': 200,
+                'msg': '已提交后台处理',
+                'data': {'job_id': job.id}
+            })
+        
         try:
             with transaction.atomic():
-                stock_out = StockOut.objects.create(
-                    order_no=f'SO{timezone.now().strftime("%Y%m%d%H%M%S")}',
-                    sale_order=sale_order,
-                    warehouse=sale_order.warehouse,
-                    total_amount=0,
-                    status='confirmed',
-                    created_by=request.user,
-                    confirmed_at=timezone.now()
-                )
-                
-                total_amount = 0
-                for item in sale_order.items.all():
-                    shipped_qty = item.quantity - item.shipped_quantity
-                    if shipped_qty > 0:
-                        InventoryService.stock_out(
-                            goods=item.goods,
-                            warehouse=sale_order.warehouse,
-                            quantity=shipped_qty,
-                            related_order=sale_order,
-                            remark=f'销售出库 - {sale_order.order_no}',
-                            created_by=request.user
-                        )
-                        item.shipped_quantity = item.quantity
-                        item.save()
-                        
-                        StockOutItem.objects.create(
-                            stock_out=stock_out,
-                            goods=item.goods,
-                            quantity=shipped_qty,
-                            price=item.price,
-                            amount=shipped_qty * item.price
-                        )
-                        total_amount += shipped_qty * item.price
-                
-                stock_out.total_amount = total_amount
-                stock_out.save()
-                
-                all_shipped = all(
-                    item.shipped_quantity >= item.quantity 
-                    for item in sale_order.items.all()
-                )
-                
-                if all_shipped:
-                    sale_order.status = 'completed'
-                else:
-                    sale_order.status = 'partial'
-                sale_order.save()
+                stock_out = SaleOrderService.confirm(sale_order, created_by=request.user)
                 
                 self.log_action(request, 'confirm', f'确认出库单: {sale_order.order_no}')
                 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Log
+from .models import User, Log, OutboxEvent, BackgroundJob
 
 
 @admin.register(User)
@@ -19,3 +19,17 @@ class LogAdmin(admin.ModelAdmin):
     list_filter = ['action', 'module', 'created_at']
     search_fields = ['user__username', 'detail']
     readonly_fields = ['created_at']
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'aggregate_type', 'aggregate_id', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['event_type']
+    readonly_fields = ['created_at', 'processed_at']
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'job_type', 'object_key', 'status', 'progress_done', 'progress_total', 'created_at']
+    list_filter = ['job_type', 'status']
+    readonly_fields = ['created_at']
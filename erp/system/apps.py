@@ -1,7 +1,14 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class SystemConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'system'
     verbose_name = '系统管理'
+
+    def ready(self):
+        # 加载各应用 outbox_handlers.py 中注册的发件箱事件处理函数
+        autodiscover_modules('outbox_handlers')
+        # 加载各应用 jobs.py 中注册的后台任务处理函数
+        autodiscover_modules('jobs')
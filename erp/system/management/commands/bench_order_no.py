@@ -0,0 +1,79 @@
+"""
+单号分配并发压测命令
+多线程并发分配单号，对比不同号段长度下的吞吐量，并校验没有重复单号
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from system.models import DocumentSequence
+from utils.order_no import next_sequence
+
+
+class Command(BaseCommand):
+    help = '单号分配并发压测（校验无重复并输出 ops/sec）'
+
+    PREFIX = 'BN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+        parser.add_argument('--ops', type=int, default=500, help='每个线程分配的单号数')
+        parser.add_argument('--block-sizes', default='1,20,100', help='参与对比的号段长度，逗号分隔（1 即每个单号访问一次序列表）')
+
+    def handle(self, *args, **options):
+        block_sizes = [int(size) for size in options['block_sizes'].split(',') if size.strip()]
+        seq_date = timezone.localdate()
+        for block_size in block_sizes:
+            # 每轮使用不同的前缀，避免复用上一轮进程内剩余的号段
+            prefix = f'{self.PREFIX}{block_size}'[:10]
+            DocumentSequence.objects.filter(prefix=prefix, seq_date=seq_date).delete()
+            try:
+                self.run_round(prefix, block_size, seq_date, options['threads'], options['ops'])
+            finally:
+                DocumentSequence.objects.filter(prefix=prefix, seq_date=seq_date).delete()
+
+    def run_round(self, prefix, block_size, seq_date, threads, ops):
+        """以指定号段长度执行一轮并发分配"""
+
+        allocated = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            values = []
+            try:
+                for _ in range(ops):
+                    values.append(next_sequence(prefix, seq_date, block_size=block_size))
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            finally:
+                with lock:
+                    allocated.extend(values)
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        duplicates = len(allocated) - len(set(allocated))
+        last_value = DocumentSequence.objects.filter(
+            prefix=prefix, seq_date=seq_date
+        ).values_list('last_value', flat=True).first() or 0
+
+        self.stdout.write(f'[号段={block_size}] 线程数={threads} 分配={len(allocated)} 失败={len(errors)} '
+                          f'耗时={elapsed:.3f}s 吞吐={len(allocated) / elapsed if elapsed else 0:.1f} ops/sec '
+                          f'序列表租用={-(-last_value // block_size)} 次')
+        if duplicates:
+            self.stdout.write(self.style.ERROR(f'[号段={block_size}] 检测到重复单号 {duplicates} 个'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'[号段={block_size}] 无重复单号'))
+        if errors:
+            self.stdout.write(self.style.WARNING(f'[号段={block_size}] 首个错误: {errors[0]}'))
@@ -0,0 +1,43 @@
+"""
+发件箱事件分发命令
+批量读取未处理的发件箱事件并调用已注册的处理函数，可单次运行或常驻轮询（可多进程同时运行）
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from system.services import OutboxService
+
+
+class Command(BaseCommand):
+    help = '分发发件箱事件（至少一次投递）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批读取的事件数')
+        parser.add_argument('--loop', action='store_true', help='常驻运行，持续轮询新事件')
+        parser.add_argument('--interval', type=float, default=1.0, help='常驻运行时无新事件的轮询间隔（秒）')
+        parser.add_argument('--purge-days', type=int, help='分发结束后删除已处理且早于该天数的事件')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            result = OutboxService.dispatch(batch_size=options['batch_size'])
+            processed = result['dispatched'] + result['skipped']
+            total += processed
+            if processed or result['failed']:
+                self.stdout.write(
+                    f'分发 {result["dispatched"]} 条，失败 {result["failed"]} 条，跳过 {result["skipped"]} 条，'
+                    f'处理到事件 {result["last_event_id"]}'
+                )
+
+            if processed >= options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        if options['purge_days'] is not None:
+            deleted = OutboxService.purge(options['purge_days'])
+            self.stdout.write(f'已清理 {deleted} 条已处理事件')
+
+        self.stdout.write(self.style.SUCCESS(f'分发完成，共处理 {total} 条事件'))
@@ -0,0 +1,41 @@
+"""
+后台任务执行命令
+从数据库任务队列领取任务并执行，可单次运行或常驻轮询，无需外部消息队列
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from system.services import JobService
+
+
+class Command(BaseCommand):
+    help = '执行后台任务队列中的任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='常驻运行，持续轮询新任务')
+        parser.add_argument('--interval', type=float, default=2.0, help='常驻运行时无新任务的轮询间隔（秒）')
+        parser.add_argument('--max-jobs', type=int, help='最多执行的任务数，达到后退出')
+
+    def handle(self, *args, **options):
+        requeued, failed = JobService.requeue_stale()
+        if requeued or failed:
+            self.stdout.write(f'回收中断任务：重新排队 {requeued} 个，标记失败 {failed} 个')
+
+        executed = 0
+        while options['max_jobs'] is None or executed < options['max_jobs']:
+            job = JobService.run_next()
+            if job is None:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+                JobService.requeue_stale()
+                continue
+
+            executed += 1
+            if job.status == 'succeeded':
+                self.stdout.write(f'任务 #{job.id} {job.job_type} 执行完成')
+            else:
+                self.stdout.write(self.style.ERROR(f'任务 #{job.id} {job.job_type} 执行失败: {job.error}'))
+
+        self.stdout.write(self.style.SUCCESS(f'共执行 {executed} 个任务'))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0005_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['created_at', 'id'], name='sys_log_created_4986ac_idx'),
+        ),
+    ]
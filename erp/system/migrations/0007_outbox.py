@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0006_log_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='分发器名称')),
+                ('last_event_id', models.BigIntegerField(default=0, verbose_name='已处理事件ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '发件箱游标',
+                'verbose_name_plural': '发件箱游标',
+                'db_table': 'sys_outbox_cursor',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=64, verbose_name='事件类型')),
+                ('aggregate_type', models.CharField(blank=True, default='', max_length=50, verbose_name='业务对象类型')),
+                ('aggregate_id', models.BigIntegerField(blank=True, null=True, verbose_name='业务对象ID')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='事件数据')),
+                ('attempts', models.IntegerField(default=0, verbose_name='失败次数')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='最近错误')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '发件箱事件',
+                'verbose_name_plural': '发件箱事件',
+                'db_table': 'sys_outbox_event',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['event_type', 'id'], name='sys_outbox__event_t_4f1eb3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['created_at'], name='sys_outbox__created_9931a0_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-18 12:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0007_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_type', models.CharField(max_length=64, verbose_name='任务类型')),
+                ('object_key', models.CharField(blank=True, default='', max_length=64, verbose_name='关联对象')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='任务参数')),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '执行中'), ('succeeded', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('progress_done', models.IntegerField(default=0, verbose_name='已处理数')),
+                ('progress_total', models.IntegerField(default=0, verbose_name='总数')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='执行结果')),
+                ('error', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('attempts', models.IntegerField(default=0, verbose_name='执行次数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='提交时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='心跳时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='提交人')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'db_table': 'sys_job',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='backgroundjob',
+            index=models.Index(fields=['status', 'id'], name='sys_job_status_ede378_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='backgroundjob',
+            index=models.Index(fields=['object_key', 'status'], name='sys_job_object__725799_idx'),
+        ),
+    ]
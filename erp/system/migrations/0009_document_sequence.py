@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0008_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, verbose_name='单号前缀')),
+                ('seq_date', models.DateField(verbose_name='日期')),
+                ('last_value', models.BigIntegerField(default=0, verbose_name='已分配最大序号')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '单据编号序列',
+                'verbose_name_plural': '单据编号序列',
+                'db_table': 'sys_document_sequence',
+                'unique_together': {('prefix', 'seq_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 13:16
+
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+
+
+def mark_dispatched_events(apps, schema_editor):
+    """游标已越过的事件标记为已处理（多个游标时取最小值，未确定是否处理过的事件会再分发一次）"""
+    OutboxCursor = apps.get_model('system', 'OutboxCursor')
+    OutboxEvent = apps.get_model('system', 'OutboxEvent')
+
+    min_cursor = OutboxCursor.objects.aggregate(min_id=Min('last_event_id'))['min_id']
+    if min_cursor:
+        OutboxEvent.objects.filter(id__lte=min_cursor).update(processed_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0010_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='处理时间'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['processed_at', 'id'], name='sys_outbox__process_d10362_idx'),
+        ),
+        migrations.RunPython(mark_dispatched_events, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='OutboxCursor',
+        ),
+    ]
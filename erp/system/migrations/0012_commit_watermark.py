@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0011_outbox_processed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommitWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='序列名称')),
+                ('committed_id', models.BigIntegerField(default=0, verbose_name='提交水位')),
+                ('gap_start', models.BigIntegerField(blank=True, null=True, verbose_name='空号起点')),
+                ('gap_end', models.BigIntegerField(blank=True, null=True, verbose_name='空号终点')),
+                ('gap_seen_at', models.DateTimeField(blank=True, null=True, verbose_name='空号发现时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '提交水位',
+                'verbose_name_plural': '提交水位',
+                'db_table': 'sys_commit_watermark',
+            },
+        ),
+    ]
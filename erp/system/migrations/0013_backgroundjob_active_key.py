@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+def fill_active_keys(apps, schema_editor):
+    """未结束的任务按关联对象回填 active_key（同一对象有多个未结束任务时只回填最早的一个）"""
+    BackgroundJob = apps.get_model('system', 'BackgroundJob')
+
+    seen = set()
+    jobs = BackgroundJob.objects.filter(status__in=('pending', 'running')).exclude(object_key='').order_by('id')
+    for job_id, object_key in jobs.values_list('id', 'object_key'):
+        if object_key in seen:
+            continue
+        seen.add(object_key)
+        BackgroundJob.objects.filter(id=job_id).update(active_key=object_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0012_commit_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='active_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='未结束任务关联对象'),
+        ),
+        migrations.RunPython(fill_active_keys, migrations.RunPython.noop),
+    ]
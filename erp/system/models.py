@@ -94,6 +94,114 @@ class Log(models.Model):
         verbose_name = '操作日志'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def __str__(self):
         return f'{self.user} - {self.action} - {self.created_at}'
+
+
+class OutboxEvent(models.Model):
+    """事务性发件箱事件（与库存变动、单据状态变更在同一事务内写入，由 dispatch_outbox 命令异步分发）"""
+    event_type = models.CharField(max_length=64, verbose_name='事件类型')
+    aggregate_type = models.CharField(max_length=50, blank=True, default='', verbose_name='业务对象类型')
+    aggregate_id = models.BigIntegerField(null=True, blank=True, verbose_name='业务对象ID')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='事件数据')
+    attempts = models.IntegerField(default=0, verbose_name='失败次数')
+    last_error = models.TextField(blank=True, default='', verbose_name='最近错误')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='处理时间')
+
+    class Meta:
+        db_table = 'sys_outbox_event'
+        verbose_name = '发件箱事件'
+        verbose_name_plural = verbose_name
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['event_type', 'id']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['processed_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f'{self.id} {self.event_type}'
+
+
+class BackgroundJob(models.Model):
+    """后台任务（数据库任务队列，由 run_jobs 命令执行）"""
+    STATUS_CHOICES = [
+        ('pending', '排队中'),
+        ('running', '执行中'),
+        ('succeeded', '已完成'),
+        ('failed', '失败'),
+    ]
+    ACTIVE_STATUSES = ('pending', 'running')
+
+    job_type = models.CharField(max_length=64, verbose_name='任务类型')
+    object_key = models.CharField(max_length=64, blank=True, default='', verbose_name='关联对象')
+    # 排队中/执行中时等于 object_key，结束后置空；唯一约束保证同一关联对象只有一个未结束的任务
+    active_key = models.CharField(max_length=64, null=True, blank=True, unique=True, verbose_name='未结束任务关联对象')
+    params = models.JSONField(default=dict, blank=True, verbose_name='任务参数')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='状态')
+    progress_done = models.IntegerField(default=0, verbose_name='已处理数')
+    progress_total = models.IntegerField(default=0, verbose_name='总数')
+    result = models.JSONField(null=True, blank=True, verbose_name='执行结果')
+    error = models.TextField(blank=True, default='', verbose_name='错误信息')
+    attempts = models.IntegerField(default=0, verbose_name='执行次数')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='提交人')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='提交时间')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='心跳时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='结束时间')
+
+    class Meta:
+        db_table = 'sys_job'
+        verbose_name = '后台任务'
+        verbose_name_plural = verbose_name
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['object_key', 'status']),
+        ]
+
+    def __str__(self):
+        return f'{self.id} {self.job_type}'
+
+
+class DocumentSequence(models.Model):
+    """单据编号序列（按 前缀 + 日期 计数，各进程按号段租用后在内存中分配）"""
+    prefix = models.CharField(max_length=10, verbose_name='单号前缀')
+    seq_date = models.DateField(verbose_name='日期')
+    last_value = models.BigIntegerField(default=0, verbose_name='已分配最大序号')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'sys_document_sequence'
+        verbose_name = '单据编号序列'
+        verbose_name_plural = verbose_name
+        unique_together = ['prefix', 'seq_date']
+
+    def __str__(self):
+        return f'{self.prefix}{self.seq_date:%Y%m%d}: {self.last_value}'
+
+
+class CommitWatermark(models.Model):
+    """
+    自增ID提交水位：不大于 committed_id 的ID均已提交可见，或已确认为事务回滚留下的空号。
+    水位之后第一段空号记录首次发现的时间，超过 COMMIT_GAP_TIMEOUT_SECONDS 仍未出现才视为回滚而越过
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name='序列名称')
+    committed_id = models.BigIntegerField(default=0, verbose_name='提交水位')
+    gap_start = models.BigIntegerField(null=True, blank=True, verbose_name='空号起点')
+    gap_end = models.BigIntegerField(null=True, blank=True, verbose_name='空号终点')
+    gap_seen_at = models.DateTimeField(null=True, blank=True, verbose_name='空号发现时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'sys_commit_watermark'
+        verbose_name = '提交水位'
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f'{self.name}: {self.committed_id}'
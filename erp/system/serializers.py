@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import Log
+from .models import Log, BackgroundJob
 
 User = get_user_model()
 
@@ -212,6 +212,26 @@ class LogSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class BackgroundJobSerializer(serializers.ModelSerializer):
+    """后台任务序列化器"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress_percent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BackgroundJob
+        fields = ['id', 'job_type', 'object_key', 'status', 'status_display', 'progress_done', 'progress_total',
+                  'progress_percent', 'result', 'error', 'attempts', 'created_by', 'created_at', 'started_at',
+                  'finished_at']
+        read_only_fields = fields
+
+    def get_progress_percent(self, obj):
+        if obj.status == 'succeeded':
+            return 100
+        if not obj.progress_total:
+            return 0
+        return min(100, obj.progress_done * 100 // obj.progress_total)
+
+
 class ResetPasswordSerializer(serializers.Serializer):
     """重置密码序列化器"""
     new_password = serializers.CharField(min_length=6, max_length=50)
@@ -0,0 +1,333 @@
+"""
+系统基础服务模块
+- OutboxService：事务性发件箱。业务事务内调用 publish 写入事件，dispatch_outbox 命令批量读取未处理的事件
+  并调用已注册的处理函数，处理后逐条标记（至少一次投递）。各应用在 outbox_handlers.py 中注册处理函数，启动时自动加载。
+- JobService：数据库后台任务队列。接口调用 enqueue 提交任务，run_jobs 命令领取并执行，
+  任务执行过程中上报进度。各应用在 jobs.py 中注册任务处理函数，启动时自动加载。
+- CommitWatermarkService：自增ID的提交水位。按ID增量处理流水的任务（库存校验检查点、FIFO 成本）
+  只处理到水位为止，ID较小但提交较晚的事务写入的行不会被越过。
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxService:
+    """事务性发件箱服务"""
+
+    # {事件类型: [处理函数]}，'*' 表示接收全部事件
+    handlers = {}
+
+    @staticmethod
+    def register(event_type):
+        """
+        注册事件处理函数的装饰器
+        处理函数签名为 handler(event)，可能被重复调用，需保证幂等
+        """
+        def decorator(func):
+            registered = OutboxService.handlers.setdefault(event_type, [])
+            if func not in registered:
+                registered.append(func)
+            return func
+        return decorator
+
+    @staticmethod
+    def handlers_for(event_type):
+        """获取事件对应的处理函数"""
+        return OutboxService.handlers.get(event_type, []) + OutboxService.handlers.get('*', [])
+
+    @staticmethod
+    def publish(event_type, aggregate=None, payload=None):
+        """
+        写入发件箱事件，应在业务事务内调用，与业务数据一同提交或回滚
+        :param event_type: 事件类型，如 inventory.stock_moved、stock_in.confirmed
+        :param aggregate: 关联业务对象（单据等）
+        :param payload: 事件数据（可 JSON 序列化）
+        """
+        from system.models import OutboxEvent
+
+        return OutboxEvent.objects.create(
+            event_type=event_type,
+            aggregate_type=aggregate.__class__.__name__ if aggregate is not None else '',
+            aggregate_id=aggregate.pk if aggregate is not None else None,
+            payload=payload or {}
+        )
+
+    @staticmethod
+    def publish_status_change(order, event_type, **payload):
+        """写入单据状态变更事件（附带单号与当前状态）"""
+        payload.setdefault('order_no', getattr(order, 'order_no', ''))
+        payload.setdefault('status', getattr(order, 'status', ''))
+        return OutboxService.publish(event_type, aggregate=order, payload=payload)
+
+    @staticmethod
+    def dispatch(batch_size=200, max_attempts=None):
+        """
+        分发一批未处理的事件
+        按事件ID顺序读取 processed_at 为空的事件并加锁（SKIP LOCKED，多个分发进程各取不同的事件）；
+        每个事件的处理函数在独立保存点内执行，处理函数的数据库写入与事件的处理标记一同提交。
+        事件按是否已处理逐条标记，不依赖ID游标：ID较小但提交较晚的事务写入的事件，提交后仍会被分发。
+        处理失败时停在该事件，下次重试，超过最大失败次数后标记为已处理（跳过）并保留错误信息。
+        :return: {'dispatched': 成功数, 'failed': 失败数, 'skipped': 跳过数, 'last_event_id': 本批最后处理的事件ID}
+        """
+        from system.models import OutboxEvent
+
+        if max_attempts is None:
+            max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+
+        result = {'dispatched': 0, 'failed': 0, 'skipped': 0, 'last_event_id': None}
+        with transaction.atomic():
+            events = OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                processed_at__isnull=True
+            ).order_by('id')[:batch_size]
+
+            processed_ids = []
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        for handler in OutboxService.handlers_for(event.event_type):
+                            handler(event)
+                except Exception as e:
+                    logger.exception(f'发件箱事件处理失败: {event.id} {event.event_type}')
+                    event.attempts += 1
+                    event.last_error = str(e)[:2000]
+                    event.save(update_fields=['attempts', 'last_error'])
+                    if event.attempts < max_attempts:
+                        result['failed'] += 1
+                        break
+                    result['skipped'] += 1
+                else:
+                    result['dispatched'] += 1
+                processed_ids.append(event.id)
+
+            if processed_ids:
+                OutboxEvent.objects.filter(id__in=processed_ids).update(processed_at=timezone.now())
+                result['last_event_id'] = processed_ids[-1]
+
+        return result
+
+    @staticmethod
+    def purge(days):
+        """
+        删除已处理且处理时间早于指定天数的事件
+        :return: 删除的事件数
+        """
+        from system.models import OutboxEvent
+
+        deleted, _ = OutboxEvent.objects.filter(
+            processed_at__lt=timezone.now() - timedelta(days=days)
+        ).delete()
+        return deleted
+
+
+class JobService:
+    """后台任务服务"""
+
+    # {任务类型: 处理函数}，处理函数签名为 handler(job, progress)，返回可 JSON 序列化的结果
+    handlers = {}
+
+    @staticmethod
+    def register(job_type):
+        """注册任务处理函数的装饰器"""
+        def decorator(func):
+            JobService.handlers[job_type] = func
+            return func
+        return decorator
+
+    @staticmethod
+    def active_job(object_key):
+        """获取关联对象上排队中或执行中的任务"""
+        from system.models import BackgroundJob
+
+        if not object_key:
+            return None
+        return BackgroundJob.objects.filter(
+            object_key=object_key, status__in=BackgroundJob.ACTIVE_STATUSES
+        ).order_by('id').first()
+
+    @staticmethod
+    def enqueue(job_type, params=None, object_key='', created_by=None):
+        """
+        提交后台任务；关联对象已有未结束的任务时直接返回该任务（由 active_key 唯一约束保证，并发提交只会插入一条）
+        :param job_type: 任务类型
+        :param params: 任务参数（可 JSON 序列化）
+        :param object_key: 关联对象标识，如 StockIn:12
+        :param created_by: 提交人
+        """
+        from system.models import BackgroundJob
+
+        if job_type not in JobService.handlers:
+            raise ValueError(f'未注册的任务类型：{job_type}')
+
+        try:
+            with transaction.atomic():
+                return BackgroundJob.objects.create(
+                    job_type=job_type,
+                    object_key=object_key,
+                    active_key=object_key or None,
+                    params=params or {},
+                    created_by=created_by
+                )
+        except IntegrityError:
+            existing = JobService.active_job(object_key)
+            if existing is None:
+                raise
+            return existing
+
+    @staticmethod
+    def update_params(job, **values):
+        """保存任务中间状态（用于中断后续跑）"""
+        from system.models import BackgroundJob
+
+        job.params = {**job.params, **values}
+        BackgroundJob.objects.filter(id=job.id).update(params=job.params)
+
+    @staticmethod
+    def claim():
+        """
+        领取最早的排队任务：按状态条件 UPDATE 抢占，多个执行器并发领取时只有一个成功
+        :return: 任务对象或 None
+        """
+        from django.db.models import F
+        from system.models import BackgroundJob
+
+        candidates = BackgroundJob.objects.filter(status='pending').order_by('id').values_list('id', flat=True)[:10]
+        for job_id in candidates:
+            now = timezone.now()
+            claimed = BackgroundJob.objects.filter(id=job_id, status='pending').update(
+                status='running', started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+            )
+            if claimed:
+                return BackgroundJob.objects.get(id=job_id)
+        return None
+
+    @staticmethod
+    def requeue_stale(stale_seconds=None, max_attempts=None):
+        """
+        回收执行器中断遗留的任务：心跳超时的执行中任务重新排队，超过最大执行次数的标记失败
+        :return: (重新排队数, 标记失败数)
+        """
+        from system.models import BackgroundJob
+
+        if stale_seconds is None:
+            stale_seconds = settings.JOB_STALE_SECONDS
+        if max_attempts is None:
+            max_attempts = settings.JOB_MAX_ATTEMPTS
+
+        stale = BackgroundJob.objects.filter(
+            status='running', heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_seconds)
+        )
+        failed = stale.filter(attempts__gte=max_attempts).update(
+            status='failed', active_key=None, error='执行器中断且超过最大执行次数', finished_at=timezone.now()
+        )
+        requeued = stale.update(status='pending')
+        return requeued, failed
+
+    @staticmethod
+    def run(job):
+        """执行已领取的任务，记录进度、结果或错误"""
+        from system.models import BackgroundJob
+
+        def progress(done, total):
+            job.progress_done, job.progress_total = done, total
+            BackgroundJob.objects.filter(id=job.id).update(
+                progress_done=done, progress_total=total, heartbeat_at=timezone.now()
+            )
+
+        handler = JobService.handlers.get(job.job_type)
+        try:
+            if handler is None:
+                raise ValueError(f'未注册的任务类型：{job.job_type}')
+            result = handler(job, progress)
+        except Exception as e:
+            if not isinstance(e, ValueError):
+                logger.exception(f'后台任务执行失败: {job.id} {job.job_type}')
+            job.status = 'failed'
+            job.error = str(e)[:2000]
+        else:
+            job.status = 'succeeded'
+            job.result = result
+        job.finished_at = timezone.now()
+        BackgroundJob.objects.filter(id=job.id).update(
+            status=job.status, active_key=None, result=job.result, error=job.error, finished_at=job.finished_at
+        )
+        return job
+
+    @staticmethod
+    def run_next():
+        """领取并执行一个任务，没有排队任务时返回 None"""
+        job = JobService.claim()
+        if job is None:
+            return None
+        return JobService.run(job)
+
+
+class CommitWatermarkService:
+    """自增ID提交水位服务"""
+
+    @staticmethod
+    def _visible_ids(models, after_id, limit):
+        """
+        读取多张共享同一ID序列的表中大于 after_id 的ID（升序）
+        某张表取满 limit 行时，只返回不超过其最后一个ID的部分，保证返回范围内各表的ID都已读到
+        """
+        ids = []
+        bound = None
+        for model in models:
+            rows = list(model.objects.filter(id__gt=after_id).order_by('id').values_list('id', flat=True)[:limit])
+            ids.extend(rows)
+            if len(rows) == limit:
+                bound = rows[-1] if bound is None else min(bound, rows[-1])
+        ids = sorted(set(ids))
+        if bound is not None:
+            ids = [pk for pk in ids if pk <= bound]
+        return ids, bound is not None
+
+    @staticmethod
+    def advance(name, models, gap_timeout=None, scan_size=5000):
+        """
+        推进提交水位：从当前水位起按ID顺序扫描已可见的行，遇到空号时停止。
+        空号可能属于尚未提交的事务，首次发现时记录时间，超过 gap_timeout 秒仍未出现才视为回滚并越过
+        :param name: 序列名称
+        :param models: 共享同一ID序列的模型（如在线流水表与归档表）
+        :param gap_timeout: 空号等待秒数，默认 COMMIT_GAP_TIMEOUT_SECONDS
+        :return: 新的提交水位
+        """
+        from system.models import CommitWatermark
+
+        if gap_timeout is None:
+            gap_timeout = settings.COMMIT_GAP_TIMEOUT_SECONDS
+
+        with transaction.atomic():
+            CommitWatermark.objects.get_or_create(name=name)
+            mark = CommitWatermark.objects.select_for_update().get(name=name)
+            now = timezone.now()
+            expected = mark.committed_id + 1
+            blocked = False
+            while not blocked:
+                ids, more = CommitWatermarkService._visible_ids(models, expected - 1, scan_size)
+                for pk in ids:
+                    if pk > expected:
+                        # 已记录且超时的空号视为回滚，越过；其余空号重新计时并停在此处
+                        known = mark.gap_start is not None and mark.gap_start <= expected <= mark.gap_end
+                        if known and now - mark.gap_seen_at >= timedelta(seconds=gap_timeout):
+                            expected = min(pk, mark.gap_end + 1)
+                        if pk > expected:
+                            if not (mark.gap_start is not None and mark.gap_start <= expected <= mark.gap_end):
+                                mark.gap_start, mark.gap_end, mark.gap_seen_at = expected, pk - 1, now
+                            blocked = True
+                            break
+                    expected = pk + 1
+                if not more:
+                    break
+
+            mark.committed_id = expected - 1
+            if mark.gap_end is not None and mark.gap_end <= mark.committed_id:
+                mark.gap_start = mark.gap_end = mark.gap_seen_at = None
+            mark.save()
+        return mark.committed_id
@@ -0,0 +1,73 @@
+"""
+系统模块测试
+"""
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from decimal import Decimal
+
+from inventory.services import InventoryService
+from inventory.tests import InventoryTestMixin
+from system.models import OutboxEvent
+from system.services import OutboxService
+
+
+class OutboxDispatchTest(InventoryTestMixin, TestCase):
+    """发件箱事件写入与分发测试"""
+
+    def setUp(self):
+        super().setUp()
+        self.received = []
+        self.handlers = dict(OutboxService.handlers)
+        OutboxService.handlers = {}
+        OutboxService.register('inventory.stock_moved')(self.received.append)
+
+    def tearDown(self):
+        OutboxService.handlers = self.handlers
+
+    def test_movements_publish_events(self):
+        """测试库存变动在同一事务内写入事件，失败回滚时不写入"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        with self.assertRaises(ValueError):
+            InventoryService.stock_out(self.goods, self.warehouse, Decimal('20'))
+
+        events = list(OutboxEvent.objects.filter(event_type='inventory.stock_moved'))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].payload['lines'], [[self.goods.id, self.warehouse.id, '10']])
+
+    def test_dispatch_marks_processed_and_retries(self):
+        """测试分发后逐条标记已处理，处理失败时停留并重试"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        InventoryService.stock_out(self.goods, self.warehouse, Decimal('4'))
+
+        result = OutboxService.dispatch()
+        self.assertEqual(result['dispatched'], 2)
+        self.assertEqual(len(self.received), 2)
+        self.assertEqual(OutboxService.dispatch()['dispatched'], 0)
+
+        def failing(event):
+            raise RuntimeError('处理失败')
+
+        OutboxService.register('inventory.stock_moved')(failing)
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('1'))
+        result = OutboxService.dispatch(max_attempts=2)
+        self.assertEqual((result['dispatched'], result['failed']), (0, 1))
+        result = OutboxService.dispatch(max_attempts=2)
+        self.assertEqual(result['skipped'], 1)
+        self.assertEqual(OutboxEvent.objects.latest('id').attempts, 2)
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_late_committed_event_still_dispatched(self):
+        """测试ID较小但提交较晚的事件（创建时间也更早）在提交后仍会分发"""
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('10'))
+        late_id = OutboxEvent.objects.latest('id').id
+        OutboxEvent.objects.filter(id=late_id).delete()
+        InventoryService.stock_in(self.goods, self.warehouse, Decimal('5'))
+        self.assertEqual(OutboxService.dispatch()['dispatched'], 1)
+
+        OutboxEvent.objects.create(id=late_id, event_type='inventory.stock_moved',
+                                   created_at=timezone.now() - timedelta(minutes=10))
+        result = OutboxService.dispatch()
+        self.assertEqual((result['dispatched'], result['last_event_id']), (1, late_id))
+        self.assertEqual(len(self.received), 2)
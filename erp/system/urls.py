@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CustomTokenObtainPairView, CustomTokenRefreshView, UserInfoView, LogoutView, UserViewSet, LogViewSet
+from .views import CustomTokenObtainPairView, CustomTokenRefreshView, UserInfoView, LogoutView, UserViewSet, LogViewSet, BackgroundJobViewSet
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'logs', LogViewSet)
+router.register(r'jobs', BackgroundJobViewSet)
 
 urlpatterns = [
     path('login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
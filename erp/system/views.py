@@ -13,11 +13,12 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 
 from .serializers import (
     CustomTokenObtainPairSerializer, UserSerializer, UserCreateSerializer, 
-    UserUpdateSerializer, LogSerializer, ResetPasswordSerializer, PERMISSION_MODULES
+    UserUpdateSerializer, LogSerializer, ResetPasswordSerializer, BackgroundJobSerializer, PERMISSION_MODULES
 )
-from .models import Log
+from .models import Log, BackgroundJob
 from .permissions import IsAdminUser, IsAdminOrReadOnly, ModulePermission
 from utils.views import BaseModelViewSet
+from utils.pagination import KeysetPagination
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -295,4 +296,24 @@ class LogViewSet(BaseModelViewSet):
     search_fields = ['detail']
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
     module_name = '操作日志'
+
+
+class BackgroundJobViewSet(BaseModelViewSet):
+    """后台任务（只读，查询任务进度与结果；非管理员只能查看自己提交的任务）"""
+    queryset = BackgroundJob.objects.all()
+    serializer_class = BackgroundJobSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['job_type', 'status', 'object_key']
+    ordering_fields = ['created_at', 'id']
+    ordering = ['-id']
+    module_name = '后台任务'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.username != 'admin':
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
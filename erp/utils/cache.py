@@ -0,0 +1,32 @@
+"""
+缓存工具模块
+default 为进程内缓存，只适合各进程独立、靠过期时间收敛的数据；
+由其他进程（如发件箱分发命令）负责失效的缓存必须放在 shared 共享缓存中，否则失效只作用于分发进程自身。
+"""
+import time
+
+from django.core.cache import caches
+
+SHARED_CACHE_ALIAS = 'shared'
+
+
+def shared_cache():
+    """跨进程共享缓存（Web 进程与发件箱分发进程读写同一份数据）"""
+    return caches[SHARED_CACHE_ALIAS]
+
+
+def cache_version(key):
+    """
+    读取共享缓存中的版本号（用于带版本号的缓存键）
+    版本键不存在（首次使用或被淘汰）时以当前纳秒时间初始化，不会回到用过的旧版本而读到旧数据
+    """
+    return shared_cache().get_or_set(key, time.time_ns, None)
+
+
+def bump_cache_version(key):
+    """递增版本号使旧版本的缓存全部失效；版本键不存在时重新初始化（同样不会回到旧版本）"""
+    cache = shared_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
@@ -0,0 +1,11 @@
+"""
+日期工具模块
+"""
+from datetime import datetime, time
+
+from django.utils import timezone
+
+
+def day_start(date):
+    """指定日期当天零点（本地时区）"""
+    return timezone.make_aware(datetime.combine(date, time.min))
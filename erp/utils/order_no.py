@@ -1,76 +1,152 @@
 """
 订单号生成工具模块
+格式: 前缀 + 年月日 + 4位序号 (例如: PO202602180001)，序号超过9999时自动加宽
+
+序号由 DocumentSequence 表按 (前缀, 日期) 原子递增分配。每个进程一次租用一个号段（hi/lo），
+号段内的编号直接在内存中分配，不再每次按 LIKE 查询当日最大单号，并发创建也不会取到相同编号。
+号段在调用方事务提交后才进入内存池，事务回滚时租用一并回滚、号段作废，不会被重复使用。
+不同进程交替分配时单号不保证严格连续，进程退出时未用完的号段会留下空号。
 """
+import threading
+from collections import deque
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Length
 from django.utils import timezone
-from django.db import models
 
 
-def generate_order_no(prefix='PO', model_class=None, field_name='order_no'):
+# 各前缀对应的单据模型（首次使用某日序列时，从已有单号中取当日最大序号作为起点）
+PREFIX_MODELS = {
+    'PO': ('purchase.PurchaseOrder',),
+    'SO': ('sale.SaleOrder', 'inventory.StockOut'),
+    'SI': ('inventory.StockIn',),
+    'SA': ('inventory.StockAdjust',),
+    'ST': ('inventory.StockTransfer',),
+    'PP': ('finance.Payment',),
+    'PR': ('finance.Payment',),
+}
+
+SEQUENCE_WIDTH = 4
+
+# 进程内号段池：{(前缀, 日期): deque([[下一个序号, 号段最后一个序号], ...])}
+_blocks = {}
+_lock = threading.Lock()
+
+
+def _existing_max_seq(prefix, date_text):
+    """已有单据中当日的最大序号（只识别 前缀 + 日期 + 4位序号 格式的单号）"""
+    prefix_with_date = f'{prefix}{date_text}'
+    max_seq = 0
+    for label in PREFIX_MODELS.get(prefix, ()):
+        model = apps.get_model(label)
+        last_no = model.objects.annotate(no_length=Length('order_no')).filter(
+            order_no__startswith=prefix_with_date,
+            no_length=len(prefix_with_date) + SEQUENCE_WIDTH
+        ).aggregate(last_no=Max('order_no'))['last_no']
+        if last_no and last_no[-SEQUENCE_WIDTH:].isdigit():
+            max_seq = max(max_seq, int(last_no[-SEQUENCE_WIDTH:]))
+    return max_seq
+
+
+def lease_block(prefix, seq_date, size):
+    """
+    租用一个号段：UPDATE last_value = last_value + size 后读回（同一事务内，行锁保证并发租用不重叠）
+    :return: (号段第一个序号, 号段最后一个序号)
+    """
+    from system.models import DocumentSequence
+
+    with transaction.atomic():
+        updated = DocumentSequence.objects.filter(prefix=prefix, seq_date=seq_date).update(
+            last_value=F('last_value') + size, updated_at=timezone.now()
+        )
+        if not updated:
+            start = _existing_max_seq(prefix, seq_date.strftime('%Y%m%d'))
+            try:
+                with transaction.atomic():
+                    DocumentSequence.objects.create(prefix=prefix, seq_date=seq_date, last_value=start + size)
+            except IntegrityError:
+                # 并发请求已抢先创建该序列，退回到原子递增
+                DocumentSequence.objects.filter(prefix=prefix, seq_date=seq_date).update(
+                    last_value=F('last_value') + size, updated_at=timezone.now()
+                )
+        last_value = DocumentSequence.objects.filter(
+            prefix=prefix, seq_date=seq_date
+        ).values_list('last_value', flat=True).get()
+    return last_value - size + 1, last_value
+
+
+def next_sequence(prefix, seq_date=None, block_size=None):
+    """分配 (前缀, 日期) 的下一个序号，进程内号段用完时租用新号段"""
+    seq_date = seq_date or timezone.localdate()
+    block_size = block_size or settings.ORDER_NO_BLOCK_SIZE
+    key = (prefix, seq_date)
+
+    with _lock:
+        pool = _blocks.get(key)
+        if pool:
+            block = pool[0]
+            seq = block[0]
+            block[0] += 1
+            if block[0] > block[1]:
+                pool.popleft()
+            return seq
+
+    first, last = lease_block(prefix, seq_date, block_size)
+    if first < last:
+        def release():
+            with _lock:
+                # 丢弃过期日期的号段
+                for stale in [k for k in _blocks if k[1] != seq_date]:
+                    del _blocks[stale]
+                _blocks.setdefault(key, deque()).append([first + 1, last])
+        transaction.on_commit(release)
+    return first
+
+
+def generate_order_no(prefix='PO'):
     """
     生成订单号
-    格式: 前缀 + 年月日 + 4位序号 (例如: PO202602180001)
-    
     :param prefix: 订单号前缀
-    :param model_class: 模型类（用于查询当日最大序号）
-    :param field_name: 订单号字段名
     :return: 生成的订单号
     """
-    today = timezone.now().strftime('%Y%m%d')
-    prefix_with_date = f'{prefix}{today}'
-    
-    if model_class:
-        queryset = model_class.objects.filter(
-            **{f'{field_name}__startswith': prefix_with_date}
-        ).order_by(f'-{field_name}')
-        
-        last_order = queryset.first()
-        
-        if last_order:
-            last_no = getattr(last_order, field_name)
-            try:
-                last_seq = int(last_no[-4:])
-                new_seq = last_seq + 1
-            except (ValueError, IndexError):
-                new_seq = 1
-        else:
-            new_seq = 1
-    else:
-        new_seq = 1
-    
-    return f'{prefix_with_date}{new_seq:04d}'
+    seq_date = timezone.localdate()
+    seq = next_sequence(prefix, seq_date)
+    return f'{prefix}{seq_date:%Y%m%d}{seq:0{SEQUENCE_WIDTH}d}'
 
 
 def generate_purchase_order_no():
     """生成采购订单号"""
-    from purchase.models import PurchaseOrder
-    return generate_order_no(prefix='PO', model_class=PurchaseOrder)
+    return generate_order_no(prefix='PO')
 
 
 def generate_stock_in_no():
     """生成入库单号"""
-    from inventory.models import StockIn
-    return generate_order_no(prefix='SI', model_class=StockIn)
+    return generate_order_no(prefix='SI')
 
 
 def generate_stock_out_no():
     """生成出库单号"""
-    from inventory.models import StockOut
-    return generate_order_no(prefix='SO', model_class=StockOut)
+    return generate_order_no(prefix='SO')
 
 
 def generate_sale_order_no():
     """生成销售订单号"""
-    from sale.models import SaleOrder
-    return generate_order_no(prefix='SO', model_class=SaleOrder)
+    return generate_order_no(prefix='SO')
 
 
 def generate_stock_adjust_no():
     """生成库存调整单号"""
-    from inventory.models import StockAdjust
-    return generate_order_no(prefix='SA', model_class=StockAdjust)
+    return generate_order_no(prefix='SA')
 
 
 def generate_stock_transfer_no():
     """生成库存调拨单号"""
-    from inventory.models import StockTransfer
-    return generate_order_no(prefix='ST', model_class=StockTransfer)
+    return generate_order_no(prefix='ST')
+
+
+def generate_payment_no(payment_type):
+    """生成收付款单号（付款 PP，收款 PR）"""
+    return generate_order_no(prefix='PP' if payment_type == 'pay' else 'PR')
@@ -1,5 +1,12 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class StandardPagination(PageNumberPagination):
@@ -7,7 +14,7 @@ class StandardPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
-    
+
     def get_paginated_response(self, data):
         return Response({
             'code': 200,
@@ -19,3 +26,126 @@ class StandardPagination(PageNumberPagination):
                 'previous': self.get_previous_link()
             }
         })
+
+
+class KeysetPagination(StandardPagination):
+    """
+    游标分页类（用于流水、日志等只追加的大表）
+    默认仍按页码分页；请求携带 ?cursor= 时切换为按 (created_at, id) 倒序的游标分页，
+    每页只做一次索引范围查询，不执行 OFFSET 和 COUNT(*)，响应中不返回 count
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = '无效的分页游标'
+
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_request(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        # UNION 查询集无法再追加 WHERE，调用方需先对各子查询调用 filter_position
+        if not queryset.query.combinator:
+            queryset = self.filter_position(queryset, request)
+
+        if self.reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.page_rows = rows
+        if self.reverse:
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        return rows
+
+    def is_cursor_request(self, request):
+        """是否为游标分页请求"""
+        return self.cursor_query_param in request.query_params
+
+    def filter_position(self, queryset, request):
+        """按游标位置过滤：向后翻页取更早的记录，向前翻页取更新的记录"""
+        position, reverse = self.decode_cursor(request)
+        if position is None:
+            return queryset
+
+        # 先用 created_at 单边范围限定索引扫描区间，再排除同一时刻中已返回的记录
+        created_at, pk = position
+        if reverse:
+            return queryset.filter(created_at__gte=created_at).filter(Q(created_at__gt=created_at) | Q(id__gt=pk))
+        return queryset.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(id__lt=pk))
+
+    def decode_cursor(self, request):
+        """
+        解析游标
+        :return: ((created_at, id) 或 None, 是否向前翻页)
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            created_at = parse_datetime(payload['t'])
+            pk = int(payload['i'])
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (created_at, pk), reverse
+
+    def encode_cursor(self, row, reverse=False):
+        """根据记录（模型实例或 values 字典）生成游标链接"""
+        if isinstance(row, dict):
+            created_at, pk = row['created_at'], row['id']
+        else:
+            created_at, pk = row.created_at, row.pk
+
+        payload = {'t': created_at.isoformat(), 'i': pk}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[-1])
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'code': 200,
+            'msg': '成功',
+            'data': {
+                'items': data,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link()
+            }
+        })
@@ -8,6 +8,14 @@ from .permissions import HasModulePermission
 logger = logging.getLogger(__name__)
 
 
+def is_async_request(request):
+    """是否要求提交后台任务处理（?async=1 或请求体 async=true）"""
+    value = request.query_params.get('async')
+    if value is None and hasattr(request.data, 'get'):
+        value = request.data.get('async')
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
 class BaseModelViewSet(viewsets.ModelViewSet):
     """基础视图集，统一响应格式和操作日志记录"""
 
@@ -16,6 +24,8 @@ class BaseModelViewSet(viewsets.ModelViewSet):
     read_serializer_class = None
     log_display_field = 'name'
     log_exclude_fields = ['created_at', 'updated_at', 'id']
+    # 后台任务关联对象类型（如 SaleOrder），设置后对象有未结束的后台任务时拒绝修改和删除
+    job_object_type = None
 
     def get_client_ip(self, request):
         """获取客户端 IP 地址"""
@@ -43,6 +53,21 @@ class BaseModelViewSet(viewsets.ModelViewSet):
         except Exception as e:
             logger.error(f'记录日志失败: {str(e)}')
 
+    def active_job_response(self, instance):
+        """对象正在后台任务中处理时返回 409 响应，否则返回 None"""
+        from system.services import JobService
+
+        if not self.job_object_type:
+            return None
+        if JobService.active_job(f'{self.job_object_type}:{instance.pk}') is None:
+            return None
+        module = self.module_name or self.__class__.__name__.replace('ViewSet', '')
+        return Response({
+            'code': 409,
+            'msg': f'该{module}正在后台处理中，请稍后再试',
+            'data': None
+        }, status=409)
+
     def get_display_name(self, instance):
         """获取实例的显示名称"""
         if hasattr(instance, self.log_display_field):
@@ -238,6 +263,9 @@ class BaseModelViewSet(viewsets.ModelViewSet):
         try:
             partial = kwargs.pop('partial', False)
             instance = self.get_object()
+            busy = self.active_job_response(instance)
+            if busy is not None:
+                return busy
             
             old_serializer = self.get_read_serializer_class()(instance)
             old_data = old_serializer.data.copy()
@@ -298,6 +326,9 @@ class BaseModelViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
+            busy = self.active_job_response(instance)
+            if busy is not None:
+                return busy
             display_name = self.get_display_name(instance)
             module = self.module_name or self.__class__.__name__.replace('ViewSet', '')
             detail = f'删除{module}: {display_name}'
@@ -318,13 +349,5 @@ class BaseModelViewSet(viewsets.ModelViewSet):
             }, status=500)
 
     def get_paginated_response(self, data):
-        return Response({
-            'code': 200,
-            'msg': '成功',
-            'data': {
-                'items': data,
-                'count': self.paginator.page.paginator.count,
-                'next': self.paginator.get_next_link(),
-                'previous': self.paginator.get_previous_link()
-            }
-        })
+        """分页响应由分页类生成（页码分页与游标分页共用 {items, next, previous} 结构）"""
+        return self.paginator.get_paginated_response(data)